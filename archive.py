@@ -0,0 +1,222 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+import perft
+import pgn
+import pieces
+import transposition
+
+
+# Layout, all little endian:
+#   file header   magic, version, game count, index offset
+#   games         game header (result code, ply count, FEN length), FEN bytes, one uint16 per move
+#   index         one uint64 file offset per game, written when the archive is closed
+MAGIC = b"DCGA"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sHxxIQ")
+GAME_HEADER = struct.Struct("<BxHH")
+INDEX_ENTRY = struct.Struct("<Q")
+
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+
+def _little_endian(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class ArchiveWriter:
+    # Games go through one large write buffer, the offset index is kept in memory at 8 bytes a game
+    # and appended on close along with the final header.
+
+    def __init__(self, path):
+        self._file = open(path, "wb", buffering=WRITE_BUFFER_BYTES)
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, 0, 0))
+        self._offset = FILE_HEADER.size
+        self._offsets = array('Q')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_game(self, moves, result="*", fen=None):
+        fen_bytes = b"" if fen is None else fen.encode("ascii")
+        codes = _little_endian(array('H', [transposition.encode_move(move) for move in moves]))
+        record = GAME_HEADER.pack(pgn.RESULTS.index(result), len(codes), len(fen_bytes)) + fen_bytes + codes.tobytes()
+
+        self._offsets.append(self._offset)
+        self._file.write(record)
+        self._offset += len(record)
+        return len(self._offsets) - 1
+
+    def add_games(self, games):
+        for moves, result, fen in games:
+            self.add_game(moves, result, fen)
+        return len(self._offsets)
+
+    def get_game_count(self):
+        return len(self._offsets)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.write(_little_endian(array('Q', self._offsets)).tobytes())
+        self._file.seek(0)
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, len(self._offsets), self._offset))
+        self._file.close()
+
+
+class ArchiveReader:
+    # Maps the whole file, so opening game k is an index lookup and a slice with nothing parsed ahead of it.
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < FILE_HEADER.size:
+            self.close()
+            raise ValueError("{} is too short to be a game archive".format(path))
+        magic, version, self._game_count, self._index_offset = FILE_HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("{} isn't a version {} game archive".format(path, VERSION))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._game_count
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def get_game_count(self):
+        return self._game_count
+
+    def _game_header(self, game_id):
+        if not 0 <= game_id < self._game_count:
+            raise IndexError("No game {} in an archive of {}".format(game_id, self._game_count))
+        offset = INDEX_ENTRY.unpack_from(self._map, self._index_offset + game_id * INDEX_ENTRY.size)[0]
+        result_code, ply_count, fen_length = GAME_HEADER.unpack_from(self._map, offset)
+        return offset + GAME_HEADER.size, result_code, ply_count, fen_length
+
+    def get_result(self, game_id):
+        return pgn.RESULTS[self._game_header(game_id)[1]]
+
+    def get_ply_count(self, game_id):
+        return self._game_header(game_id)[2]
+
+    def get_fen(self, game_id):
+        offset, _, _, fen_length = self._game_header(game_id)
+        if not fen_length:
+            return None
+        return self._map[offset:offset + fen_length].decode("ascii")
+
+    def get_encoded_moves(self, game_id):
+        offset, _, ply_count, fen_length = self._game_header(game_id)
+        start = offset + fen_length
+        return _little_endian(array('H', self._map[start:start + 2 * ply_count]))
+
+    def get_moves(self, game_id):
+        return [transposition.decode_move(code) for code in self.get_encoded_moves(game_id)]
+
+    def new_board(self, game_id, board_cls=pieces.Board):
+        fen = self.get_fen(game_id)
+        return board_cls() if fen is None else board_cls.from_fen(fen)
+
+    def iter_positions(self, game_id, board_cls=pieces.Board):
+        # Yields the board before the first move and after every move, the same board object each time.
+        board = self.new_board(game_id, board_cls)
+        yield board
+        for code in self.get_encoded_moves(game_id):
+            board.move_piece(*transposition.decode_move(code))
+            board.change_player()
+            yield board
+
+    def replay(self, game_id, board_cls=pieces.Board):
+        board = None
+        for board in self.iter_positions(game_id, board_cls):
+            pass
+        return board
+
+
+def pack_pgn(pgn_path, archive_path):
+    # Stores every game that replays cleanly, returns how many were stored and how many were skipped.
+    skipped = 0
+    with ArchiveWriter(archive_path) as writer:
+        for game in pgn.read_games(pgn_path):
+            fen = game.get_headers().get("FEN")
+            try:
+                board = pieces.Board() if fen is None else pieces.Board.from_fen(fen)
+            except ValueError:
+                skipped += 1
+                continue
+
+            tokens, result = pgn.tokenize_movetext(game.get_movetext())
+            moves = pgn.replay_san(board, tokens)
+            if len(moves) < len(tokens):
+                skipped += 1
+                continue
+            result = game.get_headers().get("Result", result)
+            writer.add_game(moves, result if result in pgn.RESULTS else "*", fen)
+        return writer.get_game_count(), skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack PGN games into a binary archive, or read one back.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack_parser = subparsers.add_parser("pack", help="convert a PGN file into an archive")
+    pack_parser.add_argument("pgn", help="PGN file to read")
+    pack_parser.add_argument("archive", help="archive file to write")
+    scan_parser = subparsers.add_parser("scan", help="replay every game of an archive and time it")
+    scan_parser.add_argument("archive", help="archive file to read")
+    scan_parser.add_argument("--decode-only", action="store_true", help="decode the moves without playing them")
+    show_parser = subparsers.add_parser("show", help="print the moves of one game")
+    show_parser.add_argument("archive", help="archive file to read")
+    show_parser.add_argument("game", type=int, help="game number, from 0")
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        start = time.perf_counter()
+        stored, skipped = pack_pgn(args.pgn, args.archive)
+        pgn_size = os.path.getsize(args.pgn)
+        archive_size = os.path.getsize(args.archive)
+        print("{:,} games stored, {:,} skipped in {:.2f}s".format(stored, skipped, time.perf_counter() - start))
+        print("{:,} bytes of PGN -> {:,} bytes, {:.1f}x smaller".format(
+            pgn_size, archive_size, pgn_size / archive_size))
+        return 0
+
+    with ArchiveReader(args.archive) as reader:
+        if args.command == "show":
+            moves = reader.get_moves(args.game)
+            print(" ".join(perft.move_name(move) for move in moves), reader.get_result(args.game))
+            return 0
+
+        start = time.perf_counter()
+        plies = 0
+        for game_id in range(len(reader)):
+            if args.decode_only:
+                plies += len(reader.get_moves(game_id))
+            else:
+                reader.replay(game_id)
+                plies += reader.get_ply_count(game_id)
+        elapsed = time.perf_counter() - start
+        rate = "{:,.0f} plies/s".format(plies / elapsed) if elapsed > 0 else "-"
+        print("{:,} games, {:,} plies in {:.2f}s, {}".format(len(reader), plies, elapsed, rate))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,305 @@
+import argparse
+import copy
+import random
+import sys
+import time
+
+import pieces
+import search
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Plane order of an encoded board, white pieces first then black.
+PLANE_PIECES = ('P', 'N', 'B', 'R', 'Q', 'K')
+PLANE_COUNT = 2 * len(PLANE_PIECES)
+BLACK_PLANE_OFFSET = len(PLANE_PIECES)
+
+PAWN_PLANE = PLANE_PIECES.index('P')
+
+# Squares a piece could step to next, a cheap stand-in for counting its real moves.
+MOBILITY_OFFSETS = {
+    'N': pieces.KNIGHT_OFFSETS,
+    'B': pieces.BISHOP_DIRECTIONS,
+    'R': pieces.ROOK_DIRECTIONS,
+    'Q': pieces.QUEEN_DIRECTIONS,
+    'K': pieces.KING_OFFSETS,
+}
+MOBILITY_WEIGHT = 2
+
+DOUBLED_PAWN = -15
+ISOLATED_PAWN = -10
+PASSED_PAWN = 20
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Batch evaluation needs numpy, install it with 'pip install numpy'")
+
+
+def _piece_square_planes():
+    # 12 x 8 x 8 signed table matching search.evaluate(): black mirrored and negative.
+    tables = np.zeros((PLANE_COUNT, 8, 8), dtype=np.int32)
+    for plane, char_rep in enumerate(PLANE_PIECES):
+        table = np.array(search.PIECE_SQUARE_TABLES[char_rep], dtype=np.int32)
+        value = search.PIECE_VALUES[char_rep]
+        tables[plane] = table[::-1] + value
+        tables[plane + BLACK_PLANE_OFFSET] = -(table + value)
+    return tables
+
+
+def encode_boards(boards):
+    # One bool plane per piece type and colour, indexed [board, plane, y, x], plus who is to move.
+    _require_numpy()
+    board_index = []
+    plane_index = []
+    y_index = []
+    x_index = []
+    plane_lookup = {(char_rep, is_white): plane + (0 if is_white else BLACK_PLANE_OFFSET)
+                    for plane, char_rep in enumerate(PLANE_PIECES) for is_white in (True, False)}
+
+    for n, board in enumerate(boards):
+        for y, row in enumerate(board.get_board()):
+            for x, sq in enumerate(row):
+                if sq.is_piece():
+                    board_index.append(n)
+                    plane_index.append(plane_lookup[sq.char_rep(), sq.is_white()])
+                    y_index.append(y)
+                    x_index.append(x)
+
+    planes = np.zeros((len(boards), PLANE_COUNT, 8, 8), dtype=bool)
+    planes[board_index, plane_index, y_index, x_index] = True
+    white_to_move = np.array([board.is_cur_player_white() for board in boards], dtype=bool)
+    return planes, white_to_move
+
+
+def pack_planes(planes):
+    # N x 12 x 8 x 8 bools to N x 12 x 8 bytes, one byte per rank with bit x set for file x.
+    _require_numpy()
+    return np.packbits(planes, axis=-1, bitorder='little')[..., 0]
+
+
+def unpack_planes(packed):
+    _require_numpy()
+    return np.unpackbits(packed[..., np.newaxis], axis=-1, bitorder='little').astype(bool)
+
+
+def _shift(planes, x_off, y_off):
+    # Moves every set square by (x_off, y_off), squares pushed off the board are dropped.
+    shifted = np.zeros_like(planes)
+    size = planes.shape[-1]
+    src_y = slice(max(0, -y_off), size - max(0, y_off))
+    dst_y = slice(max(0, y_off), size - max(0, -y_off))
+    src_x = slice(max(0, -x_off), size - max(0, x_off))
+    dst_x = slice(max(0, x_off), size - max(0, -x_off))
+    shifted[..., dst_y, dst_x] = planes[..., src_y, src_x]
+    return shifted
+
+
+def _count(planes):
+    return planes.sum(axis=(-2, -1), dtype=np.int32)
+
+
+def _mobility(planes, own, enemy, is_white):
+    offset = 0 if is_white else BLACK_PLANE_OFFSET
+    not_own = ~own
+    mobility = np.zeros(planes.shape[0], dtype=np.int32)
+    for char_rep, offsets in MOBILITY_OFFSETS.items():
+        piece_planes = planes[:, offset + PLANE_PIECES.index(char_rep)]
+        for x_off, y_off in offsets:
+            mobility += _count(_shift(piece_planes, x_off, y_off) & not_own)
+
+    pawns = planes[:, offset + PAWN_PLANE]
+    y_dir = 1 if is_white else -1
+    mobility += _count(_shift(pawns, 0, y_dir) & ~(own | enemy))
+    for x_dir in (-1, 1):
+        mobility += _count(_shift(pawns, x_dir, y_dir) & enemy)
+    return mobility
+
+
+def _pawn_structure(own_pawns, enemy_pawns, is_white):
+    file_counts = own_pawns.sum(axis=-2, dtype=np.int32)
+    has_pawn = file_counts > 0
+    doubled = np.maximum(file_counts - 1, 0).sum(axis=-1)
+
+    neighbour = np.zeros_like(has_pawn)
+    neighbour[:, 1:] |= has_pawn[:, :-1]
+    neighbour[:, :-1] |= has_pawn[:, 1:]
+    isolated = (file_counts * ~neighbour).sum(axis=-1)
+
+    # Furthest rank an enemy pawn could block from, per file and its neighbours.
+    ranks = np.arange(8).reshape(1, 8, 1)
+    if is_white:
+        enemy_front = np.where(enemy_pawns, ranks, -1).max(axis=-2)
+    else:
+        enemy_front = np.where(enemy_pawns, ranks, 8).min(axis=-2)
+    blocking = enemy_front.copy()
+    reduce = np.maximum if is_white else np.minimum
+    blocking[:, 1:] = reduce(blocking[:, 1:], enemy_front[:, :-1])
+    blocking[:, :-1] = reduce(blocking[:, :-1], enemy_front[:, 1:])
+    if is_white:
+        passed = own_pawns & (blocking[:, np.newaxis, :] <= ranks)
+    else:
+        passed = own_pawns & (blocking[:, np.newaxis, :] >= ranks)
+
+    return doubled * DOUBLED_PAWN + isolated * ISOLATED_PAWN + _count(passed) * PASSED_PAWN
+
+
+def evaluate_batch(planes, white_to_move):
+    # Scores every encoded board at once. Components are from white's point of view, the total is
+    # from the player to move's like search.evaluate(), which it equals plus mobility and pawn terms.
+    _require_numpy()
+    counts = _count(planes)
+    values = np.array([search.PIECE_VALUES[char_rep] for char_rep in PLANE_PIECES], dtype=np.int32)
+    material = counts[:, :BLACK_PLANE_OFFSET] @ values - counts[:, BLACK_PLANE_OFFSET:] @ values
+
+    piece_square = np.einsum('npyx,pyx->n', planes.astype(np.int32), _piece_square_planes()) - material
+
+    white = planes[:, :BLACK_PLANE_OFFSET].any(axis=1)
+    black = planes[:, BLACK_PLANE_OFFSET:].any(axis=1)
+    mobility = _mobility(planes, white, black, True) - _mobility(planes, black, white, False)
+
+    white_pawns = planes[:, PAWN_PLANE]
+    black_pawns = planes[:, BLACK_PLANE_OFFSET + PAWN_PLANE]
+    pawn_structure = _pawn_structure(white_pawns, black_pawns, True) - _pawn_structure(black_pawns, white_pawns, False)
+
+    total = material + piece_square + MOBILITY_WEIGHT * mobility + pawn_structure
+    return {
+        "material": material,
+        "piece_square": piece_square,
+        "mobility": mobility,
+        "pawn_structure": pawn_structure,
+        "total": np.where(white_to_move, total, -total),
+    }
+
+
+def evaluate_boards(boards):
+    planes, white_to_move = encode_boards(boards)
+    return evaluate_batch(planes, white_to_move)
+
+
+def evaluate_scalar(board):
+    # Reference for evaluate_batch() one board at a time in plain Python, used to check and benchmark it.
+    squares = board.get_board()
+    size = board.get_board_size()
+    material = 0
+    piece_square = 0
+    mobility = 0
+    pawn_files = {True: [0] * size, False: [0] * size}
+
+    for y, row in enumerate(squares):
+        for x, sq in enumerate(row):
+            if not sq.is_piece():
+                continue
+            char_rep = sq.char_rep()
+            is_white = sq.is_white()
+            sign = 1 if is_white else -1
+            material += sign * search.PIECE_VALUES[char_rep]
+            table = search.PIECE_SQUARE_TABLES[char_rep]
+            piece_square += sign * (table[size - 1 - y][x] if is_white else table[y][x])
+
+            if char_rep == 'P':
+                pawn_files[is_white][x] += 1
+                y_dir = 1 if is_white else -1
+                if 0 <= y + y_dir < size:
+                    if not squares[y + y_dir][x].is_piece():
+                        mobility += sign
+                    for x_dir in (-1, 1):
+                        if 0 <= x + x_dir < size:
+                            target = squares[y + y_dir][x + x_dir]
+                            if target.is_piece() and target.is_white() != is_white:
+                                mobility += sign
+            else:
+                for x_off, y_off in MOBILITY_OFFSETS[char_rep]:
+                    if 0 <= x + x_off < size and 0 <= y + y_off < size:
+                        target = squares[y + y_off][x + x_off]
+                        if not (target.is_piece() and target.is_white() == is_white):
+                            mobility += sign
+
+    pawn_structure = 0
+    for is_white, sign in ((True, 1), (False, -1)):
+        files = pawn_files[is_white]
+        for x in range(size):
+            if files[x] == 0:
+                continue
+            pawn_structure += sign * max(files[x] - 1, 0) * DOUBLED_PAWN
+            if not any(0 <= adjacent < size and files[adjacent] for adjacent in (x - 1, x + 1)):
+                pawn_structure += sign * files[x] * ISOLATED_PAWN
+
+        for y, row in enumerate(squares):
+            for x, sq in enumerate(row):
+                if sq.char_rep() != 'P' or sq.is_white() != is_white:
+                    continue
+                # Passed if no enemy pawn stands ahead of it on its own or a neighbouring file.
+                blocked = False
+                for enemy_y in range(size):
+                    if (enemy_y > y) if is_white else (enemy_y < y):
+                        for enemy_x in (x - 1, x, x + 1):
+                            if 0 <= enemy_x < size:
+                                enemy = squares[enemy_y][enemy_x]
+                                if enemy.char_rep() == 'P' and enemy.is_white() != is_white:
+                                    blocked = True
+                if not blocked:
+                    pawn_structure += sign * PASSED_PAWN
+
+    total = material + piece_square + MOBILITY_WEIGHT * mobility + pawn_structure
+    return {
+        "material": material,
+        "piece_square": piece_square,
+        "mobility": mobility,
+        "pawn_structure": pawn_structure,
+        "total": total if board.is_cur_player_white() else -total,
+    }
+
+
+def random_positions(count, seed=0, max_plies=80):
+    # Positions from random games, for tests and the benchmark.
+    rng = random.Random(seed)
+    positions = []
+    board = pieces.Board()
+    while len(positions) < count:
+        moves = board.list_legal_moves()
+        if not moves or rng.random() < 1 / max_plies:
+            board = pieces.Board()
+            continue
+        board.move_piece(*rng.choice(moves))
+        board.change_player()
+        positions.append(copy.deepcopy(board))
+    return positions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark batched position evaluation against the scalar reference.")
+    parser.add_argument("--positions", type=int, default=5000, help="number of positions to score (default: 5000)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random games the positions come from")
+    args = parser.parse_args(argv)
+
+    _require_numpy()
+    boards = random_positions(args.positions, args.seed)
+
+    start = time.perf_counter()
+    scalar_totals = [evaluate_scalar(board)["total"] for board in boards]
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    planes, white_to_move = encode_boards(boards)
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = evaluate_batch(planes, white_to_move)
+    batch_time = time.perf_counter() - start
+
+    matches = np.array_equal(scores["total"], np.array(scalar_totals))
+    print("{:<24} {:>12,.0f} positions/s".format("scalar", len(boards) / scalar_time))
+    print("{:<24} {:>12,.0f} positions/s".format("encode", len(boards) / encode_time))
+    print("{:<24} {:>12,.0f} positions/s".format("batch evaluate", len(boards) / batch_time))
+    print("{:<24} {:>12,.0f} positions/s".format("encode + batch evaluate", len(boards) / (encode_time + batch_time)))
+    print("totals match scalar reference: {}".format(matches))
+    return 0 if matches else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+import argparse
+import copy
+import cProfile
+import gc
+import json
+import os
+import platform
+import pstats
+import sys
+import time
+import tracemalloc
+
+import pieces
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_pieces_baseline.json")
+ROUNDS = 7
+# Each timed round goes through the corpus this many times, a single pass is too short to time reliably.
+PASSES = 20
+# A case regresses when a metric grows by more than this fraction of its baseline...
+THRESHOLD = 0.25
+# ...and by more than this much, so tiny numbers don't fail on noise.
+ABSOLUTE_FLOORS = {
+    "wall_us": 5.0,
+    "peak_kib": 4.0,
+    "retained_kib": 4.0,
+}
+# With --check a case over the threshold is run this many times in all, and fails only if its best run still is.
+CHECK_RUNS = 3
+
+# Fixed positions every case runs over, a fresh board each so no cache carries over between rounds.
+CORPUS = [
+    ("opening_start", pieces.START_FEN),
+    ("opening_italian", "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"),
+    ("middlegame_kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("middlegame_closed", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10"),
+    ("endgame_rook", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"),
+    ("endgame_check", "8/8/8/4k3/8/8/4q3/4K3 w - - 0 1"),
+]
+
+
+def _own_squares(board):
+    return [(x, y) for y in range(board.get_board_size()) for x in range(board.get_board_size())
+            if board.get_square((x, y)).is_piece()
+            and board.get_square((x, y)).is_white() == board.is_cur_player_white()]
+
+
+def _candidate_moves(board):
+    # Every legal move plus a mostly illegal one per piece, its square mirrored across the board.
+    size = board.get_board_size()
+    moves = [(piece_square, new_square) for piece_square, new_square, _ in board.list_legal_moves()]
+    moves.extend(((x, y), (x, size - 1 - y)) for x, y in _own_squares(board))
+    return moves
+
+
+def _construction(fen, board, inputs):
+    return pieces.Board.from_fen(fen)
+
+
+def _check_if_move_valid(fen, board, inputs):
+    return [board.check_if_move_valid(*move) for move in inputs["moves"]]
+
+
+def _list_valid_moves_for_piece(fen, board, inputs):
+    return [board.list_valid_moves_for_piece(square) for square in inputs["squares"]]
+
+
+def _list_valid_moves_for_player(fen, board, inputs):
+    return board.list_valid_moves_for_player()
+
+
+def _is_cur_player_in_check(fen, board, inputs):
+    return board.is_cur_player_in_check()
+
+
+def _is_stalemate_or_checkmate(fen, board, inputs):
+    return board.is_stalemate_or_checkmate()
+
+
+def _deepcopy(fen, board, inputs):
+    return copy.deepcopy(board)
+
+
+CASES = {
+    "construction": _construction,
+    "check_if_move_valid": _check_if_move_valid,
+    "list_valid_moves_for_piece": _list_valid_moves_for_piece,
+    "list_valid_moves_for_player": _list_valid_moves_for_player,
+    "is_cur_player_in_check": _is_cur_player_in_check,
+    "is_stalemate_or_checkmate": _is_stalemate_or_checkmate,
+    "deepcopy": _deepcopy,
+}
+
+
+def _prepare(corpus):
+    inputs = []
+    for _, fen in corpus:
+        board = pieces.Board.from_fen(fen)
+        inputs.append({"squares": _own_squares(board), "moves": _candidate_moves(board)})
+    return inputs
+
+
+def _jobs(corpus, inputs, passes):
+    # Boards are built before the clock starts, a fresh one per call so no cached result carries over.
+    return [(fen, pieces.Board.from_fen(fen), position_inputs)
+            for _ in range(passes) for (_, fen), position_inputs in zip(corpus, inputs)]
+
+
+def _run_once(case, jobs):
+    # The collector is off while timing, as in timeit, or its passes land on whichever case is running.
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for fen, board, position_inputs in jobs:
+            case(fen, board, position_inputs)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def measure_case(name, rounds=ROUNDS, corpus=CORPUS, passes=PASSES):
+    # Wall time is the best round per call. Memory comes from one extra pass under tracemalloc, which
+    # slows everything down too much to time in the same run, and keeps every result so retained
+    # memory is what the case produced.
+    case = CASES[name]
+    inputs = _prepare(corpus)
+    wall = min(_run_once(case, _jobs(corpus, inputs, passes)) for _ in range(rounds))
+
+    jobs = _jobs(corpus, inputs, 1)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        results = [case(fen, board, position_inputs) for fen, board, position_inputs in jobs]
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del results
+
+    return {
+        "wall_us": round(wall / (len(corpus) * passes) * 1e6, 2),
+        "peak_kib": round((peak - before) / 1024 / len(corpus), 2),
+        "retained_kib": round((current - before) / 1024 / len(corpus), 2),
+    }
+
+
+def _calibration_work():
+    # Plain Python of the kind the board code runs, tuples, small dicts and branches, without touching pieces.
+    squares = {(x, y): (x * 8 + y, (x + y) & 1) for x in range(8) for y in range(8)}
+    total = 0
+    for _ in range(100):
+        for (x, y), (index, colour) in squares.items():
+            if (x + 1, y) in squares and (x, y + 1) not in squares:
+                total += index ^ colour
+    return total
+
+
+def calibrate(rounds=ROUNDS):
+    # Best time of a fixed workload in microseconds. How much slower or faster the machine runs it than
+    # when the baseline was saved scales the baseline's wall times, so a busy machine isn't a regression.
+    return round(min(_run_once(lambda fen, board, inputs: _calibration_work(), [(None, None, None)])
+                     for _ in range(rounds)) * 1e6, 2)
+
+
+def run_suite(names=None, rounds=ROUNDS):
+    # Returns the results and the calibration, which is timed before every case with the fastest counting.
+    results = {}
+    calibrations = []
+    for name in names or CASES:
+        calibrations.append(calibrate(rounds))
+        results[name] = measure_case(name, rounds)
+    return results, min(calibrations)
+
+
+def compare(results, baseline_cases, threshold=THRESHOLD, speed=1.0):
+    # Returns [(case, metric, baseline, current)] for every metric over both the threshold and its floor.
+    # speed is this run's calibration over the baseline's, wall times are scaled by it.
+    regressions = []
+    for name, metrics in results.items():
+        baseline = baseline_cases.get(name)
+        if baseline is None:
+            continue
+        for metric, value in metrics.items():
+            if metric not in baseline:
+                continue
+            expected = baseline[metric] * speed if metric == "wall_us" else baseline[metric]
+            limit = max(expected * (1 + threshold), expected + ABSOLUTE_FLOORS[metric])
+            if value > limit:
+                regressions.append((name, metric, baseline[metric], value))
+    return regressions
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, rounds, calibration, path=BASELINE_PATH):
+    baseline = {
+        "calibration_us": calibration,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "rounds": rounds,
+        "passes": PASSES,
+        "positions": [name for name, _ in CORPUS],
+        "cases": results,
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def profile_case(name, path, rounds=ROUNDS):
+    # Profiles the timed rounds only, the output opens with pstats, snakeviz or gprof2dot.
+    case = CASES[name]
+    inputs = _prepare(CORPUS)
+    profiler = cProfile.Profile()
+    for _ in range(rounds):
+        jobs = _jobs(CORPUS, inputs, PASSES)
+        profiler.enable()
+        for fen, board, position_inputs in jobs:
+            case(fen, board, position_inputs)
+        profiler.disable()
+    profiler.dump_stats(path)
+    return pstats.Stats(profiler)
+
+
+def _format_change(baseline, value):
+    if not baseline:
+        return "-"
+    return "{:+.0%}".format(value / baseline - 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the hot pieces.Board operations against a stored baseline.")
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="case to run, repeatable (default: all)")
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="timed rounds per case, the best one counts")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file to compare with or save to")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="report a metric that grows by more than this fraction of its baseline")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with 1 on a regression still there in the best of {} runs (default: only report)"
+                        .format(CHECK_RUNS))
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="write cProfile stats of each selected case to PATH (CASE is added when several run)")
+    args = parser.parse_args(argv)
+
+    names = args.case or list(CASES)
+
+    if args.profile:
+        for name in names:
+            path = args.profile
+            if len(names) > 1:
+                root, ext = os.path.splitext(path)
+                path = "{}.{}{}".format(root, name, ext or ".prof")
+            print("{} -> {}".format(name, path))
+            profile_case(name, path, args.rounds).sort_stats("cumulative").print_stats(15)
+        return 0
+
+    results, calibration = run_suite(names, args.rounds)
+
+    if args.save:
+        # Cases left out of this run keep their stored numbers.
+        cases = {}
+        if os.path.exists(args.baseline):
+            cases = load_baseline(args.baseline)["cases"]
+        cases.update(results)
+        save_baseline(cases, args.rounds, calibration, args.baseline)
+        print("baseline written to {}".format(args.baseline))
+
+    baseline_cases = {}
+    speed = 1.0
+    if os.path.exists(args.baseline):
+        baseline = load_baseline(args.baseline)
+        baseline_cases = baseline["cases"]
+        if baseline["python"] != platform.python_version():
+            print("baseline was recorded on Python {}, this is {}".format(baseline["python"], platform.python_version()))
+        if "calibration_us" in baseline:
+            speed = calibration / baseline["calibration_us"]
+        print("calibration {:.0f} us, {:.2f}x the baseline's, which its wall times are scaled by".format(
+            calibration, speed))
+
+    print("{:<30} {:>10} {:>7} {:>10} {:>7} {:>12} {:>7}".format(
+        "case (per position)", "wall us", "", "peak KiB", "", "retained KiB", ""))
+    for name, metrics in results.items():
+        baseline = baseline_cases.get(name, {})
+        print("{:<30} {:>10.1f} {:>7} {:>10.1f} {:>7} {:>12.1f} {:>7}".format(
+            name,
+            metrics["wall_us"], _format_change(baseline.get("wall_us", 0) * speed, metrics["wall_us"]),
+            metrics["peak_kib"], _format_change(baseline.get("peak_kib"), metrics["peak_kib"]),
+            metrics["retained_kib"], _format_change(baseline.get("retained_kib"), metrics["retained_kib"])))
+
+    regressions = compare(results, baseline_cases, args.threshold, speed)
+    if args.check and regressions:
+        # Timings also jump between runs on a steady machine, a real regression is still there in the best one.
+        names = sorted({name for name, _, _, _ in regressions})
+        print("measuring {} again".format(", ".join(names)))
+        for _ in range(CHECK_RUNS - 1):
+            for name, metrics in run_suite(names, args.rounds)[0].items():
+                results[name] = {metric: min(value, results[name][metric]) for metric, value in metrics.items()}
+        regressions = compare(results, baseline_cases, args.threshold, speed)
+    for name, metric, before, after in regressions:
+        print("REGRESSION {} {}: {:.2f} -> {:.2f}".format(name, metric, before, after))
+    print("{} cases, {} regressions above {:.0%}".format(len(results), len(regressions), args.threshold))
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
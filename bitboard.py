@@ -0,0 +1,704 @@
+import logging
+
+import instrumentation
+import pieces
+
+
+# Piece indices into BitBoard._pieces. Black pieces are offset by BLACK_OFFSET.
+PAWN = 0
+KNIGHT = 1
+BISHOP = 2
+ROOK = 3
+QUEEN = 4
+KING = 5
+BLACK_OFFSET = 6
+
+WHITE = 0
+BLACK = 1
+
+BOARD_SIZE = 8
+FULL_MASK = (1 << 64) - 1
+
+RANK_1 = 0xFF
+RANK_2 = RANK_1 << 8
+RANK_3 = RANK_1 << 16
+RANK_6 = RANK_1 << 40
+RANK_8 = RANK_1 << 56
+
+# Castling rights bits.
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+CHAR_TO_PIECE_TYPE = {
+    pieces.Pawn.char_rep(): PAWN,
+    pieces.Knight.char_rep(): KNIGHT,
+    pieces.Bishop.char_rep(): BISHOP,
+    pieces.Rook.char_rep(): ROOK,
+    pieces.Queen.char_rep(): QUEEN,
+    pieces.King.char_rep(): KING,
+}
+
+PIECE_CLASSES = (pieces.Pawn, pieces.Knight, pieces.Bishop, pieces.Rook, pieces.Queen, pieces.King)
+
+
+def square_index(square):
+    return square[1] * BOARD_SIZE + square[0]
+
+
+def square_coords(index):
+    return index % BOARD_SIZE, index // BOARD_SIZE
+
+
+def _offset_attacks(offsets):
+    table = []
+    for index in range(64):
+        x, y = square_coords(index)
+        mask = 0
+        for x_off, y_off in offsets:
+            new_x = x + x_off
+            new_y = y + y_off
+            if 0 <= new_x < BOARD_SIZE and 0 <= new_y < BOARD_SIZE:
+                mask |= 1 << square_index((new_x, new_y))
+        table.append(mask)
+    return table
+
+
+def _ray_table(x_dir, y_dir):
+    table = []
+    for index in range(64):
+        x, y = square_coords(index)
+        mask = 0
+        x += x_dir
+        y += y_dir
+        while 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE:
+            mask |= 1 << square_index((x, y))
+            x += x_dir
+            y += y_dir
+        table.append(mask)
+    return table
+
+
+KNIGHT_ATTACKS = _offset_attacks(pieces.KNIGHT_OFFSETS)
+KING_ATTACKS = _offset_attacks(pieces.KING_OFFSETS)
+PAWN_ATTACKS = (_offset_attacks(((-1, 1), (1, 1))), _offset_attacks(((-1, -1), (1, -1))))
+
+# Rays that run towards higher square indices find their first blocker with the lowest set bit,
+# rays that run towards lower indices with the highest set bit.
+ROOK_POSITIVE_RAYS = (_ray_table(1, 0), _ray_table(0, 1))
+ROOK_NEGATIVE_RAYS = (_ray_table(-1, 0), _ray_table(0, -1))
+BISHOP_POSITIVE_RAYS = (_ray_table(1, 1), _ray_table(-1, 1))
+BISHOP_NEGATIVE_RAYS = (_ray_table(1, -1), _ray_table(-1, -1))
+
+
+def _line_tables():
+    # LINES[a][b]: the full line through a and b, BETWEEN[a][b]: the squares strictly between them.
+    # Both are 0 when a and b don't share a rank, file or diagonal.
+    lines = [[0] * 64 for _ in range(64)]
+    between = [[0] * 64 for _ in range(64)]
+    for from_index in range(64):
+        for x_dir, y_dir in pieces.QUEEN_DIRECTIONS:
+            full_line = (1 << from_index) | _ray_table(x_dir, y_dir)[from_index] | _ray_table(-x_dir, -y_dir)[from_index]
+            x, y = square_coords(from_index)
+            passed = 0
+            x += x_dir
+            y += y_dir
+            while 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE:
+                to_index = square_index((x, y))
+                lines[from_index][to_index] = full_line
+                between[from_index][to_index] = passed
+                passed |= 1 << to_index
+                x += x_dir
+                y += y_dir
+    return lines, between
+
+
+LINES, BETWEEN = _line_tables()
+
+# Clearing a square's mask from the castling rights when a piece moves from or to it.
+CASTLING_MASKS = [FULL_MASK] * 64
+CASTLING_MASKS[square_index((4, 0))] = ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[square_index((7, 0))] = ~WHITE_KINGSIDE
+CASTLING_MASKS[square_index((0, 0))] = ~WHITE_QUEENSIDE
+CASTLING_MASKS[square_index((4, 7))] = ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[square_index((7, 7))] = ~BLACK_KINGSIDE
+CASTLING_MASKS[square_index((0, 7))] = ~BLACK_QUEENSIDE
+
+# (right, king from, king to, rook from, rook to, squares that must be empty, squares that must not be attacked)
+CASTLING_MOVES = (
+    (WHITE_KINGSIDE, 4, 6, 7, 5, 0x60, (4, 5)),
+    (WHITE_QUEENSIDE, 4, 2, 0, 3, 0x0E, (4, 3)),
+    (BLACK_KINGSIDE, 60, 62, 63, 61, 0x60 << 56, (60, 61)),
+    (BLACK_QUEENSIDE, 60, 58, 56, 59, 0x0E << 56, (60, 59)),
+)
+
+
+def _slider_attacks(index, occupied, positive_rays, negative_rays):
+    attacks = 0
+    for rays in positive_rays:
+        ray = rays[index]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for rays in negative_rays:
+        ray = rays[index]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(index, occupied):
+    return _slider_attacks(index, occupied, ROOK_POSITIVE_RAYS, ROOK_NEGATIVE_RAYS)
+
+
+def bishop_attacks(index, occupied):
+    return _slider_attacks(index, occupied, BISHOP_POSITIVE_RAYS, BISHOP_NEGATIVE_RAYS)
+
+
+def iter_bits(mask):
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+class BitBoard:
+
+    def __init__(self):
+        self._board_size = BOARD_SIZE
+        self._cur_player_is_white = True
+        self._taken_pieces = []
+
+        # One 64-bit integer per piece type and colour, bit n set means square n holds that piece.
+        self._pieces = [0] * 12
+        self._occupied = [0, 0]
+        self._all = 0
+        self._castling = 0
+        # Bit of the square a pawn skipped over with a double push on the last move, 0 if none.
+        self._en_passant = 0
+        # Plies since the last capture or pawn move, and the position before each move played with
+        # make_move(), for the fifty-move rule and threefold repetition as in pieces.Board.
+        self._halfmove_clock = 0
+        self._position_history = []
+
+        self._initialize_board()
+
+    def _initialize_board(self):
+        self._pieces[PAWN] = RANK_2
+        self._pieces[KNIGHT] = 0x42
+        self._pieces[BISHOP] = 0x24
+        self._pieces[ROOK] = 0x81
+        self._pieces[QUEEN] = 0x08
+        self._pieces[KING] = 0x10
+
+        # Black pieces mirror the white ones across the middle of the board.
+        for piece_type in range(BLACK_OFFSET):
+            self._pieces[piece_type + BLACK_OFFSET] = _flip_vertical(self._pieces[piece_type])
+
+        self._castling = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+        self._update_occupancy()
+
+    @classmethod
+    def from_fen(cls, fen):
+        return cls.from_board(pieces.Board.from_fen(fen))
+
+    @classmethod
+    def from_board(cls, board):
+        # Build a BitBoard from a pieces.Board, deriving castling rights from the has_moved flags.
+        bit_board = cls()
+        bit_board._pieces = [0] * 12
+        bit_board._castling = 0
+        bit_board._cur_player_is_white = board.is_cur_player_white()
+        # The positions before board's are not carried over, repetitions count from here.
+        bit_board._halfmove_clock = board.get_halfmove_clock()
+
+        en_passant_square = board.get_en_passant_square()
+        if en_passant_square is not None:
+            bit_board._en_passant = 1 << square_index(en_passant_square)
+
+        for y in range(BOARD_SIZE):
+            for x in range(BOARD_SIZE):
+                sq = board.get_square((x, y))
+                if sq.is_piece():
+                    bit_board._pieces[_piece_index(sq)] |= 1 << square_index((x, y))
+
+        for right, king_from, _, rook_from, _, _, _ in CASTLING_MOVES:
+            king = board.get_square(square_coords(king_from))
+            rook = board.get_square(square_coords(rook_from))
+            if king.char_rep() == pieces.King.char_rep() and rook.char_rep() == pieces.Rook.char_rep() \
+                    and not king.get_has_moved() and not rook.get_has_moved():
+                bit_board._castling |= right
+
+        bit_board._update_occupancy()
+        return bit_board
+
+    def _update_occupancy(self):
+        p = self._pieces
+        self._occupied[WHITE] = p[0] | p[1] | p[2] | p[3] | p[4] | p[5]
+        self._occupied[BLACK] = p[6] | p[7] | p[8] | p[9] | p[10] | p[11]
+        self._all = self._occupied[WHITE] | self._occupied[BLACK]
+
+    def _piece_at(self, index):
+        bit = 1 << index
+        if not self._all & bit:
+            return None
+        offset = 0 if self._occupied[WHITE] & bit else BLACK_OFFSET
+        for piece_index in range(offset, offset + BLACK_OFFSET):
+            if self._pieces[piece_index] & bit:
+                return piece_index
+        return None
+
+    def _make_square_view(self, index):
+        # The public API hands out pieces.Square/Piece objects so callers written for pieces.Board keep working.
+        piece_index = self._piece_at(index)
+        if piece_index is None:
+            return pieces.EMPTY_SQUARE
+
+        is_white = piece_index < BLACK_OFFSET
+        piece_type = piece_index % BLACK_OFFSET
+        piece = PIECE_CLASSES[piece_type](is_white)
+
+        if piece_type == PAWN:
+            piece.set_has_moved(index // BOARD_SIZE != (1 if is_white else BOARD_SIZE - 2))
+        elif piece_type == KING:
+            rights = (WHITE_KINGSIDE | WHITE_QUEENSIDE) if is_white else (BLACK_KINGSIDE | BLACK_QUEENSIDE)
+            piece.set_has_moved(not self._castling & rights)
+        elif piece_type == ROOK:
+            piece.set_has_moved(True)
+            for right, _, _, rook_from, _, _, _ in CASTLING_MOVES:
+                if rook_from == index and self._castling & right:
+                    piece.set_has_moved(False)
+        return piece
+
+    def get_square(self, square):
+        if square[0] > self._board_size-1 or square[0] < 0 or square[1] > self._board_size-1 or square[1] < 0:
+            return None
+        return self._make_square_view(square_index(square))
+
+    def set_square(self, square, piece):
+        bit = 1 << square_index(square)
+        for piece_index in range(12):
+            self._pieces[piece_index] &= ~bit
+        if piece.is_piece():
+            self._pieces[_piece_index(piece)] |= bit
+        self._update_occupancy()
+
+    def get_board_size(self):
+        return self._board_size
+
+    def get_taken_pieces(self):
+        return [PIECE_CLASSES[p % BLACK_OFFSET](p < BLACK_OFFSET) for p in self._taken_pieces]
+
+    def get_board(self):
+        return [[self._make_square_view(square_index((x, y))) for x in range(self._board_size)]
+                for y in range(self._board_size)]
+
+    def get_en_passant_square(self):
+        if not self._en_passant:
+            return None
+        return square_coords(self._en_passant.bit_length() - 1)
+
+    def is_cur_player_white(self):
+        return self._cur_player_is_white
+
+    def get_halfmove_clock(self):
+        return self._halfmove_clock
+
+    @staticmethod
+    def _position_key(piece_boards, castling, en_passant, is_white):
+        # Equal for positions that count as the same for repetition. As in pieces.Board's Zobrist key the
+        # en passant square is only part of it when a pawn could take on it.
+        if en_passant:
+            index = en_passant.bit_length() - 1
+            if en_passant & RANK_6:
+                capturers = piece_boards[PAWN] & PAWN_ATTACKS[BLACK][index]
+            else:
+                capturers = piece_boards[PAWN + BLACK_OFFSET] & PAWN_ATTACKS[WHITE][index]
+            if not capturers:
+                en_passant = 0
+        return tuple(piece_boards), castling, en_passant, is_white
+
+    def change_player(self):
+        self._cur_player_is_white = not self._cur_player_is_white
+        return self._cur_player_is_white
+
+    def _king_index(self, is_white):
+        king = self._pieces[KING if is_white else KING + BLACK_OFFSET]
+        if not king:
+            return None
+        return king.bit_length() - 1
+
+    def get_cur_king_coords(self):
+        return square_coords(self._king_index(self._cur_player_is_white))
+
+    def print_board(self):
+        for row in self.get_board():
+            print([str(sq) for sq in row])
+
+    def is_square_attacked(self, square, by_white):
+        return self._is_index_attacked(square_index(square), by_white)
+
+    def _is_index_attacked(self, index, by_white):
+        p = self._pieces
+        offset = 0 if by_white else BLACK_OFFSET
+
+        if KNIGHT_ATTACKS[index] & p[offset + KNIGHT]:
+            return True
+        if KING_ATTACKS[index] & p[offset + KING]:
+            return True
+        # A white pawn attacks this square from where a black pawn on it would attack, and vice versa.
+        if PAWN_ATTACKS[BLACK if by_white else WHITE][index] & p[offset + PAWN]:
+            return True
+
+        diagonal = p[offset + BISHOP] | p[offset + QUEEN]
+        if diagonal and bishop_attacks(index, self._all) & diagonal:
+            return True
+        straight = p[offset + ROOK] | p[offset + QUEEN]
+        if straight and rook_attacks(index, self._all) & straight:
+            return True
+        return False
+
+    def _attackers_of(self, index, by_white):
+        p = self._pieces
+        offset = 0 if by_white else BLACK_OFFSET
+        return (KNIGHT_ATTACKS[index] & p[offset + KNIGHT]
+                | KING_ATTACKS[index] & p[offset + KING]
+                | PAWN_ATTACKS[BLACK if by_white else WHITE][index] & p[offset + PAWN]
+                | bishop_attacks(index, self._all) & (p[offset + BISHOP] | p[offset + QUEEN])
+                | rook_attacks(index, self._all) & (p[offset + ROOK] | p[offset + QUEEN]))
+
+    def _is_in_check(self, is_white):
+        king_index = self._king_index(is_white)
+        return king_index is not None and self._is_index_attacked(king_index, not is_white)
+
+    @instrumentation.timed
+    def is_cur_player_in_check(self):
+        king_index = self._king_index(self._cur_player_is_white)
+        if king_index is None:
+            return False, ""
+
+        attackers = self._attackers_of(king_index, not self._cur_player_is_white)
+        if not attackers:
+            return False, ""
+
+        attacker_index = (attackers & -attackers).bit_length() - 1
+        return True, pieces.MoveError(pieces.IN_CHECK, self._make_square_view(attacker_index),
+                                      square_coords(attacker_index))
+
+    def _piece_targets(self, index, piece_index):
+        # Pseudo-legal destination mask for the piece on index.
+        is_white = piece_index < BLACK_OFFSET
+        piece_type = piece_index % BLACK_OFFSET
+        own = self._occupied[WHITE if is_white else BLACK]
+        bit = 1 << index
+
+        if piece_type == PAWN:
+            empty = ~self._all & FULL_MASK
+            enemy = self._occupied[BLACK if is_white else WHITE]
+            if is_white:
+                pushes = (bit << 8) & empty
+                pushes |= ((pushes & RANK_3) << 8) & empty
+                # En passant only if the pawn that double pushed is an enemy pawn.
+                if self._en_passant and self._pieces[PAWN + BLACK_OFFSET] & (self._en_passant >> 8):
+                    enemy |= self._en_passant
+            else:
+                pushes = (bit >> 8) & empty
+                pushes |= ((pushes & RANK_6) >> 8) & empty
+                if self._en_passant and self._pieces[PAWN] & (self._en_passant << 8):
+                    enemy |= self._en_passant
+            return pushes | (PAWN_ATTACKS[WHITE if is_white else BLACK][index] & enemy)
+
+        if piece_type == KNIGHT:
+            return KNIGHT_ATTACKS[index] & ~own
+        if piece_type == BISHOP:
+            return bishop_attacks(index, self._all) & ~own
+        if piece_type == ROOK:
+            return rook_attacks(index, self._all) & ~own
+        if piece_type == QUEEN:
+            return (rook_attacks(index, self._all) | bishop_attacks(index, self._all)) & ~own
+
+        targets = KING_ATTACKS[index] & ~own
+        for right, king_from, king_to, _, _, between, safe_squares in CASTLING_MOVES:
+            if king_from != index or not self._castling & right or self._all & between:
+                continue
+            if any(self._is_index_attacked(sq, not is_white) for sq in safe_squares):
+                continue
+            targets |= 1 << king_to
+        return targets
+
+    def _make_move_index(self, from_index, to_index, piece_index, promotion_type=QUEEN):
+        p = self._pieces
+        from_bit = 1 << from_index
+        to_bit = 1 << to_index
+        is_white = piece_index < BLACK_OFFSET
+        piece_type = piece_index % BLACK_OFFSET
+
+        # Undo record: the piece boards are small ints, so a copy is cheaper than tracking deltas.
+        undo = (p[:], self._castling, self._en_passant, len(self._taken_pieces), self._halfmove_clock,
+                len(self._position_history))
+
+        if piece_type == PAWN or self._all & to_bit:
+            self._halfmove_clock = 0
+        else:
+            self._halfmove_clock += 1
+
+        if piece_type == PAWN and to_bit == self._en_passant:
+            # The captured pawn sits beside the moving pawn, behind the en passant square.
+            captured = PAWN + BLACK_OFFSET if is_white else PAWN
+            p[captured] ^= (to_bit >> 8) if is_white else (to_bit << 8)
+            self._taken_pieces.append(captured)
+
+        self._en_passant = 0
+        if piece_type == PAWN and abs(to_index - from_index) == 16:
+            self._en_passant = 1 << ((from_index + to_index) // 2)
+
+        if self._all & to_bit:
+            enemy_offset = BLACK_OFFSET if is_white else 0
+            for captured in range(enemy_offset, enemy_offset + BLACK_OFFSET):
+                if p[captured] & to_bit:
+                    p[captured] ^= to_bit
+                    self._taken_pieces.append(captured)
+                    break
+
+        p[piece_index] ^= from_bit
+
+        if piece_type == PAWN and to_bit & (RANK_8 | RANK_1):
+            p[piece_index - PAWN + promotion_type] |= to_bit
+        else:
+            p[piece_index] |= to_bit
+
+        if piece_type == KING and abs(to_index - from_index) == 2:
+            for _, king_from, king_to, rook_from, rook_to, _, _ in CASTLING_MOVES:
+                if king_from == from_index and king_to == to_index:
+                    p[piece_index - KING + ROOK] ^= (1 << rook_from) | (1 << rook_to)
+
+        self._castling &= CASTLING_MASKS[from_index] & CASTLING_MASKS[to_index]
+        self._update_occupancy()
+        return undo
+
+    def make_move(self, piece_square, new_square, promotion=None):
+        from_index = square_index(piece_square)
+        promotion_type = CHAR_TO_PIECE_TYPE[promotion] if promotion is not None else QUEEN
+        undo = self._make_move_index(from_index, square_index(new_square), self._piece_at(from_index), promotion_type)
+        # Only moves that are played go into the history, the make and unmake pairs of legality tests don't.
+        # The undo record's piece boards are a copy from before the move that nothing changes, so the
+        # history keeps them as they are and keys are only built when repetitions are counted.
+        self._position_history.append((undo[0], undo[1], undo[2], self._cur_player_is_white))
+        return undo
+
+    def unmake_move(self, undo):
+        pieces_copy, self._castling, self._en_passant, taken_count, self._halfmove_clock, history_length = undo
+        self._pieces = pieces_copy
+        del self._taken_pieces[taken_count:]
+        del self._position_history[history_length:]
+        self._update_occupancy()
+
+    @instrumentation.timed
+    def move_piece(self, piece_square, new_square, promotion=None):
+        self.make_move(piece_square, new_square, promotion)
+
+    def _is_move_legal(self, from_index, to_index, piece_index):
+        undo = self._make_move_index(from_index, to_index, piece_index)
+        is_check = self._is_in_check(self._cur_player_is_white)
+        self.unmake_move(undo)
+        return not is_check
+
+    def _pinned_pieces(self, king_index, is_white):
+        p = self._pieces
+        enemy_offset = BLACK_OFFSET if is_white else 0
+        own = self._occupied[WHITE if is_white else BLACK]
+        enemy = self._occupied[BLACK if is_white else WHITE]
+
+        # Enemy sliders that would see the king if our own pieces were out of the way.
+        snipers = (rook_attacks(king_index, enemy) & (p[enemy_offset + ROOK] | p[enemy_offset + QUEEN])
+                   | bishop_attacks(king_index, enemy) & (p[enemy_offset + BISHOP] | p[enemy_offset + QUEEN]))
+
+        pinned = 0
+        for sniper in iter_bits(snipers):
+            blockers = BETWEEN[king_index][sniper] & self._all
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pinned |= blockers
+        return pinned
+
+    def _legality_context(self):
+        # Computed once per position so most moves can be judged legal without being played.
+        king_index = self._king_index(self._cur_player_is_white)
+        if king_index is None:
+            return None, 0, False
+        in_check = self._is_index_attacked(king_index, not self._cur_player_is_white)
+        return king_index, self._pinned_pieces(king_index, self._cur_player_is_white), in_check
+
+    def _legal_targets(self, from_index, piece_index, context):
+        king_index, pinned, in_check = context
+        targets = self._piece_targets(from_index, piece_index)
+
+        if in_check or king_index is None or (piece_index < BLACK_OFFSET) != self._cur_player_is_white:
+            legal = 0
+            for to_index in iter_bits(targets):
+                if self._is_move_legal(from_index, to_index, piece_index):
+                    legal |= 1 << to_index
+            return legal
+
+        if from_index == king_index:
+            # The king may not step onto an attacked square, including one hidden behind itself.
+            legal = 0
+            self._all ^= 1 << king_index
+            for to_index in iter_bits(targets):
+                if not self._is_index_attacked(to_index, not self._cur_player_is_white):
+                    legal |= 1 << to_index
+            self._all ^= 1 << king_index
+            return legal
+
+        if piece_index % BLACK_OFFSET == PAWN and targets & self._en_passant:
+            # En passant removes two pieces from a rank at once, so it is always tried on the board.
+            en_passant_index = self._en_passant.bit_length() - 1
+            targets ^= self._en_passant
+            if self._is_move_legal(from_index, en_passant_index, piece_index):
+                targets |= self._en_passant
+
+        if pinned >> from_index & 1:
+            return targets & LINES[king_index][from_index]
+        return targets
+
+    @instrumentation.timed
+    def check_if_selection_valid(self, piece_square):
+        piece_index = self._piece_at(square_index(piece_square))
+
+        if piece_index is None:
+            logging.info("Selected square %s doesn't contain a piece", piece_square)
+            return False, pieces.MoveError(pieces.NO_PIECE, square=piece_square)
+
+        if (piece_index < BLACK_OFFSET) is not self._cur_player_is_white:
+            return False, pieces.MoveError(pieces.NOT_YOUR_PIECE, PIECE_CLASSES[piece_index % BLACK_OFFSET], piece_square)
+
+        return True, ""
+
+    @instrumentation.timed
+    def check_if_move_valid(self, piece_square, new_square):
+
+        if piece_square == new_square:
+            return False, pieces.MoveError(pieces.SAME_SQUARE)
+
+        from_index = square_index(piece_square)
+        to_index = square_index(new_square)
+        piece_index = self._piece_at(from_index)
+        if piece_index is None:
+            return False, pieces.MoveError(pieces.NO_PIECE, square=piece_square)
+
+        # Can't capture own piece.
+        own = self._occupied[WHITE if piece_index < BLACK_OFFSET else BLACK]
+        if own >> to_index & 1:
+            landing_index = self._piece_at(to_index)
+            return False, pieces.MoveError(pieces.OWN_PIECE_ON_SQUARE, PIECE_CLASSES[landing_index % BLACK_OFFSET],
+                                           new_square)
+
+        if self._piece_targets(from_index, piece_index) >> to_index & 1:
+            undo = self._make_move_index(from_index, to_index, piece_index)
+            is_check, err = self.is_cur_player_in_check()
+            self.unmake_move(undo)
+            if not is_check:
+                return True, ""
+
+        # Rare path: the reason is worked out as the mailbox board does, the piece's own rules first and
+        # then whether the move leaves the king in check, so both boards reject a move for the same reason.
+        is_valid, err_msg = self._make_square_view(from_index).is_valid_move(piece_square, new_square, self)
+        if not is_valid:
+            return is_valid, err_msg
+
+        undo = self._make_move_index(from_index, to_index, piece_index)
+        is_check, err = self.is_cur_player_in_check()
+        self.unmake_move(undo)
+        return not is_check, err
+
+    @instrumentation.timed
+    def list_valid_moves_for_piece(self, piece_square):
+        from_index = square_index(piece_square)
+        piece_index = self._piece_at(from_index)
+        if piece_index is None:
+            return []
+        targets = self._legal_targets(from_index, piece_index, self._legality_context())
+        return [square_coords(to_index) for to_index in iter_bits(targets)]
+
+    @instrumentation.timed
+    def list_legal_moves(self):
+        legal_moves = []
+        context = self._legality_context()
+        offset = 0 if self._cur_player_is_white else BLACK_OFFSET
+        promotion_rank = RANK_8 if self._cur_player_is_white else RANK_1
+        for piece_index in range(offset, offset + BLACK_OFFSET):
+            for from_index in iter_bits(self._pieces[piece_index]):
+                piece_square = square_coords(from_index)
+                targets = self._legal_targets(from_index, piece_index, context)
+                if piece_index == offset + PAWN and targets & promotion_rank:
+                    for to_index in iter_bits(targets & promotion_rank):
+                        for promotion in pieces.PROMOTION_PIECES:
+                            legal_moves.append((piece_square, square_coords(to_index), promotion))
+                    targets &= ~promotion_rank
+                for to_index in iter_bits(targets):
+                    legal_moves.append((piece_square, square_coords(to_index), None))
+        return legal_moves
+
+    @instrumentation.timed
+    def list_valid_moves_for_player(self):
+        possible_moves = []
+        context = self._legality_context()
+        offset = 0 if self._cur_player_is_white else BLACK_OFFSET
+        for piece_index in range(offset, offset + BLACK_OFFSET):
+            for from_index in iter_bits(self._pieces[piece_index]):
+                for to_index in iter_bits(self._legal_targets(from_index, piece_index, context)):
+                    possible_moves.append(square_coords(to_index))
+        return possible_moves
+
+    @instrumentation.timed
+    def has_any_legal_move(self):
+        # Stops at the first legal move rather than listing them all.
+        context = self._legality_context()
+        offset = 0 if self._cur_player_is_white else BLACK_OFFSET
+        for piece_index in range(offset, offset + BLACK_OFFSET):
+            for from_index in iter_bits(self._pieces[piece_index]):
+                if self._legal_targets(from_index, piece_index, context):
+                    return True
+        return False
+
+    @instrumentation.timed
+    def is_stalemate_or_checkmate(self):
+        if not self.has_any_legal_move():
+            if self._is_in_check(self._cur_player_is_white):
+                return "CHECKMATE"
+            else:
+                return "STALEMATE"
+        return self.is_draw_by_rule()
+
+    def is_draw_by_rule(self):
+        if self._halfmove_clock >= pieces.FIFTY_MOVE_PLIES:
+            return pieces.FIFTY_MOVE_RULE
+        if self.get_repetition_count() >= 2:
+            return pieces.THREEFOLD_REPETITION
+        return None
+
+    def get_repetition_count(self):
+        # Times the current position was reached before, scanned as in pieces.Board.get_repetition_count().
+        history = self._position_history
+        start = max(len(history) - self._halfmove_clock, 0)
+        key = self._position_key(self._pieces, self._castling, self._en_passant, self._cur_player_is_white)
+        count = 0
+        for index in range(len(history) - 2, start - 1, -2):
+            if self._position_key(*history[index]) == key:
+                count += 1
+        return count
+
+
+def _piece_index(piece):
+    piece_type = CHAR_TO_PIECE_TYPE[piece.char_rep()]
+    return piece_type if piece.is_white() else piece_type + BLACK_OFFSET
+
+
+def _flip_vertical(mask):
+    flipped = 0
+    for rank in range(BOARD_SIZE):
+        flipped |= ((mask >> (rank * 8)) & RANK_1) << ((BOARD_SIZE - 1 - rank) * 8)
+    return flipped
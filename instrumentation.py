@@ -0,0 +1,147 @@
+import functools
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from collections import defaultdict
+
+
+# Hot code checks this flag before touching anything else, so disabled instrumentation costs one
+# attribute lookup per call site.
+enabled = False
+
+_counters = defaultdict(int)
+# Timer name -> [calls, total seconds].
+_timers = defaultdict(lambda: [0, 0.0])
+# Receives every timed call as it finishes, see set_tracer().
+_tracer = None
+# The UI and the move worker both record, and += on a dict entry can lose an update between threads.
+_lock = threading.Lock()
+
+_logger = logging.getLogger("danchess.instrumentation")
+_logger.propagate = False
+_queue_handler = None
+_listener = None
+
+
+def enable(*handlers):
+    # Aggregates are flushed as log records onto a queue and written out by a background listener,
+    # to the given handlers or else to the root logger's handlers (app.log for the game).
+    global enabled, _queue_handler, _listener
+    if enabled:
+        return
+
+    if not handlers:
+        handlers = tuple(logging.getLogger().handlers) or (logging.StreamHandler(),)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    _logger.addHandler(_queue_handler)
+    _logger.setLevel(logging.INFO)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    enabled = True
+
+
+def disable():
+    # Stopping the listener writes out anything still queued.
+    global enabled, _queue_handler, _listener
+    if not enabled:
+        return
+
+    enabled = False
+    _listener.stop()
+    _logger.removeHandler(_queue_handler)
+    _queue_handler = None
+    _listener = None
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _timers.clear()
+
+
+def count(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def add_time(name, seconds):
+    with _lock:
+        timer = _timers[name]
+        timer[0] += 1
+        timer[1] += seconds
+
+
+def set_tracer(tracer):
+    # tracer.add_span(name, start, seconds) is called after every timed call while enabled, for trace
+    # files and live displays that need each call rather than the totals. None detaches it.
+    global _tracer
+    _tracer = tracer
+
+
+def timed(func):
+    # Adds the run time of every call to a timer named after the function, only while enabled.
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            add_time(name, seconds)
+            if _tracer is not None:
+                _tracer.add_span(name, start, seconds)
+    return wrapper
+
+
+def get_counters():
+    with _lock:
+        return dict(_counters)
+
+
+def get_timers():
+    with _lock:
+        return {name: tuple(timer) for name, timer in _timers.items()}
+
+
+def flush():
+    # One record per counter and timer, formatted by the listener thread rather than here.
+    if not enabled:
+        return
+    for name, value in sorted(get_counters().items()):
+        _logger.info("counter %s %d", name, value)
+    for name, (calls, total) in sorted(get_timers().items()):
+        _logger.info("timer %s %d calls %.6fs", name, calls, total)
+
+
+def format_summary():
+    # Works from copies, the move worker may still be recording.
+    counters = get_counters()
+    timers = get_timers()
+    lines = ["Instrumentation summary"]
+    if counters:
+        lines.append("{:<40} {:>12}".format("counter", "count"))
+        for name, value in sorted(counters.items()):
+            lines.append("{:<40} {:>12,}".format(name, value))
+    if timers:
+        lines.append("{:<40} {:>12} {:>12} {:>12}".format("timer", "calls", "total ms", "mean us"))
+        for name, (calls, total) in sorted(timers.items(), key=lambda item: -item[1][1]):
+            lines.append("{:<40} {:>12,} {:>12.2f} {:>12.2f}".format(name, calls, total * 1e3, total / calls * 1e6))
+    if len(lines) == 1:
+        lines.append("nothing recorded")
+    return "\n".join(lines)
+
+
+def dump_summary(file=None):
+    # Meant for atexit: prints the summary, flushes it to the log and shuts the listener down.
+    print(format_summary(), file=file or sys.stdout)
+    flush()
+    disable()
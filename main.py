@@ -1,6 +1,11 @@
+import argparse
+import atexit
 import logging
 
+import bitboard
+import instrumentation
 import pieces
+import search
 
 
 def print_board_to_user(board):
@@ -92,22 +97,65 @@ def process_player_move(board):
     logging.info("Square selected: {}, Square to move to: {}".format(select_piece, square_to_move))
 
 
+def process_engine_move(board, searcher):
+    result = searcher.search(board)
+    if result.get_best_move() is None:
+        print("Engine has no legal moves")
+        return
+
+    piece_square, new_square, promotion = result.get_best_move()
+    print("Engine moves {} on {} to {} ({})".format(
+        board.get_square(piece_square).long_name(), piece_square, new_square, result))
+    board.move_piece(piece_square, new_square, promotion)
+
+
+def process_turn(board, searcher, engine_is_white):
+    if searcher is not None and board.is_cur_player_white() == engine_is_white:
+        process_engine_move(board, searcher)
+    else:
+        process_player_move(board)
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Play DanChess in the terminal.")
+    parser.add_argument("--bitboard", action="store_true", help="use the bitboard position backend")
+    parser.add_argument("--instrument", action="store_true",
+                        help="count and time board operations, printing a summary at exit")
+    parser.add_argument("--engine", choices=("white", "black"), help="colour played by the computer")
+    parser.add_argument("--engine-time", type=float, default=1.0, help="engine thinking time per move in seconds")
+    parser.add_argument("--engine-nodes", type=int, help="engine node budget per move, instead of a time limit")
+    args = parser.parse_args()
+
     logging.basicConfig(filename="app.log", format='%(asctime)s - %(message)s', level=logging.INFO)
 
+    if args.instrument:
+        instrumentation.enable()
+        atexit.register(instrumentation.dump_summary)
+
     turn = 1
 
-    board = pieces.Board()
+    searcher = None
+    if args.engine:
+        if args.engine_nodes:
+            searcher = search.Searcher(node_limit=args.engine_nodes)
+        else:
+            searcher = search.Searcher(time_limit=args.engine_time)
+    engine_is_white = args.engine == "white"
+
+    if args.bitboard:
+        board = bitboard.BitBoard()
+    else:
+        board = pieces.Board()
 
     while turn < 10:
         print_board_to_user(board)
         print("White to move - Turn {}".format(turn))
-        process_player_move(board)
+        process_turn(board, searcher, engine_is_white)
         board.change_player()
 
         print_board_to_user(board)
         print("Black to move - Turn {}".format(turn))
-        process_player_move(board)
+        process_turn(board, searcher, engine_is_white)
         board.change_player()
         turn += 1
 
@@ -0,0 +1,118 @@
+import copy
+import queue
+import threading
+import time
+
+
+class TurnAnalysis:
+    def __init__(self, turn, legal_targets, in_check, game_over, search_result=None, elapsed=0.0):
+        self._turn = turn
+        self._legal_targets = legal_targets
+        self._in_check = in_check
+        self._game_over = game_over
+        self._search_result = search_result
+        self._elapsed = elapsed
+
+    def get_turn(self):
+        return self._turn
+
+    def get_legal_targets(self):
+        return self._legal_targets
+
+    def get_targets(self, piece_square):
+        return self._legal_targets.get(piece_square, [])
+
+    def is_in_check(self):
+        return self._in_check
+
+    def get_game_over(self):
+        return self._game_over
+
+    def get_search_result(self):
+        return self._search_result
+
+    def get_engine_move(self):
+        if self._search_result is None:
+            return None
+        return self._search_result.get_best_move()
+
+    def get_elapsed(self):
+        return self._elapsed
+
+
+def analyse_turn(turn, board, searcher=None):
+    # Everything the view needs for the player to move: each piece's targets, whether the king
+    # is in check, how the game ended if it has, and the engine's reply when a searcher is given.
+    start = time.perf_counter()
+    legal_targets = {}
+    for piece_square, new_square, _ in board.list_legal_moves():
+        targets = legal_targets.setdefault(piece_square, [])
+        # A promotion counts once, as in list_valid_moves_for_piece().
+        if new_square not in targets:
+            targets.append(new_square)
+
+    in_check = board.is_square_attacked(board.get_cur_king_coords(), not board.is_cur_player_white())
+    game_over = board.is_stalemate_or_checkmate()
+
+    search_result = None
+    if searcher is not None and game_over is None:
+        search_result = searcher.search(board)
+
+    return TurnAnalysis(turn, legal_targets, in_check, game_over, search_result, time.perf_counter() - start)
+
+
+class MoveWorker:
+    # Analyses positions on a background thread so the render loop keeps drawing frames. The
+    # interpreter switches threads every few milliseconds, which is all the view needs to stay live.
+    def __init__(self, searcher=None):
+        self._searcher = searcher
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._turn = 0
+        self._thread = threading.Thread(target=self._run, name="move-worker", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread.is_alive():
+            self._requests.put(None)
+            self._thread.join()
+
+    def get_turn(self):
+        return self._turn
+
+    def submit(self, board, search=False):
+        # The worker gets its own copy, the caller is free to keep using board.
+        self._turn += 1
+        self._requests.put((self._turn, copy.deepcopy(board), search))
+        return self._turn
+
+    def poll(self):
+        # The analysis of the last submitted turn once it is ready, otherwise None. Results for
+        # earlier turns are dropped.
+        while True:
+            try:
+                analysis = self._results.get_nowait()
+            except queue.Empty:
+                return None
+            if analysis.get_turn() == self._turn:
+                return analysis
+
+    def wait(self, timeout=None):
+        while True:
+            analysis = self._results.get(timeout=timeout)
+            if analysis.get_turn() == self._turn:
+                return analysis
+
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            turn, board, search = request
+            # Skip turns that were replaced before the worker got to them.
+            if turn != self._turn:
+                continue
+            self._results.put(analyse_turn(turn, board, self._searcher if search else None))
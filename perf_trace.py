@@ -0,0 +1,165 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+# Oldest spans are dropped past this, so a trace left running through a long game stays bounded.
+MAX_TRACE_EVENTS = 500000
+ROLLING_SAMPLES = 120
+# Upper bucket edges of the latency histogram in milliseconds, the last bucket takes everything slower.
+LATENCY_EDGES_MS = (8, 16, 33, 50, 100, 200)
+LATENCY_SAMPLES = 500
+
+
+class RollingTimer:
+    def __init__(self, size=ROLLING_SAMPLES):
+        self._samples = deque(maxlen=size)
+        self._calls = 0
+        # Board calls are added from the UI thread and the move worker, and += can lose one between them.
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._calls += 1
+
+    def get_calls(self):
+        return self._calls
+
+    def get_last(self):
+        return self._samples[-1] if self._samples else 0.0
+
+    def get_mean(self):
+        samples = list(self._samples)
+        return sum(samples) / len(samples) if samples else 0.0
+
+    def get_max(self):
+        return max(self._samples, default=0.0)
+
+
+class LatencyHistogram:
+    def __init__(self, edges_ms=LATENCY_EDGES_MS, size=LATENCY_SAMPLES):
+        self._edges = edges_ms
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self._samples.append(seconds * 1e3)
+
+    def get_edges(self):
+        return self._edges
+
+    def get_counts(self):
+        # One count per edge plus the overflow bucket, over the most recent samples only.
+        counts = [0] * (len(self._edges) + 1)
+        for sample in list(self._samples):
+            counts[bisect.bisect_right(self._edges, sample)] += 1
+        return counts
+
+    def get_labels(self):
+        labels = ["<{}".format(edge) for edge in self._edges]
+        labels.append(">{}".format(self._edges[-1]))
+        return labels
+
+
+class TraceRecorder:
+    # Collects complete spans and writes them in the Chrome trace event format, which chrome://tracing,
+    # Perfetto and speedscope open as a timeline or flame graph.
+    def __init__(self, max_events=MAX_TRACE_EVENTS):
+        self._origin = time.perf_counter()
+        self._events = deque(maxlen=max_events)
+        self._thread_names = {}
+
+    def add_span(self, name, start, seconds, category="board"):
+        thread_id = threading.get_ident()
+        if thread_id not in self._thread_names:
+            self._thread_names[thread_id] = threading.current_thread().name
+        # Appending to a deque is atomic, so the move worker can record into the same trace.
+        self._events.append((name, category, start, seconds, thread_id))
+
+    @contextmanager
+    def span(self, name, category="ui"):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter() - start, category)
+
+    def __len__(self):
+        return len(self._events)
+
+    def get_trace_events(self):
+        pid = os.getpid()
+        trace_events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id, "args": {"name": name}}
+                        for thread_id, name in self._thread_names.items()]
+        for name, category, start, seconds, thread_id in list(self._events):
+            trace_events.append({"name": name, "cat": category, "ph": "X", "pid": pid, "tid": thread_id,
+                                 "ts": round((start - self._origin) * 1e6, 1), "dur": round(seconds * 1e6, 1)})
+        return trace_events
+
+    def write(self, path):
+        trace_events = self.get_trace_events()
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+        return len(trace_events)
+
+
+class PerformanceMonitor:
+    # What the overlay shows: frame and draw times, a rolling timer per board call and the input to
+    # render latency. Board calls arrive through instrumentation.set_tracer(), and everything is
+    # also passed on to a TraceRecorder when one is given.
+    def __init__(self, recorder=None):
+        self._recorder = recorder
+        self._frame = RollingTimer()
+        self._draw = RollingTimer()
+        self._calls = {}
+        self._latency = LatencyHistogram()
+        self._last_frame_start = None
+
+    def get_recorder(self):
+        return self._recorder
+
+    def add_span(self, name, start, seconds, category="board"):
+        timer = self._calls.get(name)
+        if timer is None:
+            timer = self._calls.setdefault(name, RollingTimer())
+        timer.add(seconds)
+        if self._recorder is not None:
+            self._recorder.add_span(name, start, seconds, category)
+
+    def add_frame(self, start, draw_seconds):
+        # Called once per drawn frame with when the draw began and how long it took.
+        if self._last_frame_start is not None:
+            self._frame.add(start - self._last_frame_start)
+        self._last_frame_start = start
+        self._draw.add(draw_seconds)
+        if self._recorder is not None:
+            self._recorder.add_span("on_draw", start, draw_seconds, "ui")
+
+    def add_latency(self, seconds):
+        self._latency.add(seconds)
+
+    def get_frame_timer(self):
+        return self._frame
+
+    def get_draw_timer(self):
+        return self._draw
+
+    def get_call_timers(self):
+        return dict(self._calls)
+
+    def get_latency_histogram(self):
+        return self._latency
+
+    def format_lines(self):
+        lines = [
+            "frame {:6.1f} ms  max {:6.1f}".format(self._frame.get_mean() * 1e3, self._frame.get_max() * 1e3),
+            "draw  {:6.1f} ms  max {:6.1f}".format(self._draw.get_mean() * 1e3, self._draw.get_max() * 1e3),
+        ]
+        for name, timer in sorted(self.get_call_timers().items()):
+            lines.append("{} x{}".format(name.split(".")[-1], timer.get_calls()))
+            lines.append("  last {:6.2f} ms  max {:6.2f}".format(timer.get_last() * 1e3, timer.get_max() * 1e3))
+        return lines
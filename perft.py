@@ -0,0 +1,170 @@
+import argparse
+import multiprocessing
+import sys
+import time
+
+import bitboard
+import pieces
+
+
+BACKENDS = {
+    "mailbox": pieces.Board,
+    "bitboard": bitboard.BitBoard,
+}
+
+START_FEN = pieces.START_FEN
+
+# Standard perft positions and their known leaf counts, index 0 is depth 1.
+# Counts from https://www.chessprogramming.org/Perft_Results
+REFERENCE_POSITIONS = [
+    ("start", START_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690]),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("position4_mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194]),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+def board_from_fen(fen, board_cls=pieces.Board):
+    return board_cls.from_fen(fen)
+
+
+def parse_square(name):
+    # Names off the board raise ValueError, e9 would otherwise become a square the board doesn't have.
+    if len(name) != 2 or name[0] not in pieces.FEN_FILES or name[1] not in "12345678":
+        raise ValueError("{} isn't a square".format(name))
+    return pieces.FEN_FILES.index(name[0]), int(name[1]) - 1
+
+
+def square_name(square):
+    return "{}{}".format(pieces.FEN_FILES[square[0]], square[1] + 1)
+
+
+def move_name(move):
+    piece_square, new_square, promotion = move
+    name = square_name(piece_square) + square_name(new_square)
+    if promotion is not None:
+        name += promotion.lower()
+    return name
+
+
+def perft(board, depth):
+    if depth == 0:
+        return 1
+
+    moves = board.list_legal_moves()
+    # Bulk counting: the leaves are exactly the legal moves of the last ply.
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for piece_square, new_square, promotion in moves:
+        undo = board.make_move(piece_square, new_square, promotion)
+        board.change_player()
+        nodes += perft(board, depth - 1)
+        board.change_player()
+        board.unmake_move(undo)
+    return nodes
+
+
+def perft_divide(board, depth):
+    # Leaf count below each root move, the usual way to find which move a generator gets wrong.
+    counts = {}
+    for move in board.list_legal_moves():
+        undo = board.make_move(*move)
+        board.change_player()
+        counts[move_name(move)] = perft(board, depth - 1)
+        board.change_player()
+        board.unmake_move(undo)
+    return counts
+
+
+def _perft_root_move(args):
+    fen, backend, move, depth = args
+    board = board_from_fen(fen, BACKENDS[backend])
+    board.make_move(*move)
+    board.change_player()
+    return move_name(move), perft(board, depth - 1)
+
+
+def parallel_perft_divide(fen, depth, backend="mailbox", processes=None):
+    # Root moves are independent, so each worker replays the position and searches one subtree.
+    if depth < 2:
+        return perft_divide(board_from_fen(fen, BACKENDS[backend]), depth)
+
+    moves = board_from_fen(fen, BACKENDS[backend]).list_legal_moves()
+    jobs = [(fen, backend, move, depth) for move in moves]
+    with multiprocessing.Pool(processes) as pool:
+        return dict(pool.imap_unordered(_perft_root_move, jobs))
+
+
+def run_perft(fen, depth, backend="mailbox", processes=1):
+    start = time.perf_counter()
+    if processes == 1:
+        counts = perft_divide(board_from_fen(fen, BACKENDS[backend]), depth)
+    else:
+        counts = parallel_perft_divide(fen, depth, backend, processes)
+    elapsed = time.perf_counter() - start
+    return counts, sum(counts.values()), elapsed
+
+
+def _format_rate(nodes, elapsed):
+    if elapsed <= 0:
+        return "-"
+    return "{:,.0f}".format(nodes / elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count leaf nodes of the legal move tree (perft).")
+    parser.add_argument("depth", type=int, nargs="?", default=3, help="search depth in plies (default: 3)")
+    parser.add_argument("--fen", help="position to search, defaults to the start position")
+    parser.add_argument("--divide", action="store_true", help="print the leaf count under every root move")
+    parser.add_argument("--suite", action="store_true",
+                        help="check every reference position up to DEPTH against its known count")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="mailbox", help="board implementation")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="split root moves over a multiprocessing pool of this size (0: one per core)")
+    args = parser.parse_args(argv)
+
+    processes = args.processes or None
+
+    if args.suite:
+        failures = 0
+        total_nodes = 0
+        total_time = 0.0
+        for name, fen, expected_counts in REFERENCE_POSITIONS:
+            for depth in range(1, min(args.depth, len(expected_counts)) + 1):
+                _, nodes, elapsed = run_perft(fen, depth, args.backend, processes)
+                total_nodes += nodes
+                total_time += elapsed
+
+                status = "ok" if nodes == expected_counts[depth - 1] else "FAIL"
+                if status == "FAIL":
+                    failures += 1
+                print("{:<20} depth {} {:>12,} nodes  expected {:>12,}  {:>10} nps  {}".format(
+                    name, depth, nodes, expected_counts[depth - 1], _format_rate(nodes, elapsed), status))
+
+        print("{:,} nodes in {:.2f}s, {} nps, {} failures".format(
+            total_nodes, total_time, _format_rate(total_nodes, total_time), failures))
+        return 1 if failures else 0
+
+    fen = args.fen or START_FEN
+    counts, nodes, elapsed = run_perft(fen, args.depth, args.backend, processes)
+    if args.divide:
+        for move in sorted(counts):
+            print("{}: {}".format(move, counts[move]))
+    print("depth {}: {:,} nodes in {:.2f}s, {} nps".format(args.depth, nodes, elapsed, _format_rate(nodes, elapsed)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+import argparse
+import multiprocessing
+import re
+import sys
+import threading
+import time
+
+import perft
+import pieces
+
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+HEADER_RE = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+COMMENT_RE = re.compile(r'\{[^}]*\}')
+MOVE_NUMBER_RE = re.compile(r'^\d+\.+')
+SAN_RE = re.compile(r'^(?P<piece>[KQRBN])?(?P<from_file>[a-h])?(?P<from_rank>[1-8])?(?P<capture>x)?(?P<to>[a-h][1-8])'
+                    r'(?:=?(?P<promotion>[QRBN]))?[+#]?[!?]*$')
+CASTLING_RE = re.compile(r'^(?P<castle>[O0]-[O0](?:-[O0])?)[+#]?[!?]*$')
+
+LEGAL = "legal"
+ILLEGAL = "illegal"
+RESULT_MISMATCH = "result mismatch"
+
+
+class Game:
+
+    def __init__(self, index, headers, movetext):
+        self._index = index
+        self._headers = headers
+        self._movetext = movetext
+
+    def get_index(self):
+        return self._index
+
+    def get_headers(self):
+        return self._headers
+
+    def get_movetext(self):
+        return self._movetext
+
+
+class Verdict:
+
+    def __init__(self, index, status, plies, message=""):
+        self._index = index
+        self._status = status
+        self._plies = plies
+        self._message = message
+
+    def get_index(self):
+        return self._index
+
+    def get_status(self):
+        return self._status
+
+    def get_plies(self):
+        return self._plies
+
+    def get_message(self):
+        return self._message
+
+    def __str__(self):
+        if self._status == LEGAL:
+            return "game {}: legal, {} plies".format(self._index, self._plies)
+        if self._status == ILLEGAL:
+            return "game {}: illegal at ply {}: {}".format(self._index, self._plies + 1, self._message)
+        return "game {}: {} after {} plies: {}".format(self._index, self._status, self._plies, self._message)
+
+
+def iter_games(lines):
+    # Splits a stream of PGN lines into games without reading ahead more than one game.
+    headers = {}
+    movetext = []
+    index = 0
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("%"):
+            continue
+
+        header = HEADER_RE.match(line)
+        if header:
+            if movetext:
+                yield Game(index, headers, " ".join(movetext))
+                index += 1
+                headers = {}
+                movetext = []
+            headers[header.group(1)] = header.group(2)
+        else:
+            # Rest-of-line comments can't be told apart once the lines are joined.
+            movetext.append(line.split(";", 1)[0])
+
+    if movetext or headers:
+        yield Game(index, headers, " ".join(movetext))
+
+
+def read_games(path):
+    with open(path, encoding="utf-8", errors="replace") as pgn_file:
+        yield from iter_games(pgn_file)
+
+
+def tokenize_movetext(movetext):
+    # SAN tokens of the main line and the result token, dropping comments, variations and NAGs.
+    movetext = COMMENT_RE.sub(" ", movetext)
+    if "(" in movetext:
+        # Variations nest, so they are skipped by depth rather than by a regex.
+        depth = 0
+        cleaned = []
+        for char in movetext:
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                depth = max(depth - 1, 0)
+            elif depth == 0:
+                cleaned.append(char)
+                continue
+            cleaned.append(" ")
+        movetext = "".join(cleaned)
+
+    tokens = []
+    result = None
+    for token in movetext.split():
+        if token in RESULTS:
+            result = token
+            continue
+        token = MOVE_NUMBER_RE.sub("", token)
+        if token and not token.startswith("$"):
+            tokens.append(token)
+    return tokens, result
+
+
+def san_to_move(board, san):
+    # Finds the legal move SAN describes, as (piece_square, new_square, promotion), or None.
+    is_white = board.is_cur_player_white()
+    castle = CASTLING_RE.match(san)
+    if castle:
+        king_square = board.get_cur_king_coords()
+        x_dir = -2 if len(castle.group("castle")) == 5 else 2
+        new_square = (king_square[0] + x_dir, king_square[1])
+        if new_square in board.list_valid_moves_for_piece(king_square):
+            return king_square, new_square, None
+        return None
+
+    match = SAN_RE.match(san)
+    if not match:
+        return None
+
+    char_rep = match.group("piece") or pieces.Pawn.char_rep()
+    new_square = perft.parse_square(match.group("to"))
+
+    # Every capture is marked with x, and a pawn names its file exactly when it captures.
+    is_pawn = char_rep == pieces.Pawn.char_rep()
+    is_capture = board.get_square(new_square).is_piece() or (is_pawn and new_square == board.get_en_passant_square())
+    if bool(match.group("capture")) != is_capture:
+        return None
+    if is_pawn and bool(match.group("from_file")) != is_capture:
+        return None
+
+    from_x = pieces.FEN_FILES.index(match.group("from_file")) if match.group("from_file") else None
+    from_y = int(match.group("from_rank")) - 1 if match.group("from_rank") else None
+
+    candidates = []
+    for y, row in enumerate(board.get_board()):
+        if from_y is not None and y != from_y:
+            continue
+        for x, sq in enumerate(row):
+            if from_x is not None and x != from_x:
+                continue
+            if sq.is_piece() and sq.is_white() == is_white and sq.char_rep() == char_rep:
+                if new_square in board.list_valid_moves_for_piece((x, y)):
+                    candidates.append((x, y))
+
+    # Ambiguous SAN is as wrong as an impossible move.
+    if len(candidates) != 1:
+        return None
+
+    promotion = match.group("promotion")
+    if is_pawn and new_square[1] in (0, board.get_board_size() - 1):
+        promotion = promotion or pieces.PROMOTION_PIECES[0]
+    elif promotion is not None:
+        return None
+    return candidates[0], new_square, promotion
+
+
+def move_to_san(board, move):
+    piece_square, new_square, promotion = move
+    piece = board.get_square(piece_square)
+    char_rep = piece.char_rep()
+
+    if char_rep == pieces.King.char_rep() and abs(new_square[0] - piece_square[0]) == 2:
+        san = "O-O" if new_square[0] > piece_square[0] else "O-O-O"
+    elif char_rep == pieces.Pawn.char_rep():
+        san = perft.square_name(new_square)
+        if new_square[0] != piece_square[0]:
+            san = pieces.FEN_FILES[piece_square[0]] + "x" + san
+        if promotion is not None:
+            san += "=" + promotion
+    else:
+        # Only name as much of the from square as it takes to tell the piece apart from its twins.
+        twins = [other for other, target, _ in board.list_legal_moves()
+                 if target == new_square and other != piece_square and board.get_square(other).char_rep() == char_rep]
+        origin = ""
+        if twins:
+            if all(other[0] != piece_square[0] for other in twins):
+                origin = pieces.FEN_FILES[piece_square[0]]
+            elif all(other[1] != piece_square[1] for other in twins):
+                origin = str(piece_square[1] + 1)
+            else:
+                origin = perft.square_name(piece_square)
+        capture = "x" if board.get_square(new_square).is_piece() else ""
+        san = char_rep + origin + capture + perft.square_name(new_square)
+
+    undo = board.make_move(piece_square, new_square, promotion)
+    board.change_player()
+    if board.is_stalemate_or_checkmate() == "CHECKMATE":
+        san += "#"
+    elif board.is_cur_player_in_check()[0]:
+        san += "+"
+    board.change_player()
+    board.unmake_move(undo)
+    return san
+
+
+def replay_san(board, tokens):
+    # Plays SAN moves onto the board and returns them as moves, stopping short at the first one that can't be played.
+    moves = []
+    for san in tokens:
+        move = san_to_move(board, san)
+        if move is None:
+            break
+        board.move_piece(*move)
+        board.change_player()
+        moves.append(move)
+    return moves
+
+
+def validate_game(game, board_cls=pieces.Board):
+    board = board_cls()
+    tokens, result = tokenize_movetext(game.get_movetext())
+    fen = game.get_headers().get("FEN")
+    if fen is not None:
+        try:
+            board = board_cls.from_fen(fen)
+        except ValueError as err:
+            return Verdict(game.get_index(), ILLEGAL, 0, "bad FEN header: {}".format(err))
+
+    moves = replay_san(board, tokens)
+    if len(moves) < len(tokens):
+        return Verdict(game.get_index(), ILLEGAL, len(moves), tokens[len(moves)])
+
+    result = game.get_headers().get("Result", result)
+    game_over = board.is_stalemate_or_checkmate()
+    if game_over == "CHECKMATE":
+        # The player to move is the one mated.
+        expected = "0-1" if board.is_cur_player_white() else "1-0"
+        if result != expected:
+            return Verdict(game.get_index(), RESULT_MISMATCH, len(tokens),
+                           "checkmate should be {}, PGN says {}".format(expected, result))
+    elif game_over == "STALEMATE" and result != "1/2-1/2":
+        return Verdict(game.get_index(), RESULT_MISMATCH, len(tokens),
+                       "stalemate should be 1/2-1/2, PGN says {}".format(result))
+
+    return Verdict(game.get_index(), LEGAL, len(tokens))
+
+
+def _validate_job(args):
+    game, backend = args
+    return validate_game(game, perft.BACKENDS[backend])
+
+
+def validate_games(games, backend="mailbox", processes=1, ordered=True, window=256):
+    # Yields a verdict per game. With a pool, at most window games are with the workers or waiting to be
+    # yielded, so a huge file is never read far ahead and memory stays flat. A new game goes out as soon
+    # as any verdict is yielded, so a slow game only holds up its own slot.
+    if processes == 1:
+        for game in games:
+            yield validate_game(game, perft.BACKENDS[backend])
+        return
+
+    slots = threading.Semaphore(window)
+    stopping = threading.Event()
+
+    def jobs():
+        # Read by the pool's task feeder thread, which waits here while the window is full.
+        for game in games:
+            slots.acquire()
+            if stopping.is_set():
+                return
+            yield game, backend
+
+    pool = multiprocessing.Pool(processes)
+    imap = pool.imap if ordered else pool.imap_unordered
+    try:
+        for verdict in imap(_validate_job, jobs()):
+            slots.release()
+            yield verdict
+    finally:
+        # A caller stopping early lets the feeder out of acquire() and waits for the games already sent,
+        # terminating the pool while its feeder is still at work can deadlock.
+        stopping.set()
+        slots.release()
+        pool.close()
+        pool.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that every move of every game in a PGN file is legal.")
+    parser.add_argument("path", help="PGN file to read")
+    parser.add_argument("--backend", choices=sorted(perft.BACKENDS), default="mailbox", help="board implementation")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="validate games on a multiprocessing pool of this size (0: one per core)")
+    parser.add_argument("--unordered", action="store_true", help="report games as they finish rather than in file order")
+    parser.add_argument("--quiet", action="store_true", help="only print games that aren't legal, and the summary")
+    args = parser.parse_args(argv)
+
+    counts = {LEGAL: 0, ILLEGAL: 0, RESULT_MISMATCH: 0}
+    plies = 0
+    start = time.perf_counter()
+    verdicts = validate_games(read_games(args.path), args.backend, args.processes or None, not args.unordered)
+    for verdict in verdicts:
+        counts[verdict.get_status()] += 1
+        plies += verdict.get_plies()
+        if not args.quiet or verdict.get_status() != LEGAL:
+            print(verdict)
+    elapsed = time.perf_counter() - start
+
+    games = sum(counts.values())
+    rate = "{:,.0f} games/s, {:,.0f} plies/s".format(games / elapsed, plies / elapsed) if elapsed > 0 else "-"
+    print("{:,} games ({:,} legal, {:,} illegal, {:,} result mismatches), {:,} plies in {:.2f}s, {}".format(
+        games, counts[LEGAL], counts[ILLEGAL], counts[RESULT_MISMATCH], plies, elapsed, rate))
+    return 0 if counts[LEGAL] == games else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,174 @@
-from copy import deepcopy
+import copy
 import logging
+import random
+from array import array
+
+import instrumentation
+import transposition
+
+
+ROOK_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+KNIGHT_OFFSETS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+KING_OFFSETS = QUEEN_DIRECTIONS
+
+# Char reps of the pieces a pawn can promote to, most valuable first.
+PROMOTION_PIECES = ('Q', 'R', 'B', 'N')
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Draws that is_stalemate_or_checkmate() reports besides stalemate. Fifty moves by each player
+# without a capture or pawn move is a hundred plies.
+THREEFOLD_REPETITION = "THREEFOLD_REPETITION"
+FIFTY_MOVE_RULE = "FIFTY_MOVE_RULE"
+FIFTY_MOVE_PLIES = 100
+FEN_FILES = "abcdefgh"
+
+# Why a selection or move was refused. Validation hands back a MoveError holding one of these codes and
+# the piece and square involved, the message is only put together when something prints it.
+NO_PIECE = "NO_PIECE"
+NOT_YOUR_PIECE = "NOT_YOUR_PIECE"
+SAME_SQUARE = "SAME_SQUARE"
+OWN_PIECE_ON_SQUARE = "OWN_PIECE_ON_SQUARE"
+NO_MOVE_RULES = "NO_MOVE_RULES"
+IN_CHECK = "IN_CHECK"
+PAWN_NOT_FORWARD = "PAWN_NOT_FORWARD"
+PAWN_TOO_FAR = "PAWN_TOO_FAR"
+PAWN_TOO_WIDE = "PAWN_TOO_WIDE"
+PAWN_BLOCKED = "PAWN_BLOCKED"
+PAWN_CAPTURE_TOO_FAR = "PAWN_CAPTURE_TOO_FAR"
+PAWN_DIAGONAL_NOT_CAPTURE = "PAWN_DIAGONAL_NOT_CAPTURE"
+ROOK_NOT_STRAIGHT = "ROOK_NOT_STRAIGHT"
+ROOK_BLOCKED = "ROOK_BLOCKED"
+BISHOP_NOT_DIAGONAL = "BISHOP_NOT_DIAGONAL"
+BISHOP_BLOCKED = "BISHOP_BLOCKED"
+KNIGHT_NOT_L_SHAPE = "KNIGHT_NOT_L_SHAPE"
+QUEEN_NOT_LINE = "QUEEN_NOT_LINE"
+KING_TOO_FAR = "KING_TOO_FAR"
+CASTLE_IN_CHECK = "CASTLE_IN_CHECK"
+CASTLE_BLOCKED = "CASTLE_BLOCKED"
+CASTLE_THROUGH_CHECK = "CASTLE_THROUGH_CHECK"
+CASTLE_ROOK_MOVED = "CASTLE_ROOK_MOVED"
+
+# {name} and {char} are the long name and char rep of the error's piece, {square} its square.
+MOVE_ERROR_MESSAGES = {
+    NO_PIECE: "Selected square {square} doesn't contain a piece",
+    NOT_YOUR_PIECE: "Selected {name} on {square} is not your piece!",
+    SAME_SQUARE: "Piece cannot remain in same square!",
+    OWN_PIECE_ON_SQUARE: "The {name} on {square} belongs to you!",
+    NO_MOVE_RULES: "No move rules are defined for this - coords: {square}",
+    IN_CHECK: "In check: Enemy {name} on {square}",
+    PAWN_NOT_FORWARD: "Pawns must at least 1 square forward.",
+    PAWN_TOO_FAR: "Pawns cannot move forward more that 1 square (or 2 square on first move)",
+    PAWN_TOO_WIDE: "Pawns cannot move more than 1 square on x-axis (only during captures)",
+    PAWN_BLOCKED: "Pawn is blocked by {name} on {square}",
+    PAWN_CAPTURE_TOO_FAR: "Pawns only capture 1 square diagonally.",
+    PAWN_DIAGONAL_NOT_CAPTURE: "Cannot move diagonally unless it's a capture.",
+    ROOK_NOT_STRAIGHT: "Rooks can only move along one axis at a time.",
+    ROOK_BLOCKED: "Rook is blocked by {name} on {square}",
+    BISHOP_NOT_DIAGONAL: "Bishops only move diagonally!",
+    BISHOP_BLOCKED: "Bishop is blocked by {name} on {square}",
+    KNIGHT_NOT_L_SHAPE: "Knights move in L-shapes. (1 square on one axis and 2 along another.)",
+    QUEEN_NOT_LINE: "Queens move diagonally or in a straight line!",
+    KING_TOO_FAR: "The King can only move one square at a time!",
+    CASTLE_IN_CHECK: "Cannot castle when in check",
+    CASTLE_BLOCKED: "Cannot castle, {char} on {square}",
+    CASTLE_THROUGH_CHECK: "Cannot castle, Would result in check on {square}",
+    CASTLE_ROOK_MOVED: "Rook on {square} has already moved!",
+}
+
+# Castling rights as bits of a mask, each with the king and rook home squares it depends on.
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+CASTLING_RIGHTS = (
+    (WHITE_KINGSIDE, True, (4, 0), (7, 0)),
+    (WHITE_QUEENSIDE, True, (4, 0), (0, 0)),
+    (BLACK_KINGSIDE, False, (4, 7), (7, 7)),
+    (BLACK_QUEENSIDE, False, (4, 7), (0, 7)),
+)
+FEN_CASTLING_CHARS = {WHITE_KINGSIDE: 'K', WHITE_QUEENSIDE: 'Q', BLACK_KINGSIDE: 'k', BLACK_QUEENSIDE: 'q'}
+# Only a move from or to one of these squares can change the castling rights.
+CASTLING_SQUARES = frozenset(square for _, _, king_square, rook_square in CASTLING_RIGHTS
+                             for square in (king_square, rook_square))
+
+# Zobrist keys, seeded so a position hashes the same in every run and process.
+_zobrist_random = random.Random(20240611)
+ZOBRIST_PIECE_KEYS = {(char_rep, is_white): [_zobrist_random.getrandbits(64) for _ in range(64)]
+                      for char_rep in ('P', 'N', 'B', 'R', 'Q', 'K') for is_white in (True, False)}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+ZOBRIST_EN_PASSANT_KEYS = [_zobrist_random.getrandbits(64) for _ in range(8)]
+_zobrist_castling_right_keys = [_zobrist_random.getrandbits(64) for _ in CASTLING_RIGHTS]
+
+
+def _zobrist_castling_key(rights):
+    key = 0
+    for right_key, (right, _, _, _) in zip(_zobrist_castling_right_keys, CASTLING_RIGHTS):
+        if rights & right:
+            key ^= right_key
+    return key
+
+
+# Indexed by the whole castling mask, so a change of rights is a single xor pair.
+ZOBRIST_CASTLING_KEYS = [_zobrist_castling_key(rights) for rights in range(16)]
+
+
+class MoveError:
+    # The second half of a refused (False, error) result. It keeps the code and raw fields, and str()
+    # builds the English message. It compares equal to that message, so callers written against
+    # message strings keep working.
+    __slots__ = ('_code', '_piece', '_square')
+
+    def __init__(self, code, piece=None, square=None):
+        self._code = code
+        self._piece = piece
+        self._square = square
+
+    def get_code(self):
+        return self._code
+
+    def get_piece(self):
+        return self._piece
+
+    def get_square(self):
+        return self._square
+
+    def __str__(self):
+        piece = self._piece
+        return MOVE_ERROR_MESSAGES[self._code].format(
+            name=piece.long_name() if piece is not None else None,
+            char=piece.char_rep() if piece is not None else None,
+            square=self._square)
+
+    def __repr__(self):
+        return "MoveError({}, {!r})".format(self._code, str(self))
+
+    def __eq__(self, other):
+        if isinstance(other, (MoveError, str)):
+            return str(self) == str(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))
 
 
 def is_landing_square_occupied(func):
-    def wrapper(self, new_square, board, *args, **kwargs):
-        val = func(self, new_square, board, *args, **kwargs)
+    # Can't capture own piece, which overrides whatever the piece's own rules say, so they aren't run.
+    def wrapper(self, cur_square, new_square, board):
+        if instrumentation.enabled:
+            instrumentation.count("validations")
         landing_square = board.get_square(new_square)
-        # Can't capture own piece.
-        if landing_square.is_piece() and landing_square.is_white() == self.is_white():
-            val = False, "The {} on {} belongs to you!".format(landing_square.long_name(), new_square)
-        return val
+        if landing_square.is_piece() and landing_square.is_white() == self._is_white:
+            return False, MoveError(OWN_PIECE_ON_SQUARE, landing_square, new_square)
+        return func(self, cur_square, new_square, board)
     return wrapper
 
 
 class Board:
 
-    def __init__(self):
+    def __init__(self, transposition_table=None, fen=None):
         self._board_size = 8
         self._cur_player_is_white = True
         self._taken_pieces = []
@@ -24,48 +177,200 @@ class Board:
         self._white_king_coords = None
         self._black_king_coords = None
 
-        self._initialize_board()
+        # Square a pawn skipped over with a double push on the last move, it can be captured en passant.
+        self._en_passant_square = None
+
+        # Moves since the last capture or pawn move, and the number of the current full move.
+        self._halfmove_clock = 0
+        self._fullmove_number = 1
+
+        # Zobrist key of the position before each move played, appended by make_move() and popped by
+        # unmake_move(). Only the last _halfmove_clock entries can repeat the current position.
+        self._key_history = array('Q')
+
+        # Zobrist key of the position, kept up to date by set_square(), make_move() and change_player().
+        self._zobrist_key = 0
+        self._castling_rights = 0
+
+        # Number of pieces of each colour attacking each square, indexed [is_white][y * size + x] and
+        # kept up to date by set_square(), so attack queries don't scan the board.
+        self._attack_counts = None
+
+        # Optional cache of per-position results, keyed by the Zobrist key and shareable between boards.
+        self._transposition_table = transposition_table
+
+        # Legal targets of the pieces of the player to move, {piece_square: [new_square, ...]}, filled in
+        # a piece at a time as they are asked for, with the legality context they share. It holds for
+        # the position whose Zobrist key is _legal_targets_key, any move or change of player changes the
+        # key so a stale cache is never used.
+        self._legal_targets = {}
+        self._legal_targets_key = None
+        self._legal_targets_complete = False
+        self._legal_targets_context = None
+
+        if fen is None:
+            self._initialize_board()
+        else:
+            self._load_fen(fen)
+
+    @classmethod
+    def from_fen(cls, fen, transposition_table=None):
+        return cls(transposition_table, fen)
+
+    def _load_fen(self, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("FEN needs at least placement, side, castling and en passant fields: {!r}".format(fen))
+        placement, side, castling, en_passant = fields[:4]
+        ranks = placement.split("/")
+        if len(ranks) != self._board_size:
+            raise ValueError("FEN placement must have {} ranks: {!r}".format(self._board_size, placement))
+        if side not in ("w", "b"):
+            raise ValueError("FEN side to move must be 'w' or 'b': {!r}".format(side))
+        # A double push leaves the square behind the pawn on the third or sixth rank, as perft.parse_square reads it.
+        if en_passant != "-" and (len(en_passant) != 2 or en_passant[0] not in FEN_FILES
+                                  or en_passant[1] not in ("3", "6")):
+            raise ValueError("FEN en passant square must be '-' or on rank 3 or 6: {!r}".format(en_passant))
+
+        self._board = [[EMPTY_SQUARE] * self._board_size for _ in range(self._board_size)]
+        self._white_king_coords = None
+        self._black_king_coords = None
+
+        for rank_index, rank in enumerate(ranks):
+            y = self._board_size - 1 - rank_index
+            x = 0
+            for char in rank:
+                if char.isdigit():
+                    x += int(char)
+                    continue
+                if char.upper() not in FEN_PIECE_CLASSES or x >= self._board_size:
+                    raise ValueError("Bad FEN rank {!r}".format(rank))
+
+                is_white = char.isupper()
+                piece = FEN_PIECE_CLASSES[char.upper()](is_white)
+                self._board[y][x] = piece
+
+                # Castling and double pushes are decided by the has_moved flags, so they are set from the
+                # castling field and from whether the piece is still on its starting square.
+                if isinstance(piece, Pawn):
+                    piece.set_has_moved(y != (1 if is_white else self._board_size - 2))
+                elif isinstance(piece, King):
+                    if is_white:
+                        self._white_king_coords = (x, y)
+                    else:
+                        self._black_king_coords = (x, y)
+                elif isinstance(piece, Rook):
+                    piece.set_has_moved(True)
+                x += 1
+            if x != self._board_size:
+                raise ValueError("FEN rank must cover {} files: {!r}".format(self._board_size, rank))
+
+        if self._white_king_coords is None or self._black_king_coords is None:
+            raise ValueError("FEN needs a king of each colour: {!r}".format(placement))
+
+        for king_coords in (self._white_king_coords, self._black_king_coords):
+            self.get_square(king_coords).set_has_moved(True)
+        for right, is_white, king_square, rook_square in CASTLING_RIGHTS:
+            if FEN_CASTLING_CHARS[right] not in castling:
+                continue
+            king = self.get_square(king_square)
+            rook = self.get_square(rook_square)
+            if king.char_rep() == King.char_rep() and king.is_white() == is_white \
+                    and rook.char_rep() == Rook.char_rep() and rook.is_white() == is_white:
+                king.set_has_moved(False)
+                rook.set_has_moved(False)
+
+        self._cur_player_is_white = side == "w"
+        self._en_passant_square = None
+        if en_passant != "-":
+            self._en_passant_square = FEN_FILES.index(en_passant[0]), int(en_passant[1]) - 1
+        self._halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        self._fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+
+        self._refresh_zobrist_key()
+        self._refresh_attack_counts()
+
+    def to_fen(self):
+        ranks = []
+        for y in range(self._board_size - 1, -1, -1):
+            rank = ""
+            empty = 0
+            for sq in self._board[y]:
+                if not sq.is_piece():
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += sq.char_rep() if sq.is_white() else sq.char_rep().lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+
+        castling_rights = self._compute_castling_rights()
+        castling = "".join(FEN_CASTLING_CHARS[right] for right, _, _, _ in CASTLING_RIGHTS if castling_rights & right)
+
+        en_passant = "-"
+        if self._en_passant_square is not None:
+            en_passant = "{}{}".format(FEN_FILES[self._en_passant_square[0]], self._en_passant_square[1] + 1)
+
+        return "{} {} {} {} {} {}".format("/".join(ranks), "w" if self._cur_player_is_white else "b",
+                                          castling or "-", en_passant, self._halfmove_clock, self._fullmove_number)
+
+    def __deepcopy__(self, memo):
+        if instrumentation.enabled:
+            instrumentation.count("board_clones")
+        # Copies share the transposition table rather than cloning it, its entries hold for any board.
+        memo[id(self._transposition_table)] = self._transposition_table
+        board = type(self).__new__(type(self))
+        memo[id(self)] = board
+        for name, value in self.__dict__.items():
+            setattr(board, name, copy.deepcopy(value, memo))
+        return board
 
     def _initialize_board(self):
-        # Fill board with Squares
-        self._board = [[Square((x, y)) for y in range(self._board_size)] for x in range(self._board_size)]
+        # Fill board with the shared empty square
+        self._board = [[EMPTY_SQUARE] * self._board_size for _ in range(self._board_size)]
 
         # 2nd Rank should be white pawns, 7th Rank should be black pawns
         for x in range(self._board_size):
-            self._board[1][x] = Pawn((x, 1), True)
-            self._board[6][x] = Pawn((x, 6), False)
+            self._board[1][x] = Pawn(True)
+            self._board[6][x] = Pawn(False)
 
         # Corners should be Rooks
-        self._board[0][0] = Rook((0, 0), True)
-        self._board[0][7] = Rook((7, 0), True)
+        self._board[0][0] = Rook(True)
+        self._board[0][7] = Rook(True)
 
-        self._board[7][0] = Rook((0, 7), False)
-        self._board[7][7] = Rook((7, 7), False)
+        self._board[7][0] = Rook(False)
+        self._board[7][7] = Rook(False)
 
         # Squares adjacent to Rooks should be Knights
-        self._board[0][1] = Knight((1, 0), True)
-        self._board[0][6] = Knight((6, 0), True)
+        self._board[0][1] = Knight(True)
+        self._board[0][6] = Knight(True)
 
-        self._board[7][1] = Knight((1, 7), False)
-        self._board[7][6] = Knight((6, 7), False)
+        self._board[7][1] = Knight(False)
+        self._board[7][6] = Knight(False)
 
         # Squares adjacent to Knights should be Bishops
-        self._board[0][2] = Bishop((2, 0), True)
-        self._board[0][5] = Bishop((5, 0), True)
+        self._board[0][2] = Bishop(True)
+        self._board[0][5] = Bishop(True)
 
-        self._board[7][2] = Bishop((2, 7), False)
-        self._board[7][5] = Bishop((5, 7), False)
+        self._board[7][2] = Bishop(False)
+        self._board[7][5] = Bishop(False)
 
         # Queens are on D file
-        self._board[0][3] = Queen((3, 0), True)
-        self._board[7][3] = Queen((3, 7), False)
+        self._board[0][3] = Queen(True)
+        self._board[7][3] = Queen(False)
 
         # Kings are on E file
         self._white_king_coords = (4, 0)
         self._black_king_coords = (4, 7)
 
-        self._board[self._white_king_coords[1]][self._white_king_coords[0]] = King(self._white_king_coords, True)
-        self._board[self._black_king_coords[1]][self._black_king_coords[0]] = King(self._black_king_coords, False)
+        self._board[self._white_king_coords[1]][self._white_king_coords[0]] = King(True)
+        self._board[self._black_king_coords[1]][self._black_king_coords[0]] = King(False)
+
+        self._refresh_zobrist_key()
+        self._refresh_attack_counts()
 
     def get_square(self, square):
         if square[0] > self._board_size-1 or square[0] < 0 or square[1] > self._board_size-1 or square[1] < 0:
@@ -73,7 +378,66 @@ class Board:
         return self._board[square[1]][square[0]]
 
     def set_square(self, square, piece):
-        self._board[square[1]][square[0]] = piece
+        row = self._board[square[1]]
+        old_piece = row[square[0]]
+        index = square[1] * self._board_size + square[0]
+        self._zobrist_key ^= old_piece.zobrist_key(index) ^ piece.zobrist_key(index)
+
+        if old_piece.is_piece():
+            self._add_piece_attacks(square, old_piece, -1)
+            if not piece.is_piece():
+                self._update_rays_through(square, 1)
+        elif piece.is_piece():
+            self._update_rays_through(square, -1)
+
+        row[square[0]] = piece
+        if piece.is_piece():
+            self._add_piece_attacks(square, piece, 1)
+
+    def _add_piece_attacks(self, square, piece, delta):
+        counts = self._attack_counts[piece.is_white()]
+        for x, y in piece.generate_attacks(square, self):
+            counts[y * self._board_size + x] += delta
+
+    def _update_rays_through(self, square, delta):
+        # Sliders aimed at square reach the squares behind it only while it is empty, delta is 1 when
+        # it empties and -1 when it fills. Only these rays change, the rest of the maps stay as they are.
+        size = self._board_size
+        board = self._board
+        x, y = square
+        for x_dir, y_dir in QUEEN_DIRECTIONS:
+            ray_x = x + x_dir
+            ray_y = y + y_dir
+            while 0 <= ray_x < size and 0 <= ray_y < size and not board[ray_y][ray_x].is_piece():
+                ray_x += x_dir
+                ray_y += y_dir
+            if not (0 <= ray_x < size and 0 <= ray_y < size):
+                continue
+
+            slider = board[ray_y][ray_x]
+            if (-x_dir, -y_dir) not in slider.slide_directions():
+                continue
+
+            counts = self._attack_counts[slider.is_white()]
+            ray_x = x - x_dir
+            ray_y = y - y_dir
+            while 0 <= ray_x < size and 0 <= ray_y < size:
+                counts[ray_y * size + ray_x] += delta
+                if board[ray_y][ray_x].is_piece():
+                    break
+                ray_x -= x_dir
+                ray_y -= y_dir
+
+    def _refresh_attack_counts(self):
+        # Rebuilt from scratch for a new board, after which set_square() updates them incrementally.
+        self._attack_counts = [[0] * self._board_size ** 2, [0] * self._board_size ** 2]
+        for y, row in enumerate(self._board):
+            for x, sq in enumerate(row):
+                if sq.is_piece():
+                    self._add_piece_attacks((x, y), sq, 1)
+
+    def is_square_attacked(self, square, by_white):
+        return self._attack_counts[by_white][square[1] * self._board_size + square[0]] > 0
 
     def get_board_size(self):
         return self._board_size
@@ -89,8 +453,76 @@ class Board:
 
     def change_player(self):
         self._cur_player_is_white = not self._cur_player_is_white
+        self._zobrist_key ^= ZOBRIST_BLACK_TO_MOVE
         return self._cur_player_is_white
 
+    def get_en_passant_square(self):
+        return self._en_passant_square
+
+    def get_halfmove_clock(self):
+        return self._halfmove_clock
+
+    def get_fullmove_number(self):
+        return self._fullmove_number
+
+    def get_zobrist_key(self):
+        return self._zobrist_key
+
+    def get_transposition_table(self):
+        return self._transposition_table
+
+    def compute_zobrist_key(self):
+        # Full recomputation, the incrementally updated get_zobrist_key() must always equal this.
+        key = 0
+        for y, row in enumerate(self._board):
+            for x, sq in enumerate(row):
+                key ^= sq.zobrist_key(y * self._board_size + x)
+        if not self._cur_player_is_white:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        if self._en_passant_square is not None:
+            key ^= self._en_passant_key(self._en_passant_square)
+        return key ^ ZOBRIST_CASTLING_KEYS[self._compute_castling_rights()]
+
+    def _en_passant_key(self, en_passant_square):
+        # The en passant file is only hashed when a pawn beside the pushed pawn could take it, as in
+        # Polyglot, so the same position reached by another move order or from a FEN gets the same key.
+        x, y = en_passant_square
+        capturer_is_white = y == self._board_size - 3
+        pawn_y = y - 1 if capturer_is_white else y + 1
+        for side_x in (x - 1, x + 1):
+            sq = self.get_square((side_x, pawn_y))
+            if sq is not None and sq.is_piece() and sq.char_rep() == Pawn.char_rep() \
+                    and sq.is_white() == capturer_is_white:
+                return ZOBRIST_EN_PASSANT_KEYS[x]
+        return 0
+
+    def _compute_castling_rights(self):
+        # A right is held while its king and rook are unmoved on their home squares.
+        rights = 0
+        for right, is_white, king_square, rook_square in CASTLING_RIGHTS:
+            king = self.get_square(king_square)
+            rook = self.get_square(rook_square)
+            if (king.char_rep() == King.char_rep() and king.is_white() == is_white and not king.get_has_moved()
+                    and rook.char_rep() == Rook.char_rep() and rook.is_white() == is_white
+                    and not rook.get_has_moved()):
+                rights |= right
+        return rights
+
+    def _refresh_zobrist_key(self):
+        # For positions set up by hand, after which the key is updated incrementally again.
+        self._castling_rights = self._compute_castling_rights()
+        self._zobrist_key = self.compute_zobrist_key()
+
+    def _update_castling_rights(self):
+        castling_rights = self._compute_castling_rights()
+        self._zobrist_key ^= ZOBRIST_CASTLING_KEYS[self._castling_rights] ^ ZOBRIST_CASTLING_KEYS[castling_rights]
+        self._castling_rights = castling_rights
+
+    def _get_position_entry(self):
+        if self._transposition_table is None:
+            return None
+        return self._transposition_table.get_or_create(self._zobrist_key)
+
     def get_cur_king_coords(self):
         if self._cur_player_is_white:
             return self._white_king_coords
@@ -104,63 +536,107 @@ class Board:
                 row.append(str(self._board[x][y]))
             print(row)
 
+    @instrumentation.timed
     def check_if_selection_valid(self, piece_square):
         sq = self.get_square(piece_square)
 
         if not sq.is_piece():
-            logging.info("Selected square {} doesn't contain a piece".format(piece_square))
-            return False, "Selected square {} doesn't contain a piece".format(piece_square)
+            logging.info("Selected square %s doesn't contain a piece", piece_square)
+            return False, MoveError(NO_PIECE, square=piece_square)
 
         if sq.is_white() is not self._cur_player_is_white:
-            return False, "Selected {} on {} is not your piece!".format(sq.long_name(), piece_square)
+            return False, MoveError(NOT_YOUR_PIECE, sq, piece_square)
 
         return True, ""
 
+    @instrumentation.timed
     def check_if_move_valid(self, piece_square, new_square):
 
         if piece_square == new_square:
-            return False, "Piece cannot remain in same square!"
+            return False, MoveError(SAME_SQUARE)
 
         piece_sq = self.get_square(piece_square)
+        if piece_sq.is_piece() and piece_sq.is_white() == self._cur_player_is_white and \
+                new_square in self._get_piece_legal_targets(piece_square):
+            return True, ""
+        # Rejected moves are worked out again for the reason.
 
         # Check if move is valid
-        is_valid, err_msg = piece_sq.is_valid_move(new_square, self)
+        is_valid, err_msg = piece_sq.is_valid_move(piece_square, new_square, self)
         if not is_valid:
             return is_valid, err_msg
 
         # Check if current move would put current player into check
-        tmp_board = deepcopy(self)
-        tmp_board.move_piece(piece_square, new_square)
-        is_check, err = tmp_board.is_cur_player_in_check()
-
-        return not is_check, err
+        return self._check_move_legality(piece_square, new_square, self._legality_context())
 
+    @instrumentation.timed
     def is_cur_player_in_check(self):
+        entry = self._get_position_entry()
+        if entry is None:
+            return self._find_check()
 
-        if self._cur_player_is_white:
-            cur_king = self.get_square(self._white_king_coords)
-        else:
-            cur_king = self.get_square(self._black_king_coords)
+        check = entry.get_check()
+        if check is transposition.UNKNOWN:
+            check = self._find_check()
+            entry.set_check(check)
+        return check
 
-        res, err = cur_king.is_in_check(self)
+    def _find_check(self):
+        king_coords = self.get_cur_king_coords()
+        cur_king = self.get_square(king_coords)
+
+        res, err = cur_king.is_in_check(king_coords, self)
 
         return res, err
 
-    def move_piece(self, piece_square, new_square):
+    @instrumentation.timed
+    def move_piece(self, piece_square, new_square, promotion=None):
+        self.make_move(piece_square, new_square, promotion)
 
+    def make_move(self, piece_square, new_square, promotion=None):
         piece_sq = self.get_square(piece_square)
         new_sq = self.get_square(new_square)
 
+        # Snapshot everything the move can change so unmake_move() can restore it exactly.
+        had_moved = piece_sq.get_has_moved() if isinstance(piece_sq, HasMovedMixin) else None
+        king_coords = (self._white_king_coords, self._black_king_coords)
+        taken_count = len(self._taken_pieces)
+        en_passant_square = self._en_passant_square
+        zobrist_key = self._zobrist_key
+        castling_rights = self._castling_rights
+        move_counters = self._halfmove_clock, self._fullmove_number
+        castle_undo = None
+        en_passant_undo = None
+        self._key_history.append(zobrist_key)
+        if en_passant_square is not None:
+            # Nothing has moved since the push, so this is the key that was added then.
+            self._zobrist_key ^= self._en_passant_key(en_passant_square)
+        self._en_passant_square = None
+
+        if piece_sq.char_rep() == Pawn.char_rep():
+            # EN PASSANT - a diagonal move onto an empty square takes the pawn beside the moving pawn.
+            if piece_square[0] != new_square[0] and not new_sq.is_piece():
+                captured_square = (new_square[0], piece_square[1])
+                en_passant_undo = captured_square, self.get_square(captured_square)
+                self._taken_pieces.append(en_passant_undo[1])
+                self.set_square(captured_square, EMPTY_SQUARE)
+
+            # A double push can be captured en passant on the next move.
+            if abs(piece_square[1] - new_square[1]) == 2:
+                self._en_passant_square = (piece_square[0], (piece_square[1] + new_square[1]) // 2)
+                self._zobrist_key ^= self._en_passant_key(self._en_passant_square)
+
         # CASTLING
         if piece_square == self._black_king_coords or piece_square == self._white_king_coords:
             x_dir = piece_square[0] - new_square[0]
             if abs(x_dir) > 1:
-                self._move_rook_when_castling(new_square, x_dir)
+                castle_undo = self._move_rook_when_castling(new_square, x_dir)
+
+        moved_piece = piece_sq
 
-        # PAWN PROMOTION
-        # TODO: Allow to choose how pawn is promoted
+        # PAWN PROMOTION - promotes to a Queen unless another piece is asked for.
         if self.check_if_pawn_promotion(piece_square, new_square):
-            piece_sq = Queen(piece_square, self._cur_player_is_white)
+            piece_sq = self._create_pawn_promotion_piece(promotion, piece_sq.is_white())
 
         # Update king position if king was moved
         if piece_square == self._black_king_coords:
@@ -168,14 +644,55 @@ class Board:
         elif piece_square == self._white_king_coords:
             self._white_king_coords = new_square
 
-        piece_sq.move(new_square)
+        piece_sq.move()
+
+        # Captures and pawn moves restart the fifty-move count, a full move ends with Black's move.
+        if new_sq.is_piece() or moved_piece.char_rep() == Pawn.char_rep():
+            self._halfmove_clock = 0
+        else:
+            self._halfmove_clock += 1
+        if not moved_piece.is_white():
+            self._fullmove_number += 1
 
         # Record that piece has been taken.
         if new_sq.is_piece():
             self._taken_pieces.append(new_sq)
 
         self.set_square(new_square, piece_sq)
-        self.set_square(piece_square, Square(piece_square))
+        self.set_square(piece_square, EMPTY_SQUARE)
+
+        if piece_square in CASTLING_SQUARES or new_square in CASTLING_SQUARES:
+            self._update_castling_rights()
+
+        return (piece_square, new_square, moved_piece, new_sq, had_moved, king_coords, taken_count,
+                castle_undo, en_passant_square, en_passant_undo, zobrist_key, castling_rights, move_counters)
+
+    def unmake_move(self, undo):
+        (piece_square, new_square, moved_piece, new_sq, had_moved, king_coords, taken_count,
+         castle_undo, en_passant_square, en_passant_undo, zobrist_key, castling_rights, move_counters) = undo
+
+        if castle_undo is not None:
+            former_rook_square, new_rook_square, former_rook_sq, new_rook_sq = castle_undo
+            self.set_square(former_rook_square, former_rook_sq)
+            self.set_square(new_rook_square, new_rook_sq)
+
+        # The original piece object is put back, so a promoted Queen is simply dropped.
+        if had_moved is not None:
+            moved_piece.set_has_moved(had_moved)
+
+        self.set_square(piece_square, moved_piece)
+        self.set_square(new_square, new_sq)
+
+        if en_passant_undo is not None:
+            self.set_square(*en_passant_undo)
+
+        self._white_king_coords, self._black_king_coords = king_coords
+        self._en_passant_square = en_passant_square
+        self._zobrist_key = zobrist_key
+        self._castling_rights = castling_rights
+        self._halfmove_clock, self._fullmove_number = move_counters
+        del self._taken_pieces[taken_count:]
+        self._key_history.pop()
 
     def check_if_pawn_promotion(self, piece_square, new_square):
         sq = self.get_square(piece_square)
@@ -187,57 +704,305 @@ class Board:
     def _move_rook_when_castling(self, new_square, x_dir):
         # Rook should go next to king, towards the centre.
         if x_dir > 0:
-            logging.info(f"Casting long: {new_square}")
             new_rook_x = new_square[0] + 1
             former_rook_x = 0
         else:
-            logging.info(f"Casting short: {new_square}")
             new_rook_x = new_square[0] - 1
             former_rook_x = self._board_size-1
 
+        if instrumentation.enabled:
+            instrumentation.count("castles")
+
         new_rook_square = (new_rook_x, new_square[1])
-        r = Rook(new_rook_square, self._cur_player_is_white)
+        former_rook_square = (former_rook_x, new_square[1])
+        castle_undo = former_rook_square, new_rook_square, self.get_square(former_rook_square), self.get_square(new_rook_square)
+
+        r = Rook(self._cur_player_is_white)
         r.set_has_moved(True)
 
         self.set_square(new_rook_square, r)
-        self.set_square((former_rook_x, new_square[1]), Square((former_rook_x, new_square[1])))
+        self.set_square(former_rook_square, EMPTY_SQUARE)
+
+        return castle_undo
 
     @staticmethod
-    def _create_pawn_promotion_piece(piece_square, piece_type, is_white):
+    def _create_pawn_promotion_piece(piece_type, is_white):
         if piece_type == Rook.char_rep():
-            return Rook(piece_square, is_white)
+            return Rook(is_white)
         elif piece_type == Knight.char_rep():
-            return Knight(piece_square, is_white)
+            return Knight(is_white)
         elif piece_type == Bishop.char_rep():
-            return Bishop(piece_square, is_white)
+            return Bishop(is_white)
         else:
-            return Queen(piece_square, is_white)
+            return Queen(is_white)
+
+    def _iter_attackers(self, square, by_white, ignore_square=None):
+        # Squares of by_white pieces attacking square. The piece on ignore_square is looked through,
+        # which is how a king is kept from stepping back along the ray of the piece checking it.
+        x, y = square
+
+        pawn_y = y - 1 if by_white else y + 1
+        for pawn_x in (x - 1, x + 1):
+            sq = self.get_square((pawn_x, pawn_y))
+            if sq is not None and sq.char_rep() == Pawn.char_rep() and sq.is_white() == by_white:
+                yield pawn_x, pawn_y
+
+        for offsets, char_rep in ((KNIGHT_OFFSETS, Knight.char_rep()), (KING_OFFSETS, King.char_rep())):
+            for x_off, y_off in offsets:
+                sq = self.get_square((x + x_off, y + y_off))
+                if sq is not None and sq.char_rep() == char_rep and sq.is_white() == by_white:
+                    yield x + x_off, y + y_off
+
+        for directions, char_rep in ((ROOK_DIRECTIONS, Rook.char_rep()), (BISHOP_DIRECTIONS, Bishop.char_rep())):
+            for x_dir, y_dir in directions:
+                ray_square = (x + x_dir, y + y_dir)
+                sq = self.get_square(ray_square)
+                while sq is not None:
+                    if sq.is_piece() and ray_square != ignore_square:
+                        if sq.is_white() == by_white and sq.char_rep() in (char_rep, Queen.char_rep()):
+                            yield ray_square
+                        break
+                    ray_square = (ray_square[0] + x_dir, ray_square[1] + y_dir)
+                    sq = self.get_square(ray_square)
+
+    def _legality_context(self):
+        # Checks and pins on the current player's king, found once per position so that moves can be
+        # judged legal without being played. Returns (king_square, checkers, pins, evasion_squares):
+        # pins maps a pinned piece's square to its pin direction and the pinning piece's square, and
+        # evasion_squares is None when not in check, otherwise the squares a non-king move must land on.
+        king_square = self.get_cur_king_coords()
+        is_white = self._cur_player_is_white
+        checkers = []
+        if self.is_square_attacked(king_square, not is_white):
+            checkers = list(self._iter_attackers(king_square, not is_white))
+
+        pins = {}
+        for directions, char_rep in ((ROOK_DIRECTIONS, Rook.char_rep()), (BISHOP_DIRECTIONS, Bishop.char_rep())):
+            for x_dir, y_dir in directions:
+                pinned_square = None
+                ray_square = (king_square[0] + x_dir, king_square[1] + y_dir)
+                sq = self.get_square(ray_square)
+                while sq is not None:
+                    if sq.is_piece():
+                        if sq.is_white() == is_white:
+                            if pinned_square is not None:
+                                break
+                            pinned_square = ray_square
+                        else:
+                            if pinned_square is not None and sq.char_rep() in (char_rep, Queen.char_rep()):
+                                pins[pinned_square] = (x_dir, y_dir), ray_square
+                            break
+                    ray_square = (ray_square[0] + x_dir, ray_square[1] + y_dir)
+                    sq = self.get_square(ray_square)
+
+        evasion_squares = None
+        if len(checkers) == 1:
+            # Capture the checking piece or, if it's a slider, block on a square between it and the king.
+            checker_square = checkers[0]
+            evasion_squares = {checker_square}
+            if self.get_square(checker_square).char_rep() in (Rook.char_rep(), Bishop.char_rep(), Queen.char_rep()):
+                x_diff = checker_square[0] - king_square[0]
+                y_diff = checker_square[1] - king_square[1]
+                x_dir = (x_diff > 0) - (x_diff < 0)
+                y_dir = (y_diff > 0) - (y_diff < 0)
+                for i in range(1, max(abs(x_diff), abs(y_diff))):
+                    evasion_squares.add((king_square[0] + i * x_dir, king_square[1] + i * y_dir))
+        elif checkers:
+            # Double check, only the king can move.
+            evasion_squares = set()
+
+        return king_square, checkers, pins, evasion_squares
+
+    def _check_move_legality(self, piece_square, new_square, context):
+        # Whether a pseudo-legal move leaves the mover's king safe, decided from the legality context.
+        king_square, checkers, pins, evasion_squares = context
+
+        if piece_square == king_square:
+            if self.is_square_attacked(new_square, not self._cur_player_is_white):
+                attacker = next(self._iter_attackers(new_square, not self._cur_player_is_white, king_square))
+                return False, MoveError(IN_CHECK, self.get_square(attacker), attacker)
+
+            # The maps see sliders stopped by the king, so the square behind it is checked separately.
+            for checker in checkers:
+                if self.get_square(checker).slide_directions():
+                    x_diff = king_square[0] - checker[0]
+                    y_diff = king_square[1] - checker[1]
+                    behind = (king_square[0] + (x_diff > 0) - (x_diff < 0), king_square[1] + (y_diff > 0) - (y_diff < 0))
+                    if new_square == behind:
+                        return False, MoveError(IN_CHECK, self.get_square(checker), checker)
+            return True, ""
 
-    def list_valid_moves_for_piece(self, piece_square):
-        valid_moves = []
-        for x in range(self._board_size):
-            for y in range(self._board_size):
-                res, _ = self.check_if_move_valid(piece_square, (x,y))
-                if res:
-                    valid_moves.append((x, y))
-        return valid_moves
+        piece_sq = self.get_square(piece_square)
+        if piece_sq.char_rep() == Pawn.char_rep() and new_square == self._en_passant_square \
+                and piece_square[0] != new_square[0]:
+            # En passant takes two pieces off a rank at once, which pins don't cover, so it is played out.
+            undo = self.make_move(piece_square, new_square)
+            is_check, err = self._find_check()
+            self.unmake_move(undo)
+            return not is_check, err
+
+        if evasion_squares is not None and new_square not in evasion_squares:
+            checker = checkers[0]
+            return False, MoveError(IN_CHECK, self.get_square(checker), checker)
+
+        if piece_square in pins:
+            (x_dir, y_dir), pinner = pins[piece_square]
+            # A pinned piece may only move along the line through its king and the pinning piece.
+            if (new_square[0] - king_square[0]) * y_dir != (new_square[1] - king_square[1]) * x_dir:
+                return False, MoveError(IN_CHECK, self.get_square(pinner), pinner)
+
+        return True, ""
 
+    def _list_legal_targets(self, piece_square, context):
+        piece_sq = self.get_square(piece_square)
+        targets = [new_square for new_square in piece_sq.generate_moves(piece_square, self)
+                   if self._check_move_legality(piece_square, new_square, context)[0]]
+        if instrumentation.enabled:
+            instrumentation.count("moves_generated", len(targets))
+        return targets
+
+    def _refresh_legal_targets(self):
+        if self._legal_targets_key != self._zobrist_key:
+            self._legal_targets = {}
+            self._legal_targets_key = self._zobrist_key
+            self._legal_targets_complete = False
+            self._legal_targets_context = None
+
+    def _get_piece_legal_targets(self, piece_square):
+        # Only for pieces of the player to move.
+        self._refresh_legal_targets()
+        targets = self._legal_targets.get(piece_square)
+        if targets is None:
+            if self._legal_targets_context is None:
+                self._legal_targets_context = self._legality_context()
+            targets = self._list_legal_targets(piece_square, self._legal_targets_context)
+            self._legal_targets[piece_square] = targets
+        return targets
+
+    def _get_legal_targets(self):
+        self._refresh_legal_targets()
+        if not self._legal_targets_complete:
+            for y, row in enumerate(self._board):
+                for x, sq in enumerate(row):
+                    if sq.is_piece() and sq.is_white() == self._cur_player_is_white:
+                        self._get_piece_legal_targets((x, y))
+            self._legal_targets_complete = True
+        return self._legal_targets
+
+    @instrumentation.timed
+    def list_valid_moves_for_piece(self, piece_square):
+        piece_sq = self.get_square(piece_square)
+        if not piece_sq.is_piece():
+            return []
+        if piece_sq.is_white() == self._cur_player_is_white:
+            return list(self._get_piece_legal_targets(piece_square))
+        return self._list_legal_targets(piece_square, self._legality_context())
+
+    @instrumentation.timed
+    def list_legal_moves(self):
+        # Every legal move for the current player as (piece_square, new_square, promotion) with
+        # one entry per promotion piece, which is the move list perft and engines want.
+        entry = self._get_position_entry()
+        if entry is None:
+            return self._generate_legal_moves()
+
+        legal_moves = entry.get_legal_moves()
+        if legal_moves is transposition.UNKNOWN:
+            legal_moves = self._generate_legal_moves()
+            entry.set_legal_moves(legal_moves)
+        return legal_moves
+
+    def _generate_legal_moves(self):
+        legal_moves = []
+        for piece_square, targets in self._get_legal_targets().items():
+            for new_square in targets:
+                if self.check_if_pawn_promotion(piece_square, new_square):
+                    for promotion in PROMOTION_PIECES:
+                        legal_moves.append((piece_square, new_square, promotion))
+                else:
+                    legal_moves.append((piece_square, new_square, None))
+        return legal_moves
+
+    @instrumentation.timed
     def list_valid_moves_for_player(self):
+        if self._transposition_table is not None:
+            # Derived from the cached move list, a promotion counts once as in list_valid_moves_for_piece().
+            return [new_square for _, new_square, promotion in self.list_legal_moves()
+                    if promotion is None or promotion == PROMOTION_PIECES[0]]
+
         possible_moves = []
-        for x in range(self._board_size):
-            for y in range(self._board_size):
-                sq = self.get_square((x, y))
-                if sq.is_piece() and sq.is_white() == self._cur_player_is_white:
-                    pieces_moves = self.list_valid_moves_for_piece((x, y))
-                    for p_m in pieces_moves:
-                        possible_moves.append(p_m)
+        for targets in self._get_legal_targets().values():
+            possible_moves.extend(targets)
         return possible_moves
 
+    @instrumentation.timed
+    def has_any_legal_move(self):
+        self._refresh_legal_targets()
+        if any(self._legal_targets.values()):
+            return True
+        if self._legal_targets_complete:
+            return False
+        return self._has_any_legal_move(self._legality_context())
+
+    def _has_any_legal_move(self, context):
+        # Stops at the first legal move rather than listing them all.
+        for y, row in enumerate(self._board):
+            for x, sq in enumerate(row):
+                if sq.is_piece() and sq.is_white() == self._cur_player_is_white:
+                    for new_square in sq.generate_moves((x, y), self):
+                        if self._check_move_legality((x, y), new_square, context)[0]:
+                            return True
+        return False
+
+    @instrumentation.timed
     def is_stalemate_or_checkmate(self):
-        x = self.list_valid_moves_for_player()
-        if len(x) == 0:
-            res, _ = self.is_cur_player_in_check()
-            if res:
+        # Mate and stalemate depend on the position alone and can be cached, the draws by rule also
+        # depend on how it was reached so they are checked afterwards.
+        entry = self._get_position_entry()
+        if entry is None:
+            game_over = self._find_stalemate_or_checkmate()
+        else:
+            game_over = entry.get_game_over()
+            if game_over is transposition.UNKNOWN:
+                game_over = self._find_stalemate_or_checkmate()
+                entry.set_game_over(game_over)
+                if game_over is not None and entry.get_check() is transposition.UNKNOWN:
+                    # The mate test found any checkers already, keep the check result it implies.
+                    checkers = self._legality_context()[1]
+                    entry.set_check((True, MoveError(IN_CHECK, self.get_square(checkers[0]), checkers[0]))
+                                    if checkers else (False, ""))
+
+        if game_over is None:
+            game_over = self.is_draw_by_rule()
+        return game_over
+
+    def is_draw_by_rule(self):
+        if self._halfmove_clock >= FIFTY_MOVE_PLIES:
+            return FIFTY_MOVE_RULE
+        if self.get_repetition_count() >= 2:
+            return THREEFOLD_REPETITION
+        return None
+
+    def get_repetition_count(self):
+        # Times the current position was reached before. Captures and pawn moves can't be undone, so
+        # only positions since the last one are scanned, and of those only every other one has the
+        # same player to move.
+        history = self._key_history
+        start = max(len(history) - self._halfmove_clock, 0)
+        count = 0
+        for index in range(len(history) - 2, start - 1, -2):
+            if history[index] == self._zobrist_key:
+                count += 1
+        return count
+
+    def _find_stalemate_or_checkmate(self):
+        self._refresh_legal_targets()
+        if any(self._legal_targets.values()):
+            return None
+        context = self._legality_context()
+        if not self._has_any_legal_move(context):
+            # Checkers were found with the context, so there is no separate check test.
+            if context[1]:
                 return "CHECKMATE"
             else:
                 return "STALEMATE"
@@ -245,10 +1010,11 @@ class Board:
 
 
 class Square:
-    def __init__(self, cur_square, **kwargs):
+    # Squares don't store their coordinates, a piece's position is its index in Board._board.
+    __slots__ = ()
+
+    def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self._cur_square = cur_square
-        logging.info("Square initialised - coords: {}".format(cur_square))
 
     @staticmethod
     def is_piece():
@@ -262,17 +1028,27 @@ class Square:
     def long_name():
         return "Square"
 
-    def get_cur_square(self):
-        return self._cur_square
+    @staticmethod
+    def zobrist_key(index):
+        # Empty squares add nothing to a position's key.
+        return 0
+
+    @staticmethod
+    def slide_directions():
+        return ()
 
-    def set_cur_square(self, cur_square):
-        self._cur_square = cur_square
+    def __reduce_ex__(self, protocol):
+        # Copies and pickles of the shared empty square resolve back to EMPTY_SQUARE.
+        if type(self) is Square:
+            return "EMPTY_SQUARE"
+        return super().__reduce_ex__(protocol)
 
     def __str__(self):
         return self.char_rep()
 
 
 class Piece(Square):
+    __slots__ = ('_is_white',)
 
     def __init__(self, is_white, **kwargs):
         super().__init__(**kwargs)
@@ -285,9 +1061,64 @@ class Piece(Square):
     def is_white(self):
         return self._is_white
 
-    def is_valid_move(self, new_square, board):
-        logging.warning("No move rules are defined for this - coords: {}".format(self._cur_square))
-        return False, "No move rules are defined for this - coords: {}".format(self._cur_square)
+    def zobrist_key(self, index):
+        return ZOBRIST_PIECE_KEYS[self.char_rep(), self._is_white][index]
+
+    def generate_moves(self, cur_square, board):
+        # No move rules are defined for a bare Piece.
+        return iter(())
+
+    def generate_attacks(self, cur_square, board):
+        # Squares this piece attacks, own pieces included since those are defended. Sliders stop at the
+        # first piece, stepping pieces attack every offset on the board.
+        cur_x, cur_y = cur_square
+        for x_dir, y_dir in self.slide_directions():
+            x = cur_x + x_dir
+            y = cur_y + y_dir
+            sq = board.get_square((x, y))
+            while sq is not None:
+                yield x, y
+                if sq.is_piece():
+                    break
+                x += x_dir
+                y += y_dir
+                sq = board.get_square((x, y))
+
+    def _generate_offset_attacks(self, cur_square, board, offsets):
+        cur_x, cur_y = cur_square
+        for x_off, y_off in offsets:
+            new_square = (cur_x + x_off, cur_y + y_off)
+            if board.get_square(new_square) is not None:
+                yield new_square
+
+    def _generate_ray_moves(self, cur_square, board, directions):
+        # Walk each ray until it leaves the board or hits a piece; enemy pieces can be captured.
+        cur_x, cur_y = cur_square
+        for x_dir, y_dir in directions:
+            x = cur_x + x_dir
+            y = cur_y + y_dir
+            sq = board.get_square((x, y))
+            while sq is not None:
+                if sq.is_piece():
+                    if sq.is_white() != self._is_white:
+                        yield x, y
+                    break
+                yield x, y
+                x += x_dir
+                y += y_dir
+                sq = board.get_square((x, y))
+
+    def _generate_offset_moves(self, cur_square, board, offsets):
+        cur_x, cur_y = cur_square
+        for x_off, y_off in offsets:
+            new_square = (cur_x + x_off, cur_y + y_off)
+            sq = board.get_square(new_square)
+            if sq is not None and not (sq.is_piece() and sq.is_white() == self._is_white):
+                yield new_square
+
+    def is_valid_move(self, cur_square, new_square, board):
+        logging.warning("No move rules are defined for this - coords: %s", cur_square)
+        return False, MoveError(NO_MOVE_RULES, square=cur_square)
 
     def __str__(self):
         if self._is_white:
@@ -297,6 +1128,8 @@ class Piece(Square):
 
 
 class HasMovedMixin:
+    # The _has_moved slot is declared on the concrete pieces, two slotted bases can't be combined.
+    __slots__ = ()
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -310,10 +1143,10 @@ class HasMovedMixin:
 
 
 class Pawn(Piece, HasMovedMixin):
-    def __init__(self, cur_square, is_white):
-        super().__init__(cur_square=cur_square, is_white=is_white)
+    __slots__ = ('_has_moved',)
 
-        logging.info("Pawn initialised - coords: {}, is_white: {}".format(cur_square, is_white))
+    def __init__(self, is_white):
+        super().__init__(is_white=is_white)
 
     @staticmethod
     def char_rep():
@@ -324,10 +1157,9 @@ class Pawn(Piece, HasMovedMixin):
         return "Pawn"
 
     @is_landing_square_occupied
-    def is_valid_move(self, new_square, board):
-        logging.info("Checking validity of Pawn move from {} to {}".format(self._cur_square, new_square))
-        x_diff = self._cur_square[0] - new_square[0]
-        y_diff = self._cur_square[1] - new_square[1]
+    def is_valid_move(self, cur_square, new_square, board):
+        x_diff = cur_square[0] - new_square[0]
+        y_diff = cur_square[1] - new_square[1]
 
         # White and Black pawns move in opposite directions
         if self._is_white:
@@ -335,62 +1167,90 @@ class Pawn(Piece, HasMovedMixin):
 
         # Pawns cannot move backwards and Pawns must move.
         if y_diff < 1:
-            return False, "Pawns must at least 1 square forward."
+            return False, MoveError(PAWN_NOT_FORWARD)
 
         # Pawns cannot move more that 1 square (or 2 square on first move)
         if y_diff > 2 or y_diff > 1 and self.get_has_moved():
-            return False, "Pawns cannot move forward more that 1 square (or 2 square on first move)"
+            return False, MoveError(PAWN_TOO_FAR)
 
         # Pawns cannot move more than 1 square on x-axis (and only occurs during capture)
         if abs(x_diff) > 1:
-            return False, "Pawns cannot move more than 1 square on x-axis (only during captures)"
+            return False, MoveError(PAWN_TOO_WIDE)
 
         # Check if move is an attack
         if x_diff == 0:
             # move is not a capture, check if squares between cur square and square to move to are empty
             if self._is_white:
-                for y in range(self._cur_square[1] + 1, new_square[1] + 1):
+                for y in range(cur_square[1] + 1, new_square[1] + 1):
                     square_to_check = board.get_square((new_square[0], y))
                     if square_to_check.is_piece():
-                        return False, "Pawn is blocked by {} on {}".format(
-                            square_to_check.long_name(),
-                            (new_square[0], y)
-                        )
+                        return False, MoveError(PAWN_BLOCKED, square_to_check, (new_square[0], y))
 
             else:
-                for y in range(new_square[1], self._cur_square[1]):
+                for y in range(new_square[1], cur_square[1]):
                     square_to_check = board.get_square((new_square[0], y))
                     if square_to_check.is_piece():
-                        return False, "Pawn is blocked by {} on {}".format(
-                            square_to_check.long_name(),
-                            (new_square[0], y)
-                        )
+                        return False, MoveError(PAWN_BLOCKED, square_to_check, (new_square[0], y))
 
             return True, ""
 
         else:
             # Pawns capture 1 square diagonally.
             if y_diff != 1:
-                return False, "Pawns only capture 1 square diagonally."
+                return False, MoveError(PAWN_CAPTURE_TOO_FAR)
 
             square_to_check = board.get_square(new_square)
-            if not square_to_check.is_piece():
-                return False, "Cannot move diagonally unless it's a capture."
+            if not square_to_check.is_piece() and not self._is_en_passant_capture(cur_square, new_square, board):
+                return False, MoveError(PAWN_DIAGONAL_NOT_CAPTURE)
 
             return True, ""
 
-    def move(self, new_square):
-        logging.info("Updating Pawn variables after move")
-        self._cur_square = new_square
+    def generate_moves(self, cur_square, board):
+        cur_x, cur_y = cur_square
+        y_dir = 1 if self._is_white else -1
+
+        # Pushes: one square, or two on the first move, onto empty squares only.
+        one_forward = (cur_x, cur_y + y_dir)
+        sq = board.get_square(one_forward)
+        if sq is not None and not sq.is_piece():
+            yield one_forward
+
+            if not self.get_has_moved():
+                two_forward = (cur_x, cur_y + 2 * y_dir)
+                sq = board.get_square(two_forward)
+                if sq is not None and not sq.is_piece():
+                    yield two_forward
+
+        # Captures: one square diagonally forward onto an enemy piece, or onto the en passant square.
+        for x_dir in (-1, 1):
+            new_square = (cur_x + x_dir, cur_y + y_dir)
+            sq = board.get_square(new_square)
+            if sq is not None and sq.is_piece() and sq.is_white() != self._is_white:
+                yield new_square
+            elif sq is not None and self._is_en_passant_capture(cur_square, new_square, board):
+                yield new_square
+
+    def generate_attacks(self, cur_square, board):
+        y_dir = 1 if self._is_white else -1
+        return self._generate_offset_attacks(cur_square, board, ((-1, y_dir), (1, y_dir)))
+
+    def _is_en_passant_capture(self, cur_square, new_square, board):
+        if new_square != board.get_en_passant_square():
+            return False
+        # The pawn that double pushed must be an enemy pawn beside this one.
+        captured = board.get_square((new_square[0], cur_square[1]))
+        return captured.char_rep() == Pawn.char_rep() and captured.is_white() != self._is_white
+
+    def move(self):
         if not self.get_has_moved():
             self.set_has_moved(True)
 
 
 class Rook(Piece, HasMovedMixin):
-    def __init__(self, cur_square, is_white):
-        super().__init__(cur_square=cur_square, is_white=is_white)
+    __slots__ = ('_has_moved',)
 
-        logging.info("Rook initialised - coords: {}, is_white: {}".format(cur_square, is_white))
+    def __init__(self, is_white):
+        super().__init__(is_white=is_white)
 
     @staticmethod
     def char_rep():
@@ -401,14 +1261,13 @@ class Rook(Piece, HasMovedMixin):
         return "Rook"
 
     @is_landing_square_occupied
-    def is_valid_move(self, new_square, board):
-        logging.info("Checking validity of Rook move from {} to {}".format(self._cur_square, new_square))
-        x_diff = self._cur_square[0] - new_square[0]
-        y_diff = self._cur_square[1] - new_square[1]
+    def is_valid_move(self, cur_square, new_square, board):
+        x_diff = cur_square[0] - new_square[0]
+        y_diff = cur_square[1] - new_square[1]
 
         # Rooks can only move along one axis at a time.
         if abs(x_diff) > 0 and abs(y_diff) > 0:
-            return False, "Rooks can only move along one axis at a time."
+            return False, MoveError(ROOK_NOT_STRAIGHT)
 
         loop_inc = -1
         if x_diff < 0 or y_diff < 0:
@@ -417,34 +1276,38 @@ class Rook(Piece, HasMovedMixin):
         # Check for pieces between cur square and new square.
         if abs(y_diff) > 0:
             # Check all squares leading up to landing square for pieces.
-            for y in range(self._cur_square[1] + loop_inc, new_square[1], loop_inc):
-                tmp_coord = (self._cur_square[0], y)
-                logging.debug("Checking square {}".format(tmp_coord))
+            for y in range(cur_square[1] + loop_inc, new_square[1], loop_inc):
+                tmp_coord = (cur_square[0], y)
                 square_to_check = board.get_square(tmp_coord)
                 if square_to_check.is_piece():
-                    return False, "Rook is blocked by {} on {}".format(square_to_check.long_name(), tmp_coord)
+                    return False, MoveError(ROOK_BLOCKED, square_to_check, tmp_coord)
         else:
             # Check all squares leading up to landing square for pieces.
-            for x in range(self._cur_square[0] + loop_inc, new_square[0], loop_inc):
-                tmp_coord = (x, self._cur_square[1])
-                logging.debug("Checking square {}".format(tmp_coord))
+            for x in range(cur_square[0] + loop_inc, new_square[0], loop_inc):
+                tmp_coord = (x, cur_square[1])
                 square_to_check = board.get_square(tmp_coord)
                 if square_to_check.is_piece():
-                    return False, "Rook is blocked by {} on {}".format(square_to_check.long_name(), tmp_coord)
+                    return False, MoveError(ROOK_BLOCKED, square_to_check, tmp_coord)
 
         return True, ""
 
-    def move(self, new_square):
-        logging.info("Updating Rook variables after move")
-        self._cur_square = new_square
+    def generate_moves(self, cur_square, board):
+        return self._generate_ray_moves(cur_square, board, ROOK_DIRECTIONS)
+
+    @staticmethod
+    def slide_directions():
+        return ROOK_DIRECTIONS
+
+    def move(self):
         if not self.get_has_moved():
             self.set_has_moved(True)
 
 
 class Bishop(Piece):
-    def __init__(self, cur_square, is_white):
-        super().__init__(cur_square=cur_square, is_white=is_white)
-        logging.info("Bishop initialised - coords: {}, is_white: {}".format(cur_square, is_white))
+    __slots__ = ()
+
+    def __init__(self, is_white):
+        super().__init__(is_white=is_white)
 
     @staticmethod
     def char_rep():
@@ -455,13 +1318,12 @@ class Bishop(Piece):
         return "Bishop"
 
     @is_landing_square_occupied
-    def is_valid_move(self, new_square, board):
-        cur_square = self.get_cur_square()
+    def is_valid_move(self, cur_square, new_square, board):
         x_diff = cur_square[0] - new_square[0]
         y_diff = cur_square[1] - new_square[1]
 
         if abs(x_diff) != abs(y_diff):
-            return False, "Bishops only move diagonally!"
+            return False, MoveError(BISHOP_NOT_DIAGONAL)
 
         x_inc = -1
         if x_diff < 0:
@@ -475,19 +1337,26 @@ class Bishop(Piece):
             tmp_coord = (cur_square[0] + (i * x_inc), cur_square[1] + (i * y_inc))
             sq_to_check = board.get_square(tmp_coord)
             if sq_to_check.is_piece():
-                return False, "Bishop is blocked by {} on {}".format(sq_to_check.long_name(), tmp_coord)
+                return False, MoveError(BISHOP_BLOCKED, sq_to_check, tmp_coord)
 
         return True, ""
 
-    def move(self, new_square):
-        logging.info("Updating Bishop variables after move")
-        self._cur_square = new_square
+    def generate_moves(self, cur_square, board):
+        return self._generate_ray_moves(cur_square, board, BISHOP_DIRECTIONS)
+
+    @staticmethod
+    def slide_directions():
+        return BISHOP_DIRECTIONS
+
+    def move(self):
+        pass
 
 
 class Knight(Piece):
-    def __init__(self, cur_square, is_white):
-        super().__init__(cur_square=cur_square, is_white=is_white)
-        logging.info("Knight initialised - coords: {}, is_white: {}".format(cur_square, is_white))
+    __slots__ = ()
+
+    def __init__(self, is_white):
+        super().__init__(is_white=is_white)
 
     @staticmethod
     def char_rep():
@@ -498,8 +1367,7 @@ class Knight(Piece):
         return "Knight"
 
     @is_landing_square_occupied
-    def is_valid_move(self, new_square, board):
-        cur_square = self.get_cur_square()
+    def is_valid_move(self, cur_square, new_square, board):
         x_diff = cur_square[0] - new_square[0]
         y_diff = cur_square[1] - new_square[1]
 
@@ -507,19 +1375,25 @@ class Knight(Piece):
         abs_y = abs(y_diff)
 
         if not (abs_x == 2 and abs_y == 1 or abs_x == 1 and abs_y == 2):
-            return False, "Knights move in L-shapes. (1 square on one axis and 2 along another.)"
+            return False, MoveError(KNIGHT_NOT_L_SHAPE)
 
         return True, ""
 
-    def move(self, new_square):
-        logging.info("Updating Knight variables after move")
-        self._cur_square = new_square
+    def generate_moves(self, cur_square, board):
+        return self._generate_offset_moves(cur_square, board, KNIGHT_OFFSETS)
+
+    def generate_attacks(self, cur_square, board):
+        return self._generate_offset_attacks(cur_square, board, KNIGHT_OFFSETS)
+
+    def move(self):
+        pass
 
 
 class Queen(Piece):
-    def __init__(self, cur_square, is_white):
-        super().__init__(cur_square=cur_square, is_white=is_white)
-        logging.info("Queen initialised - coords: {}, is_white: {}".format(cur_square, is_white))
+    __slots__ = ()
+
+    def __init__(self, is_white):
+        super().__init__(is_white=is_white)
 
     @staticmethod
     def char_rep():
@@ -530,8 +1404,7 @@ class Queen(Piece):
         return "Queen"
 
     @is_landing_square_occupied
-    def is_valid_move(self, new_square, board):
-        cur_square = self.get_cur_square()
+    def is_valid_move(self, cur_square, new_square, board):
         x_diff = cur_square[0] - new_square[0]
         y_diff = cur_square[1] - new_square[1]
 
@@ -548,20 +1421,18 @@ class Queen(Piece):
 
             if abs_y > 0:
                 # Check all squares leading up to landing square for pieces.
-                for y in range(self._cur_square[1] + loop_inc, new_square[1], loop_inc):
-                    tmp_coord = (self._cur_square[0], y)
-                    logging.debug("Checking square {}".format(tmp_coord))
+                for y in range(cur_square[1] + loop_inc, new_square[1], loop_inc):
+                    tmp_coord = (cur_square[0], y)
                     square_to_check = board.get_square(tmp_coord)
                     if square_to_check.is_piece():
-                        return False, "Rook is blocked by {} on {}".format(square_to_check.long_name(), tmp_coord)
+                        return False, MoveError(ROOK_BLOCKED, square_to_check, tmp_coord)
             else:
                 # Check all squares leading up to landing square for pieces.
-                for x in range(self._cur_square[0] + loop_inc, new_square[0], loop_inc):
-                    tmp_coord = (x, self._cur_square[1])
-                    logging.debug("Checking square {}".format(tmp_coord))
+                for x in range(cur_square[0] + loop_inc, new_square[0], loop_inc):
+                    tmp_coord = (x, cur_square[1])
                     square_to_check = board.get_square(tmp_coord)
                     if square_to_check.is_piece():
-                        return False, "Rook is blocked by {} on {}".format(square_to_check.long_name(), tmp_coord)
+                        return False, MoveError(ROOK_BLOCKED, square_to_check, tmp_coord)
 
         # Check if moving diagonally
         elif abs_x == abs_y:
@@ -579,22 +1450,29 @@ class Queen(Piece):
                 tmp_coord = (cur_square[0] + (i * x_inc), cur_square[1] + (i * y_inc))
                 sq_to_check = board.get_square(tmp_coord)
                 if sq_to_check.is_piece():
-                    return False, "Bishop is blocked by {} on {}".format(sq_to_check.long_name(), tmp_coord)
+                    return False, MoveError(BISHOP_BLOCKED, sq_to_check, tmp_coord)
 
         else:
-            return False, "Queens move diagonally or in a straight line!"
+            return False, MoveError(QUEEN_NOT_LINE)
 
         return True, ""
 
-    def move(self, new_square):
-        logging.info("Updating Queen variables after move")
-        self._cur_square = new_square
+    def generate_moves(self, cur_square, board):
+        return self._generate_ray_moves(cur_square, board, QUEEN_DIRECTIONS)
+
+    @staticmethod
+    def slide_directions():
+        return QUEEN_DIRECTIONS
+
+    def move(self):
+        pass
 
 
 class King(Piece, HasMovedMixin):
-    def __init__(self, cur_square, is_white):
-        super().__init__(cur_square=cur_square, is_white=is_white)
-        logging.info("King initialised - coords: {}, is_white: {}".format(cur_square, is_white))
+    __slots__ = ('_has_moved',)
+
+    def __init__(self, is_white):
+        super().__init__(is_white=is_white)
 
     @staticmethod
     def char_rep():
@@ -604,98 +1482,26 @@ class King(Piece, HasMovedMixin):
     def long_name():
         return "King"
 
-    def is_in_check(self, board):
-
-        size = board.get_board_size()
-        cur_square_coords = self.get_cur_square()
-
-        direction = [1, -1]
-        for x_dir in direction:
-            x = cur_square_coords[0] + 1
-            if x_dir > 0:
-                x = size - cur_square_coords[0]
-
-            for y_dir in direction:
-                y = cur_square_coords[1] + 1
-                if y_dir > 0:
-                    y = size - cur_square_coords[1]
-
-                # BISHOPS/QUEENS - Check if there are any enemy queens or bishops on open diagonals.
-                loop_count = min([x, y])
-                for i in range(1, loop_count):
-                    sq_coords = (cur_square_coords[0] + (i * x_dir), cur_square_coords[1] + (i * y_dir))
-                    sq = board.get_square(sq_coords)
-                    if sq.is_piece():
-                        if sq.is_white() != self.is_white():
-                            if sq.char_rep() == Bishop.char_rep() or sq.char_rep() == Queen.char_rep():
-                                return True, "In check: Enemy {} on {}".format(sq.long_name(), sq_coords)
-                        break
-
-                # KNIGHTS - If Knight is an L-shape away from king, then you're in check.
-                knight_coords = [(cur_square_coords[0] + (2 * x_dir), cur_square_coords[1] + y_dir),
-                                 (cur_square_coords[0] + x_dir, cur_square_coords[1] + (2 * y_dir))]
-
-                for coord in knight_coords:
-                    sq = board.get_square(coord)
-                    if sq is not None and sq.char_rep() == Knight.char_rep() and self.is_white() != sq.is_white():
-                        return True, "In check: Enemy {} on {}".format(sq.long_name(), coord)
-
-                # ROOKS/QUEENS - Check if there are any enemy queens or rooks on open files
-                for i in range(1, y):
-                    sq_coords = (cur_square_coords[0], cur_square_coords[1] + (i * y_dir))
-                    sq = board.get_square(sq_coords)
-                    if sq.is_piece():
-                        if sq.is_white() != self.is_white():
-                            if sq.char_rep() == Rook.char_rep() or sq.char_rep() == Queen.char_rep():
-                                return True, "In check: Enemy {} on {}".format(sq.long_name(), sq_coords)
-                        break
-
-            # ROOKS/QUEENS - Check if there are any enemy queens or rooks on open ranks
-            for i in range(1, x):
-                sq_coords = (cur_square_coords[0] + (i * x_dir), cur_square_coords[1])
-                sq = board.get_square(sq_coords)
-                if sq.is_piece():
-                    if sq.is_white() != self.is_white():
-                        if sq.char_rep() == Rook.char_rep() or sq.char_rep() == Queen.char_rep():
-                            return True, "In check: Enemy {} on {}".format(sq.long_name(), sq_coords)
-                    break
-
-            # PAWNS - If Pawn is on top adjacent diagonal squares (bottom diagonals for white), then you're in check.
-            if self.is_white():
-                sq_coords = (cur_square_coords[0] + (1 * x_dir), cur_square_coords[1] + 1)
-            else:
-                sq_coords = (cur_square_coords[0] + (1 * x_dir), cur_square_coords[1] - 1)
-
-            sq = board.get_square(sq_coords)
-
-            if sq is not None and sq.char_rep() == Pawn.char_rep() and self.is_white() != sq.is_white():
-                return True, "In check: Enemy {} on {}".format(sq.long_name(), sq_coords)
-
-        # If King is adjacent its "check"
-        square_to_check = [1, 0, -1]
-        for x in square_to_check:
-            for y in square_to_check:
-                if x == 0 and y == 0:
-                    continue
+    def is_in_check(self, cur_square, board):
+        # Answered from the board's attack maps, the attacker is only looked up to explain the check.
+        if instrumentation.enabled:
+            instrumentation.count("check_tests")
+        if not board.is_square_attacked(cur_square, not self._is_white):
+            return False, ""
 
-                sq_coords = (cur_square_coords[0] + x, cur_square_coords[1] + y)
-                sq = board.get_square(sq_coords)
-                if sq is not None and sq.char_rep() == King.char_rep():
-                    return True, "In check: Enemy {} on {}".format(sq.long_name(),sq_coords)
-
-        return False, ""
+        attacker = next(board._iter_attackers(cur_square, not self._is_white))
+        return True, MoveError(IN_CHECK, board.get_square(attacker), attacker)
 
     @is_landing_square_occupied
-    def is_valid_move(self, new_square, board):
-        cur_square = self.get_cur_square()
+    def is_valid_move(self, cur_square, new_square, board):
         x_diff = cur_square[0] - new_square[0]
         y_diff = cur_square[1] - new_square[1]
         abs_x = abs(x_diff)
         abs_y = abs(y_diff)
 
         if self._has_moved is False and abs_x == 2 and abs_y == 0:
-            if board.is_cur_player_in_check() is False:
-                return False, "Cannot castle when in check"
+            if board.is_cur_player_in_check()[0]:
+                return False, MoveError(CASTLE_IN_CHECK)
 
             # TODO: If expanding for Chess960 rules, will need to be more dynamic.
             if x_diff > 0:
@@ -703,43 +1509,54 @@ class King(Piece, HasMovedMixin):
                 for i in range(rook_x+1, cur_square[0]):
                     piece = board.get_square((i, cur_square[1]))
                     if piece.is_piece():
-                        return False, "Cannot castle, {} on {}".format(piece.char_rep(), (i, cur_square[1]))
+                        return False, MoveError(CASTLE_BLOCKED, piece, (i, cur_square[1]))
 
                 # Would king be in check if moved to any of travelled squares?
                 for i in range(rook_x+2, cur_square[0]):
-                    tmp_board = deepcopy(board)
-                    tmp_board.move_piece(cur_square, (i, cur_square[1]))
-                    is_check, err = tmp_board.is_cur_player_in_check()
-                    if is_check is True:
-                        return False, "Cannot castle, Would result in check on {}".format((i, cur_square[1]))
+                    if board.is_square_attacked((i, cur_square[1]), not self._is_white):
+                        return False, MoveError(CASTLE_THROUGH_CHECK, square=(i, cur_square[1]))
 
             else:
                 rook_x = 7
                 for i in range(cur_square[0]+1, rook_x):
                     piece = board.get_square((i, cur_square[1]))
                     if piece.is_piece():
-                        return False, "Cannot castle, {} on {}".format(piece.char_rep(), (i, cur_square[1]))
+                        return False, MoveError(CASTLE_BLOCKED, piece, (i, cur_square[1]))
 
                 for i in range(cur_square[0]+1, rook_x-1):
-                    tmp_board = deepcopy(board)
-                    tmp_board.move_piece(cur_square, (i, cur_square[1]))
-                    is_check, err = tmp_board.is_cur_player_in_check()
-                    if is_check is True:
-                        return False, "Cannot castle, Would result in check on {}".format((i, cur_square[1]))
+                    if board.is_square_attacked((i, cur_square[1]), not self._is_white):
+                        return False, MoveError(CASTLE_THROUGH_CHECK, square=(i, cur_square[1]))
 
             rook = board.get_square((rook_x, cur_square[1]))
             if rook.char_rep() != Rook.char_rep() or rook.get_has_moved() is True:
-                return False, "Rook on {} has already moved!".format((rook_x, cur_square[1]))
+                return False, MoveError(CASTLE_ROOK_MOVED, square=(rook_x, cur_square[1]))
 
             return True, ""
 
         if abs_x > 1 or abs_y > 1:
-            return False, "The King can only move one square at a time!"
+            return False, MoveError(KING_TOO_FAR)
 
         return True, ""
 
-    def move(self, new_square):
-        logging.info("Updating Rook variables after move")
-        self._cur_square = new_square
+    def generate_attacks(self, cur_square, board):
+        return self._generate_offset_attacks(cur_square, board, KING_OFFSETS)
+
+    def generate_moves(self, cur_square, board):
+        yield from self._generate_offset_moves(cur_square, board, KING_OFFSETS)
+
+        # Castling: is_valid_move checks the path, the rook and the squares the king passes through.
+        if not self._has_moved:
+            cur_x, cur_y = cur_square
+            for new_square in ((cur_x - 2, cur_y), (cur_x + 2, cur_y)):
+                if board.get_square(new_square) is not None and self.is_valid_move(cur_square, new_square, board)[0]:
+                    yield new_square
+
+    def move(self):
         if not self.get_has_moved():
             self.set_has_moved(True)
+
+
+# Every empty square on every board is this one immutable object.
+EMPTY_SQUARE = Square()
+
+FEN_PIECE_CLASSES = {piece_cls.char_rep(): piece_cls for piece_cls in (Pawn, Knight, Bishop, Rook, Queen, King)}
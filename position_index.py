@@ -0,0 +1,179 @@
+import argparse
+import bisect
+import heapq
+import itertools
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+
+import archive
+import pieces
+
+
+# Layout: header (magic, version, byte order, posting count), then every position key sorted
+# ascending, then the posting for each key, game id << 16 | ply. Both arrays are in the byte order
+# of the machine that built the index so they can be used straight from the mapped file.
+MAGIC = b"DCPI"
+# Version 2 keys hash the en passant file only when a capture is possible, so version 1 files would
+# miss transpositions and are rebuilt rather than read.
+VERSION = 2
+HEADER = struct.Struct("<4sHcxQ")
+BYTE_ORDER = sys.byteorder[0].encode("ascii")
+
+PLY_BITS = 16
+PLY_MASK = (1 << PLY_BITS) - 1
+
+# Postings held in memory while building, around 100 bytes each as tuples in a list.
+DEFAULT_RUN_SIZE = 500000
+# Records read from each run at a time while merging.
+MERGE_BLOCK = 16384
+
+
+def _write_run(postings, directory, run_number):
+    postings.sort()
+    path = os.path.join(directory, "run{}".format(run_number))
+    with open(path, "wb") as run_file:
+        array('Q', (key for key, _ in postings)).tofile(run_file)
+        array('Q', (posting for _, posting in postings)).tofile(run_file)
+    return path, len(postings)
+
+
+def _read_run(path, count):
+    # Streams a sorted run back as (key, posting) pairs, a block of each array at a time.
+    with open(path, "rb") as keys_file, open(path, "rb") as postings_file:
+        postings_file.seek(count * 8)
+        remaining = count
+        while remaining:
+            block = min(remaining, MERGE_BLOCK)
+            keys = array('Q')
+            keys.fromfile(keys_file, block)
+            postings = array('Q')
+            postings.fromfile(postings_file, block)
+            yield from zip(keys, postings)
+            remaining -= block
+
+
+def iter_archive_postings(archive_path):
+    with archive.ArchiveReader(archive_path) as reader:
+        for game_id in range(len(reader)):
+            for ply, board in enumerate(reader.iter_positions(game_id)):
+                # The key ignores how the position was reached, so transposed move orders share postings.
+                yield board.get_zobrist_key(), game_id << PLY_BITS | ply
+
+
+def build_index(postings, index_path, run_size=DEFAULT_RUN_SIZE):
+    # External sort: postings are cut into runs of run_size, each sorted and spilled to a temporary
+    # file, then the runs are merged straight into the index. Memory stays at one run plus a block
+    # per run during the merge, whatever the number of postings.
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(index_path))) as directory:
+        runs = []
+        postings = iter(postings)
+        while True:
+            run = list(itertools.islice(postings, run_size))
+            if not run:
+                break
+            runs.append(_write_run(run, directory, len(runs)))
+
+        total = sum(count for _, count in runs)
+        with open(index_path, "wb") as index_file:
+            index_file.write(HEADER.pack(MAGIC, VERSION, BYTE_ORDER, total))
+            index_file.truncate(HEADER.size + 16 * total)
+
+        # Keys and postings are written by two handles, each filling its own section in order.
+        with open(index_path, "r+b") as keys_file, open(index_path, "r+b") as postings_file:
+            keys_file.seek(HEADER.size)
+            postings_file.seek(HEADER.size + 8 * total)
+            merged = heapq.merge(*(_read_run(path, count) for path, count in runs))
+            while True:
+                block = list(itertools.islice(merged, MERGE_BLOCK))
+                if not block:
+                    break
+                array('Q', (key for key, _ in block)).tofile(keys_file)
+                array('Q', (posting for _, posting in block)).tofile(postings_file)
+    return total
+
+
+class PositionIndex:
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        header = self._file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            self._file.close()
+            raise ValueError("{} is too short to be a position index".format(path))
+        magic, version, byte_order, count = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            self._file.close()
+            raise ValueError("{} isn't a version {} position index".format(path, VERSION))
+        if byte_order != BYTE_ORDER:
+            self._file.close()
+            raise ValueError("{} was built on a machine with the other byte order".format(path))
+
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        with memoryview(self._map) as view:
+            self._keys = view[HEADER.size:HEADER.size + 8 * count].cast('Q')
+            self._postings = view[HEADER.size + 8 * count:HEADER.size + 16 * count].cast('Q')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def close(self):
+        # Views into the map have to be released before the map can close.
+        self._keys.release()
+        self._postings.release()
+        self._map.close()
+        self._file.close()
+
+    def lookup(self, key):
+        # (game id, ply) of every time a position with this key was reached, by binary search.
+        start = bisect.bisect_left(self._keys, key)
+        end = bisect.bisect_right(self._keys, key, start)
+        return [(posting >> PLY_BITS, posting & PLY_MASK) for posting in self._postings[start:end]]
+
+    def lookup_board(self, board):
+        return self.lookup(board.get_zobrist_key())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index the positions of a game archive, or ask which games reached one.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="index every position of a game archive")
+    build_parser.add_argument("archive", help="game archive to read")
+    build_parser.add_argument("index", help="index file to write")
+    build_parser.add_argument("--run-size", type=int, default=DEFAULT_RUN_SIZE, help="postings sorted in memory at once")
+    query_parser = subparsers.add_parser("query", help="list the games that reached a position")
+    query_parser.add_argument("index", help="index file to read")
+    query_parser.add_argument("fen", nargs="?", default=pieces.START_FEN, help="position to look up")
+    query_parser.add_argument("--limit", type=int, default=20, help="games to print at most")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        total = build_index(iter_archive_postings(args.archive), args.index, args.run_size)
+        print("{:,} positions indexed in {:.2f}s, {:,} bytes".format(
+            total, time.perf_counter() - start, os.path.getsize(args.index)))
+        return 0
+
+    key = pieces.Board.from_fen(args.fen).get_zobrist_key()
+    with PositionIndex(args.index) as index:
+        start = time.perf_counter()
+        postings = index.lookup(key)
+        elapsed = time.perf_counter() - start
+    for game_id, ply in postings[:args.limit]:
+        print("game {} ply {}".format(game_id, ply))
+    print("{:,} postings in {:.3f}ms".format(len(postings), elapsed * 1e3))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+import time
+
+import pieces
+
+
+PIECE_VALUES = {'P': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0}
+
+# Piece-square bonuses from white's point of view, written rank 8 first so they read like a board.
+# Black looks them up mirrored.
+PIECE_SQUARE_TABLES = {
+    'P': ((0, 0, 0, 0, 0, 0, 0, 0),
+          (50, 50, 50, 50, 50, 50, 50, 50),
+          (10, 10, 20, 30, 30, 20, 10, 10),
+          (5, 5, 10, 25, 25, 10, 5, 5),
+          (0, 0, 0, 20, 20, 0, 0, 0),
+          (5, -5, -10, 0, 0, -10, -5, 5),
+          (5, 10, 10, -20, -20, 10, 10, 5),
+          (0, 0, 0, 0, 0, 0, 0, 0)),
+    'N': ((-50, -40, -30, -30, -30, -30, -40, -50),
+          (-40, -20, 0, 0, 0, 0, -20, -40),
+          (-30, 0, 10, 15, 15, 10, 0, -30),
+          (-30, 5, 15, 20, 20, 15, 5, -30),
+          (-30, 0, 15, 20, 20, 15, 0, -30),
+          (-30, 5, 10, 15, 15, 10, 5, -30),
+          (-40, -20, 0, 5, 5, 0, -20, -40),
+          (-50, -40, -30, -30, -30, -30, -40, -50)),
+    'B': ((-20, -10, -10, -10, -10, -10, -10, -20),
+          (-10, 0, 0, 0, 0, 0, 0, -10),
+          (-10, 0, 5, 10, 10, 5, 0, -10),
+          (-10, 5, 5, 10, 10, 5, 5, -10),
+          (-10, 0, 10, 10, 10, 10, 0, -10),
+          (-10, 10, 10, 10, 10, 10, 10, -10),
+          (-10, 5, 0, 0, 0, 0, 5, -10),
+          (-20, -10, -10, -10, -10, -10, -10, -20)),
+    'R': ((0, 0, 0, 0, 0, 0, 0, 0),
+          (5, 10, 10, 10, 10, 10, 10, 5),
+          (-5, 0, 0, 0, 0, 0, 0, -5),
+          (-5, 0, 0, 0, 0, 0, 0, -5),
+          (-5, 0, 0, 0, 0, 0, 0, -5),
+          (-5, 0, 0, 0, 0, 0, 0, -5),
+          (-5, 0, 0, 0, 0, 0, 0, -5),
+          (0, 0, 0, 5, 5, 0, 0, 0)),
+    'Q': ((-20, -10, -10, -5, -5, -10, -10, -20),
+          (-10, 0, 0, 0, 0, 0, 0, -10),
+          (-10, 0, 5, 5, 5, 5, 0, -10),
+          (-5, 0, 5, 5, 5, 5, 0, -5),
+          (0, 0, 5, 5, 5, 5, 0, -5),
+          (-10, 5, 5, 5, 5, 5, 0, -10),
+          (-10, 0, 5, 0, 0, 0, 0, -10),
+          (-20, -10, -10, -5, -5, -10, -10, -20)),
+    'K': ((-30, -40, -40, -50, -50, -40, -40, -30),
+          (-30, -40, -40, -50, -50, -40, -40, -30),
+          (-30, -40, -40, -50, -50, -40, -40, -30),
+          (-30, -40, -40, -50, -50, -40, -40, -30),
+          (-20, -30, -30, -40, -40, -30, -30, -20),
+          (-10, -20, -20, -20, -20, -20, -20, -10),
+          (20, 20, 0, 0, 0, 0, 20, 20),
+          (20, 30, 10, 0, 0, 10, 30, 20)),
+}
+
+MATE_SCORE = 100000
+INFINITY = 1000000
+
+# Ordering bands, captures first by most valuable victim, then promotions, killers and history.
+CAPTURE_ORDER = 30000000
+PROMOTION_ORDER = 20000000
+KILLER_ORDER = 10000000
+
+
+def evaluate(board):
+    # Material plus piece-square score in centipawns, from the point of view of the player to move.
+    score = 0
+    size = board.get_board_size()
+    for y, row in enumerate(board.get_board()):
+        for x, sq in enumerate(row):
+            if not sq.is_piece():
+                continue
+            char_rep = sq.char_rep()
+            if sq.is_white():
+                score += PIECE_VALUES[char_rep] + PIECE_SQUARE_TABLES[char_rep][size - 1 - y][x]
+            else:
+                score -= PIECE_VALUES[char_rep] + PIECE_SQUARE_TABLES[char_rep][y][x]
+    return score if board.is_cur_player_white() else -score
+
+
+class SearchResult:
+
+    def __init__(self, best_move, score, depth, nodes, elapsed):
+        self._best_move = best_move
+        self._score = score
+        self._depth = depth
+        self._nodes = nodes
+        self._elapsed = elapsed
+
+    def get_best_move(self):
+        return self._best_move
+
+    def get_score(self):
+        return self._score
+
+    def get_depth(self):
+        return self._depth
+
+    def get_nodes(self):
+        return self._nodes
+
+    def get_elapsed(self):
+        return self._elapsed
+
+    def get_nps(self):
+        if self._elapsed <= 0:
+            return 0
+        return int(self._nodes / self._elapsed)
+
+    def __str__(self):
+        return "depth {} score {} nodes {} in {:.2f}s, {} nps".format(
+            self._depth, self._score, self._nodes, self._elapsed, self.get_nps())
+
+
+class Searcher:
+    # Negamax alpha-beta with iterative deepening and a capture-only quiescence search. The time and
+    # node budgets are checked at every node, and an unfinished iteration is thrown away.
+
+    def __init__(self, time_limit=None, node_limit=None, max_depth=64):
+        self._time_limit = time_limit
+        self._node_limit = node_limit
+        self._max_depth = max_depth
+
+        self._nodes = 0
+        self._deadline = None
+        self._stopped = False
+        self._killers = []
+        self._history = {}
+
+    def search(self, board, on_iteration=None):
+        start = time.perf_counter()
+        self._nodes = 0
+        self._deadline = None if self._time_limit is None else start + self._time_limit
+        self._stopped = False
+        self._killers = [[None, None] for _ in range(self._max_depth + 1)]
+        self._history = {}
+
+        root_moves = board.list_legal_moves()
+        if not root_moves:
+            score = -MATE_SCORE if board.is_cur_player_in_check()[0] else 0
+            return SearchResult(None, score, 0, 0, time.perf_counter() - start)
+
+        result = SearchResult(self._order_moves(board, root_moves, 0)[0], 0, 0, 0, 0.0)
+        for depth in range(1, self._max_depth + 1):
+            score, best_move = self._search_root(board, root_moves, depth, result.get_best_move())
+            if self._stopped:
+                break
+
+            result = SearchResult(best_move, score, depth, self._nodes, time.perf_counter() - start)
+            if on_iteration is not None:
+                on_iteration(result)
+            # A forced mate won't change with more depth.
+            if abs(score) >= MATE_SCORE - self._max_depth:
+                break
+
+        return SearchResult(result.get_best_move(), result.get_score(), result.get_depth(), self._nodes,
+                            time.perf_counter() - start)
+
+    def _is_out_of_budget(self):
+        if self._node_limit is not None and self._nodes >= self._node_limit:
+            self._stopped = True
+        elif self._deadline is not None and time.perf_counter() >= self._deadline:
+            self._stopped = True
+        return self._stopped
+
+    def _search_root(self, board, root_moves, depth, previous_best):
+        moves = self._order_moves(board, root_moves, 0)
+        # The best move of the previous iteration is searched first, it is usually still best.
+        moves.remove(previous_best)
+        moves.insert(0, previous_best)
+
+        alpha = -INFINITY
+        best_move = moves[0]
+        for move in moves:
+            score = -self._play(board, move, depth - 1, -INFINITY, -alpha, 1)
+            if self._stopped:
+                break
+            if score > alpha:
+                alpha = score
+                best_move = move
+        return alpha, best_move
+
+    def _play(self, board, move, depth, alpha, beta, ply):
+        undo = board.make_move(*move)
+        board.change_player()
+        if depth > 0:
+            score = self._negamax(board, depth, alpha, beta, ply)
+        else:
+            score = self._quiescence(board, alpha, beta, ply)
+        board.change_player()
+        board.unmake_move(undo)
+        return score
+
+    def _negamax(self, board, depth, alpha, beta, ply):
+        self._nodes += 1
+        if self._is_out_of_budget():
+            return 0
+
+        moves = board.list_legal_moves()
+        if not moves:
+            # Mates found sooner score higher.
+            return -MATE_SCORE + ply if board.is_cur_player_in_check()[0] else 0
+
+        for move in self._order_moves(board, moves, ply):
+            score = -self._play(board, move, depth - 1, -beta, -alpha, ply + 1)
+            if self._stopped:
+                return 0
+            if score >= beta:
+                if not self._is_capture(board, move):
+                    self._store_killer(move, ply)
+                    key = move[0], move[1]
+                    self._history[key] = self._history.get(key, 0) + depth * depth
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _quiescence(self, board, alpha, beta, ply):
+        self._nodes += 1
+        if self._is_out_of_budget():
+            return 0
+
+        stand_pat = evaluate(board)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        captures = [move for move in board.list_legal_moves() if self._is_capture(board, move)]
+        for move in self._order_moves(board, captures, ply):
+            score = -self._play(board, move, 0, -beta, -alpha, ply + 1)
+            if self._stopped:
+                return 0
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    @staticmethod
+    def _is_capture(board, move):
+        piece_square, new_square, _ = move
+        if board.get_square(new_square).is_piece():
+            return True
+        # En passant lands on an empty square.
+        return new_square == board.get_en_passant_square() and \
+            board.get_square(piece_square).char_rep() == pieces.Pawn.char_rep()
+
+    def _store_killer(self, move, ply):
+        if ply >= len(self._killers):
+            return
+        killers = self._killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+
+    def _order_moves(self, board, moves, ply):
+        killers = self._killers[ply] if ply < len(self._killers) else ()
+
+        def order_key(move):
+            piece_square, new_square, promotion = move
+            target = board.get_square(new_square)
+            if target.is_piece():
+                attacker = board.get_square(piece_square)
+                return CAPTURE_ORDER + PIECE_VALUES[target.char_rep()] * 10 - PIECE_VALUES[attacker.char_rep()]
+            if promotion is not None:
+                return PROMOTION_ORDER + PIECE_VALUES[promotion]
+            if move in killers:
+                return KILLER_ORDER
+            return self._history.get((piece_square, new_square), 0)
+
+        return sorted(moves, key=order_key, reverse=True)
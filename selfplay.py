@@ -0,0 +1,143 @@
+import argparse
+import multiprocessing
+import random
+import sys
+import time
+from collections import Counter
+
+import archive
+import pieces
+import search
+
+
+MAX_PLIES = 300
+# Unfinished games are stopped here and stored with an unknown result.
+MAX_PLIES_REACHED = "MAX_PLIES"
+
+
+def random_policy(board, moves, rng):
+    return rng.choice(moves)
+
+
+def capture_policy(board, moves, rng):
+    # Takes the most valuable piece on offer, or plays at random when nothing can be taken.
+    best_value = 0
+    best_moves = []
+    for move in moves:
+        target = board.get_square(move[1])
+        value = search.PIECE_VALUES[target.char_rep()] if target.is_piece() else 0
+        if move[2] is not None:
+            value += search.PIECE_VALUES[move[2]]
+        if value > best_value:
+            best_value = value
+            best_moves = [move]
+        elif value == best_value and value > 0:
+            best_moves.append(move)
+    return rng.choice(best_moves or moves)
+
+
+def search_policy(board, moves, rng):
+    # A shallow fixed node budget keeps games reproducible, a time limit would not be.
+    return search.Searcher(node_limit=300).search(board).get_best_move()
+
+
+POLICIES = {
+    "random": random_policy,
+    "capture": capture_policy,
+    "search": search_policy,
+}
+
+
+def play_game(game_id, seed, white_policy, black_policy, max_plies=MAX_PLIES):
+    # Returns (game_id, moves, result, terminal), where terminal is the is_stalemate_or_checkmate()
+    # verdict that ended the game or MAX_PLIES_REACHED.
+    rng = random.Random(seed)
+    board = pieces.Board()
+    policies = {True: POLICIES[white_policy], False: POLICIES[black_policy]}
+    moves = []
+    terminal = board.is_stalemate_or_checkmate()
+    while terminal is None and len(moves) < max_plies:
+        move = policies[board.is_cur_player_white()](board, board.list_legal_moves(), rng)
+        board.move_piece(*move)
+        board.change_player()
+        moves.append(move)
+        terminal = board.is_stalemate_or_checkmate()
+
+    if terminal == "CHECKMATE":
+        result = "0-1" if board.is_cur_player_white() else "1-0"
+    elif terminal is not None:
+        # Stalemate, repetition and the fifty-move rule are all draws.
+        result = "1/2-1/2"
+    else:
+        terminal = MAX_PLIES_REACHED
+        result = "*"
+    return game_id, moves, result, terminal
+
+
+def _play_job(args):
+    return play_game(*args)
+
+
+def run_selfplay(games, white_policy="random", black_policy="random", seed=0, max_plies=MAX_PLIES, processes=None,
+                 writer=None):
+    # Yields each finished game in game id order, after storing it with writer when given, so archive
+    # game k is game k. Game k is always played with seed + k, so a game can be replayed alone from its
+    # id. The pool plays ahead while an earlier, longer game is still running, and holds on to what it
+    # finished until that game's turn.
+    jobs = ((game_id, seed + game_id, white_policy, black_policy, max_plies) for game_id in range(games))
+    if processes == 1:
+        finished = map(_play_job, jobs)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes)
+        finished = pool.imap(_play_job, jobs, chunksize=4)
+
+    try:
+        for game in finished:
+            if writer is not None:
+                writer.add_game(game[1], game[2])
+            yield game
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play games between move selection policies on every core.")
+    parser.add_argument("--games", type=int, default=100, help="games to play")
+    parser.add_argument("--white", choices=sorted(POLICIES), default="random", help="policy playing white")
+    parser.add_argument("--black", choices=sorted(POLICIES), default="random", help="policy playing black")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, each later game adds one")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES, help="stop unfinished games after this many plies")
+    parser.add_argument("--processes", type=int, default=0, help="worker processes (0: one per core)")
+    parser.add_argument("--output", help="game archive to stream finished games into")
+    args = parser.parse_args(argv)
+
+    results = Counter()
+    terminals = Counter()
+    lengths = []
+    writer = archive.ArchiveWriter(args.output) if args.output else None
+    start = time.perf_counter()
+    try:
+        for _, moves, result, terminal in run_selfplay(args.games, args.white, args.black, args.seed,
+                                                       args.max_plies, args.processes or None, writer):
+            results[result] += 1
+            terminals[terminal] += 1
+            lengths.append(len(moves))
+    finally:
+        if writer is not None:
+            writer.close()
+    elapsed = time.perf_counter() - start
+
+    plies = sum(lengths)
+    print("{:,} games, {:,} plies in {:.2f}s, {:,.1f} games/s, {:,.0f} plies/s".format(
+        len(lengths), plies, elapsed, len(lengths) / elapsed, plies / elapsed))
+    print("results: " + ", ".join("{} {:,}".format(result, count) for result, count in sorted(results.items())))
+    print("endings: " + ", ".join("{} {:,}".format(terminal, count) for terminal, count in sorted(terminals.items())))
+    if lengths:
+        print("length: min {} mean {:.1f} max {}".format(min(lengths), plies / len(lengths), max(lengths)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,438 @@
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import json
+import random
+import sys
+import time
+import types
+
+import perft
+import pieces
+
+
+# Wire protocol: one line of space separated words per message, squares and moves in algebraic
+# form (e2, e2e4, e7e8q). Every reply names the game it is about, pushes use the same form. A FEN
+# always comes last as it has spaces of its own.
+#   NEW                 -> GAME <id> <fen>
+#   WATCH <id>          -> STATE <id> <status> <fen>
+#   SELECT <id> <sq>    -> TARGETS <id> <sq>...
+#   MOVES <id>          -> MOVES <id> <move>...
+#   MOVE <id> <move>    -> STATE <id> <status> <fen>, pushed to every client watching the game
+#   RESIGN <id>         -> STATE <id> <status> <fen>, pushed likewise
+#   STATS               -> STATS <json>
+# Status is PLAYING, RESIGNED or a result of Board.is_stalemate_or_checkmate(). Failures reply
+# ERR <id or -> <message>.
+PLAYING = "PLAYING"
+RESIGNED = "RESIGNED"
+
+LATENCY_SAMPLES = 10000
+# Finished games stay around for late WATCH and MOVES requests, the oldest go once there are more.
+KEEP_FINISHED_GAMES = 1000
+# STATS sizes this many games rather than all of them, deep_size walks every object of a board.
+STATS_SIZE_SAMPLE = 20
+
+
+def _find_game_over(fen):
+    # Runs in the executor, so it takes the position rather than the board the event loop owns.
+    return pieces.Board.from_fen(fen).is_stalemate_or_checkmate()
+
+
+def deep_size(obj, seen=None):
+    # Bytes reachable from obj, each object counted once. Classes, functions and modules are
+    # shared by every game, so they are left out.
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, (type, types.ModuleType, types.FunctionType)):
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    if hasattr(obj, "__dict__"):
+        size += deep_size(vars(obj), seen)
+    for cls in type(obj).__mro__:
+        for slot in getattr(cls, "__slots__", ()):
+            if hasattr(obj, slot):
+                size += deep_size(getattr(obj, slot), seen)
+    return size
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class ServerGame:
+
+    def __init__(self, game_id):
+        self._game_id = game_id
+        self._board = pieces.Board()
+        self._status = PLAYING
+        # Moves of one game are applied one at a time, the game over test in between awaits.
+        self._lock = asyncio.Lock()
+        self._watchers = set()
+
+    def get_game_id(self):
+        return self._game_id
+
+    def get_board(self):
+        return self._board
+
+    def get_status(self):
+        return self._status
+
+    def set_status(self, status):
+        self._status = status
+
+    def get_lock(self):
+        return self._lock
+
+    def get_watchers(self):
+        return self._watchers
+
+    def state_message(self):
+        return "STATE {} {} {}".format(self._game_id, self._status, self._board.to_fen())
+
+
+class GameServer:
+
+    def __init__(self, executor=None):
+        self._executor = executor
+        self._games = {}
+        # Ids of the games each connection created or watches, so a disconnect only visits those.
+        self._watched = {}
+        self._finished = collections.deque()
+        self._game_ids = itertools.count()
+        self._latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self._moves = 0
+        self._clients = 0
+
+    def get_game(self, game_id):
+        return self._games.get(game_id)
+
+    async def handle_client(self, reader, writer):
+        self._clients += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                words = line.decode("ascii", errors="replace").split()
+                if words:
+                    try:
+                        await self._handle_message(words, writer)
+                    except ConnectionError:
+                        raise
+                    except Exception:
+                        # A request the handlers didn't foresee costs only its reply, not the connection.
+                        game_id = words[1] if len(words) > 1 and words[1].isdigit() else "-"
+                        self._send(writer, "ERR {} failed {}".format(game_id, words[0].upper()))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._clients -= 1
+            # Nobody can name a game no client watches any more, so it goes with its last watcher.
+            for game_id in self._watched.pop(writer, ()):
+                game = self._games.get(game_id)
+                if game is None:
+                    continue
+                game.get_watchers().discard(writer)
+                if not game.get_watchers():
+                    del self._games[game_id]
+            writer.close()
+
+    async def _handle_message(self, words, writer):
+        command, args = words[0].upper(), words[1:]
+        if command == "NEW":
+            game = ServerGame(next(self._game_ids))
+            self._games[game.get_game_id()] = game
+            self._watch(game, writer)
+            self._send(writer, "GAME {} {}".format(game.get_game_id(), game.get_board().to_fen()))
+            return
+        if command == "STATS":
+            self._send(writer, "STATS " + json.dumps(self.get_stats()))
+            return
+
+        game = self._games.get(int(args[0])) if args and args[0].isdigit() else None
+        if game is None:
+            self._send(writer, "ERR {} no such game".format(args[0] if args else "-"))
+            return
+
+        try:
+            if command == "WATCH":
+                self._watch(game, writer)
+                self._send(writer, game.state_message())
+            elif command == "SELECT":
+                self._select(game, args[1], writer)
+            elif command == "MOVES":
+                moves = game.get_board().list_legal_moves() if game.get_status() == PLAYING else []
+                self._send(writer, " ".join(["MOVES", str(game.get_game_id())] + [perft.move_name(move) for move in moves]))
+            elif command == "MOVE":
+                await self._move(game, args[1], writer)
+            elif command == "RESIGN":
+                async with game.get_lock():
+                    if game.get_status() == PLAYING:
+                        self._finish(game, RESIGNED)
+                    self._broadcast(game)
+            else:
+                self._send(writer, "ERR {} unknown command {}".format(game.get_game_id(), command))
+        except (IndexError, ValueError):
+            self._send(writer, "ERR {} malformed {}".format(game.get_game_id(), command))
+
+    def _watch(self, game, writer):
+        game.get_watchers().add(writer)
+        self._watched.setdefault(writer, set()).add(game.get_game_id())
+
+    def _select(self, game, square_name, writer):
+        board = game.get_board()
+        square = perft.parse_square(square_name)
+        res, err_msg = board.check_if_selection_valid(square)
+        if not res:
+            self._send(writer, "ERR {} {}".format(game.get_game_id(), err_msg))
+            return
+        targets = [perft.square_name(target) for target in board.list_valid_moves_for_piece(square)]
+        self._send(writer, " ".join(["TARGETS", str(game.get_game_id())] + targets))
+
+    async def _move(self, game, move_name, writer):
+        start = time.perf_counter()
+        piece_square = perft.parse_square(move_name[0:2])
+        new_square = perft.parse_square(move_name[2:4])
+        promotion = move_name[4:].upper() or None
+        if promotion is not None and promotion not in pieces.PROMOTION_PIECES:
+            raise ValueError(promotion)
+
+        async with game.get_lock():
+            board = game.get_board()
+            if game.get_status() != PLAYING:
+                self._send(writer, "ERR {} game is over".format(game.get_game_id()))
+                return
+            res, err_msg = board.check_if_selection_valid(piece_square)
+            if res:
+                res, err_msg = board.check_if_move_valid(piece_square, new_square)
+            if not res:
+                self._send(writer, "ERR {} {}".format(game.get_game_id(), err_msg))
+                return
+
+            if promotion is None and board.check_if_pawn_promotion(piece_square, new_square):
+                promotion = pieces.PROMOTION_PIECES[0]
+            board.move_piece(piece_square, new_square, promotion)
+            board.change_player()
+
+            # Finding mate can mean trying every reply, so it is kept off the event loop.
+            if self._executor is None:
+                game_over = board.is_stalemate_or_checkmate()
+            else:
+                game_over = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, _find_game_over, board.to_fen())
+            # The executor only sees the position, draws by repetition need the board's history.
+            game_over = game_over or board.is_draw_by_rule()
+            if game_over is not None:
+                self._finish(game, game_over)
+            self._broadcast(game)
+
+        self._moves += 1
+        self._latencies.append(time.perf_counter() - start)
+
+    def _finish(self, game, status):
+        game.set_status(status)
+        self._finished.append(game.get_game_id())
+        if len(self._finished) > KEEP_FINISHED_GAMES:
+            self._games.pop(self._finished.popleft(), None)
+
+    def _broadcast(self, game):
+        message = game.state_message()
+        for watcher in list(game.get_watchers()):
+            self._send(watcher, message)
+
+    @staticmethod
+    def _send(writer, message):
+        if not writer.is_closing():
+            # Replies can echo what the client sent, which need not be ascii.
+            writer.write(message.encode("ascii", errors="replace") + b"\n")
+
+    def get_stats(self):
+        latencies = list(self._latencies)
+        games = list(self._games.values())
+        sampled = random.sample(games, min(len(games), STATS_SIZE_SAMPLE))
+        game_sizes = [deep_size(game.get_board()) for game in sampled]
+        return {
+            "clients": self._clients,
+            "games": len(self._games),
+            "games_playing": sum(game.get_status() == PLAYING for game in self._games.values()),
+            "moves": self._moves,
+            "move_latency_p50_ms": percentile(latencies, 0.5) * 1e3,
+            "move_latency_p99_ms": percentile(latencies, 0.99) * 1e3,
+            "game_bytes_mean": sum(game_sizes) / len(game_sizes) if game_sizes else 0,
+            "game_bytes_max": max(game_sizes, default=0),
+            "games_sized": len(game_sizes),
+        }
+
+
+async def start_server(server, host="127.0.0.1", port=8765, unix_path=None):
+    if unix_path is not None:
+        return await asyncio.start_unix_server(server.handle_client, path=unix_path)
+    return await asyncio.start_server(server.handle_client, host, port)
+
+
+async def _open_connection(host, port, unix_path):
+    if unix_path is not None:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+class LoadClient:
+    # One connection playing several games at once. Replies are routed to the game they name, so the
+    # games on a connection can interleave freely.
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._pending = collections.deque()
+        self._replies = {}
+        self._error = None
+
+    async def run(self, games, max_plies, rng):
+        dispatcher = asyncio.ensure_future(self._dispatch())
+        try:
+            results = await asyncio.gather(*(self._play(max_plies, rng) for _ in range(games)))
+        finally:
+            dispatcher.cancel()
+        return [latency for latencies in results for latency in latencies]
+
+    def close(self):
+        self._writer.close()
+
+    async def _dispatch(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    raise ConnectionError("server closed the connection")
+                words = line.decode("ascii").split()
+                if words[0] == "GAME":
+                    # Games are created in request order, so the oldest waiting NEW gets this id.
+                    self._pending.popleft().set_result(words)
+                elif len(words) > 1 and words[1].isdigit() and int(words[1]) in self._replies:
+                    self._replies[int(words[1])].put_nowait(words)
+                else:
+                    # Nothing tells which request an ERR - answers, so none of them can go on.
+                    raise ValueError("reply for no game: {}".format(line.decode("ascii").strip()))
+        except (ConnectionError, ValueError) as err:
+            self._fail(err)
+
+    def _fail(self, err):
+        # Wakes every request still waiting for a reply, each raises err.
+        self._error = err
+        while self._pending:
+            created = self._pending.popleft()
+            if not created.done():
+                created.set_exception(err)
+        for replies in self._replies.values():
+            replies.put_nowait(err)
+
+    async def _request(self, game_id, message):
+        if self._error is not None:
+            raise self._error
+        self._writer.write(message.encode("ascii") + b"\n")
+        reply = await self._replies[game_id].get()
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    async def _play(self, max_plies, rng):
+        if self._error is not None:
+            raise self._error
+        created = asyncio.get_running_loop().create_future()
+        self._pending.append(created)
+        self._writer.write(b"NEW\n")
+        game_id = int((await created)[1])
+        self._replies[game_id] = asyncio.Queue()
+
+        latencies = []
+        for _ in range(max_plies):
+            moves = (await self._request(game_id, "MOVES {}".format(game_id)))[2:]
+            if not moves:
+                break
+            start = time.perf_counter()
+            reply = await self._request(game_id, "MOVE {} {}".format(game_id, rng.choice(moves)))
+            latencies.append(time.perf_counter() - start)
+            if reply[0] != "STATE" or reply[2] != PLAYING:
+                break
+        return latencies
+
+
+async def run_load(host, port, unix_path, clients, games, max_plies, seed):
+    start = time.perf_counter()
+    connections = [LoadClient(*await _open_connection(host, port, unix_path)) for _ in range(clients)]
+    results = await asyncio.gather(*(client.run(games, max_plies, random.Random(seed + number))
+                                      for number, client in enumerate(connections)))
+    elapsed = time.perf_counter() - start
+    latencies = [latency for client_latencies in results for latency in client_latencies]
+
+    # The games are evicted once their clients disconnect, so the stats are taken first.
+    reader, writer = await _open_connection(host, port, unix_path)
+    writer.write(b"STATS\n")
+    stats = json.loads((await reader.readline()).decode("ascii").split(" ", 1)[1])
+    writer.close()
+    for client in connections:
+        client.close()
+
+    print("{} clients x {} games, {:,} moves in {:.2f}s, {:,.0f} moves/s".format(
+        clients, games, len(latencies), elapsed, len(latencies) / elapsed))
+    print("client move latency p50 {:.2f}ms p99 {:.2f}ms".format(
+        percentile(latencies, 0.5) * 1e3, percentile(latencies, 0.99) * 1e3))
+    print("server", json.dumps(stats, indent=1))
+
+
+async def _serve(args):
+    executor = None
+    if args.workers:
+        executor = concurrent.futures.ProcessPoolExecutor(args.workers)
+    game_server = GameServer(executor)
+    server = await start_server(game_server, args.host, args.port, args.unix)
+    print("Serving on {}".format(args.unix or "{}:{}".format(args.host, args.port)))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host DanChess games over TCP or a Unix socket, or load test a server.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to serve on or connect to")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port")
+    parser.add_argument("--unix", help="Unix socket path, instead of TCP")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="run the game server")
+    serve_parser.add_argument("--workers", type=int, default=2,
+                              help="processes for checkmate detection (0: run it on the event loop)")
+    load_parser = subparsers.add_parser("load", help="play random games against a running server")
+    load_parser.add_argument("--clients", type=int, default=10, help="connections to open")
+    load_parser.add_argument("--games", type=int, default=10, help="games played at once on each connection")
+    load_parser.add_argument("--plies", type=int, default=60, help="moves per game at most")
+    load_parser.add_argument("--seed", type=int, default=0, help="seed for the random moves")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "serve":
+            asyncio.run(_serve(args))
+        else:
+            asyncio.run(run_load(args.host, args.port, args.unix, args.clients, args.games, args.plies, args.seed))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+import archive
+import pieces
+import test_pgn
+
+
+ITALIAN = [((4, 1), (4, 3), None), ((4, 6), (4, 4), None), ((6, 0), (5, 2), None), ((1, 7), (2, 5), None),
+           ((5, 0), (2, 3), None)]
+PROMOTION_FEN = "8/4P3/8/8/8/k7/8/K7 w - - 0 1"
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, "games.dca")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_round_trip(self):
+        with archive.ArchiveWriter(self.path) as writer:
+            self.assertEqual(writer.add_game(ITALIAN), 0)
+            self.assertEqual(writer.add_game([((4, 6), (4, 7), 'N')], "1/2-1/2", PROMOTION_FEN), 1)
+            self.assertEqual(writer.add_games([([], "1-0", None)] * 3), 5)
+
+        with archive.ArchiveReader(self.path) as reader:
+            self.assertEqual(len(reader), 5)
+            self.assertEqual(reader.get_moves(0), ITALIAN)
+            self.assertEqual(reader.get_result(0), "*")
+            self.assertIsNone(reader.get_fen(0))
+            self.assertEqual(reader.get_moves(1), [((4, 6), (4, 7), 'N')])
+            self.assertEqual(reader.get_result(1), "1/2-1/2")
+            self.assertEqual(reader.get_fen(1), PROMOTION_FEN)
+            self.assertEqual(reader.get_ply_count(4), 0)
+            with self.assertRaises(IndexError):
+                reader.get_moves(5)
+
+    def test_replay(self):
+        with archive.ArchiveWriter(self.path) as writer:
+            writer.add_game(ITALIAN)
+            writer.add_game([((4, 6), (4, 7), 'N')], fen=PROMOTION_FEN)
+
+        expected = pieces.Board()
+        for move in ITALIAN:
+            expected.move_piece(*move)
+            expected.change_player()
+        with archive.ArchiveReader(self.path) as reader:
+            self.assertEqual(reader.replay(0).to_fen(), expected.to_fen())
+            self.assertEqual(len(list(reader.iter_positions(0))), len(ITALIAN) + 1)
+            self.assertEqual(reader.replay(1).get_square((4, 7)).char_rep(), 'N')
+
+    def test_rejects_other_files(self):
+        with open(self.path, "wb") as bad_file:
+            bad_file.write(b"[Event \"not an archive\"]\n")
+        with self.assertRaises(ValueError):
+            archive.ArchiveReader(self.path)
+
+    def test_pack_pgn(self):
+        pgn_path = os.path.join(self._dir.name, "games.pgn")
+        with open(pgn_path, "w") as pgn_file:
+            pgn_file.write(test_pgn.random_game(117) + "\n" + test_pgn.ILLEGAL_KING_MOVE + "\n" + test_pgn.SCHOLARS_MATE)
+
+        self.assertEqual(archive.pack_pgn(pgn_path, self.path), (2, 1))
+        with archive.ArchiveReader(self.path) as reader:
+            self.assertEqual(reader.get_result(1), "1-0")
+            self.assertEqual(reader.replay(1).is_stalemate_or_checkmate(), "CHECKMATE")
+            self.assertLess(os.path.getsize(self.path), os.path.getsize(pgn_path) / 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+import batch_evaluation
+import perft
+import pieces
+import search
+
+
+@unittest.skipIf(batch_evaluation.np is None, "numpy is not installed")
+class TestBatchEvaluation(unittest.TestCase):
+
+    def test_encode_boards(self):
+        board = pieces.Board()
+        board.change_player()
+        planes, white_to_move = batch_evaluation.encode_boards([pieces.Board(), board])
+
+        self.assertEqual(planes.shape, (2, 12, 8, 8))
+        self.assertEqual(white_to_move.tolist(), [True, False])
+        self.assertEqual(int(planes[0].sum()), 32)
+        self.assertTrue(planes[0, batch_evaluation.PLANE_PIECES.index('K'), 0, 4])
+        self.assertTrue(planes[0, batch_evaluation.BLACK_PLANE_OFFSET + batch_evaluation.PAWN_PLANE, 6].all())
+
+    def test_pack_planes(self):
+        planes, _ = batch_evaluation.encode_boards(batch_evaluation.random_positions(5))
+        packed = batch_evaluation.pack_planes(planes)
+
+        self.assertEqual(packed.shape, (5, 12, 8))
+        self.assertTrue((batch_evaluation.unpack_planes(packed) == planes).all())
+
+    def test_matches_scalar_reference(self):
+        boards = batch_evaluation.random_positions(200, seed=3)
+        boards.append(perft.board_from_fen(perft.REFERENCE_POSITIONS[1][1]))
+        scores = batch_evaluation.evaluate_boards(boards)
+
+        for n, board in enumerate(boards):
+            expected = batch_evaluation.evaluate_scalar(board)
+            for name, value in expected.items():
+                self.assertEqual(int(scores[name][n]), value, name)
+
+    def test_material_and_piece_square_match_search(self):
+        boards = batch_evaluation.random_positions(50, seed=4)
+        scores = batch_evaluation.evaluate_boards(boards)
+        for n, board in enumerate(boards):
+            white_score = int(scores["material"][n] + scores["piece_square"][n])
+            self.assertEqual(white_score if board.is_cur_player_white() else -white_score, search.evaluate(board))
+
+    def test_pawn_structure(self):
+        # White: doubled, isolated c-pawns. Black: a passed a-pawn.
+        board = perft.board_from_fen("4k3/p7/8/8/8/2P5/2P5/4K3 w - - 0 1")
+        scores = batch_evaluation.evaluate_boards([board])
+        expected = (batch_evaluation.DOUBLED_PAWN + 2 * batch_evaluation.ISOLATED_PAWN + 2 * batch_evaluation.PASSED_PAWN
+                    - batch_evaluation.ISOLATED_PAWN - batch_evaluation.PASSED_PAWN)
+        self.assertEqual(int(scores["pawn_structure"][0]), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
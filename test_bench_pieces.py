@@ -0,0 +1,76 @@
+import os
+import pstats
+import tempfile
+import unittest
+
+import bench_pieces
+import pieces
+
+
+class TestBenchPieces(unittest.TestCase):
+
+    def test_corpus_positions(self):
+        for name, fen in bench_pieces.CORPUS:
+            with self.subTest(position=name):
+                self.assertEqual(pieces.Board.from_fen(fen).to_fen(), fen)
+
+    def test_every_case_measures(self):
+        for name in bench_pieces.CASES:
+            with self.subTest(case=name):
+                metrics = bench_pieces.measure_case(name, rounds=1, passes=1)
+                self.assertEqual(sorted(metrics), sorted(bench_pieces.ABSOLUTE_FLOORS))
+                self.assertGreater(metrics["wall_us"], 0)
+                self.assertGreaterEqual(metrics["peak_kib"], metrics["retained_kib"])
+
+    def test_compare(self):
+        baseline = {"deepcopy": {"wall_us": 100.0, "peak_kib": 1.0, "retained_kib": 1.0}}
+        results = {
+            "deepcopy": {"wall_us": 130.0, "peak_kib": 2.0, "retained_kib": 1.0},
+            "construction": {"wall_us": 1000.0, "peak_kib": 1.0, "retained_kib": 1.0},
+        }
+        # peak_kib doubled but stays under its absolute floor, construction has no baseline.
+        self.assertEqual(bench_pieces.compare(results, baseline), [("deepcopy", "wall_us", 100.0, 130.0)])
+        self.assertEqual(bench_pieces.compare(results, baseline, threshold=0.5), [])
+        # On a machine running the calibration 1.2x slower the baseline expects 120 us, memory isn't scaled.
+        self.assertEqual(bench_pieces.compare(results, baseline, speed=1.2), [])
+        self.assertEqual(bench_pieces.compare({"deepcopy": {"wall_us": 50.0, "peak_kib": 6.0, "retained_kib": 1.0}},
+                                              baseline, speed=0.3),
+                         [("deepcopy", "wall_us", 100.0, 50.0), ("deepcopy", "peak_kib", 1.0, 6.0)])
+
+    def test_calibrate(self):
+        self.assertGreater(bench_pieces.calibrate(rounds=1), 0)
+
+    def test_committed_baseline_covers_every_case(self):
+        baseline = bench_pieces.load_baseline()
+        self.assertEqual(sorted(baseline["cases"]), sorted(bench_pieces.CASES))
+        self.assertEqual(baseline["positions"], [name for name, _ in bench_pieces.CORPUS])
+
+    def test_save_then_compare(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baseline.json")
+            argv = ["--case", "is_cur_player_in_check", "--rounds", "1", "--baseline", path]
+            self.assertEqual(bench_pieces.main(argv + ["--save"]), 0)
+            baseline = bench_pieces.load_baseline(path)
+            self.assertEqual(sorted(baseline["cases"]), ["is_cur_player_in_check"])
+            self.assertGreater(baseline["calibration_us"], 0)
+            self.assertEqual(bench_pieces.main(argv + ["--threshold", "100"]), 0)
+
+    def test_only_check_fails_on_regressions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baseline.json")
+            # Below anything the case can reach even with the absolute floor added, so every run regresses.
+            bench_pieces.save_baseline({"is_cur_player_in_check": {"wall_us": -100.0, "peak_kib": 0.0,
+                                                                   "retained_kib": 0.0}}, 1, 1000.0, path)
+            argv = ["--case", "is_cur_player_in_check", "--rounds", "1", "--baseline", path]
+            self.assertEqual(bench_pieces.main(argv), 0)
+            self.assertEqual(bench_pieces.main(argv + ["--check"]), 1)
+
+    def test_profile_case(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "deepcopy.prof")
+            bench_pieces.profile_case("deepcopy", path, rounds=1)
+            self.assertIn("__deepcopy__", str(pstats.Stats(path).stats))
+
+
+if __name__ == '__main__':
+    unittest.main()
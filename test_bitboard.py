@@ -0,0 +1,186 @@
+import random
+import unittest
+
+import bitboard
+import pieces
+
+
+def _board_chars(board):
+    return [[str(sq) for sq in row] for row in board.get_board()]
+
+
+def _moves_by_piece(board):
+    moves = []
+    for x in range(board.get_board_size()):
+        for y in range(board.get_board_size()):
+            sq = board.get_square((x, y))
+            if sq.is_piece() and sq.is_white() == board.is_cur_player_white():
+                for new_square in board.list_valid_moves_for_piece((x, y)):
+                    moves.append(((x, y), new_square))
+    return sorted(moves)
+
+
+class TestBitBoard(unittest.TestCase):
+
+    def setUp(self):
+        self.board = bitboard.BitBoard()
+
+    def test_initialize_board(self):
+        self.assertEqual(_board_chars(self.board), _board_chars(pieces.Board()))
+        self.assertEqual(self.board.get_cur_king_coords(), (4, 0))
+
+        self.board.change_player()
+        self.assertEqual(self.board.get_cur_king_coords(), (4, 7))
+
+    def test_check_if_selection_valid(self):
+        self.assertEqual(self.board.check_if_selection_valid((0, 0)), (True, ""))
+        self.assertEqual(self.board.check_if_selection_valid((0, 7)),
+                         (False, "Selected Rook on (0, 7) is not your piece!"))
+        self.assertEqual(self.board.check_if_selection_valid((3, 3)),
+                         (False, "Selected square (3, 3) doesn't contain a piece"))
+
+    def test_check_if_move_valid(self):
+        self.assertTrue(self.board.check_if_move_valid((4, 1), (4, 3))[0])
+        self.assertTrue(self.board.check_if_move_valid((6, 0), (5, 2))[0])
+
+        self.assertEqual(self.board.check_if_move_valid((0, 0), (0, 1)),
+                         (False, "The Pawn on (0, 1) belongs to you!"))
+        self.assertEqual(self.board.check_if_move_valid((0, 0), (0, 0)),
+                         (False, "Piece cannot remain in same square!"))
+        self.assertFalse(self.board.check_if_move_valid((4, 1), (4, 4))[0])
+        self.assertFalse(self.board.check_if_move_valid((1, 0), (1, 2))[0])
+
+    def test_rejections_match_mailbox_board(self):
+        cases = [
+            # The knight is pinned to its king by the rook.
+            ("4k3/4r3/8/8/8/8/4N3/4K3 w - - 0 1", (4, 1), (2, 2), pieces.IN_CHECK),
+            # The bishop doesn't stop the check from the rook.
+            ("4k3/4r3/8/8/8/8/8/2B1K3 w - - 0 1", (2, 0), (3, 1), pieces.IN_CHECK),
+            ("4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1", (4, 0), (5, 1), None),
+            ("4k3/4r3/8/8/8/8/8/R3K2R w KQ - 0 1", (4, 0), (6, 0), pieces.CASTLE_IN_CHECK),
+            ("4k3/8/8/8/8/8/5r2/R3K2R w KQ - 0 1", (4, 0), (6, 0), pieces.CASTLE_THROUGH_CHECK),
+            # The king would land on an attacked square, which the king's own rules already catch.
+            ("2r1k3/8/8/8/8/8/8/R3K2R w KQ - 0 1", (4, 0), (2, 0), pieces.CASTLE_THROUGH_CHECK),
+        ]
+        for fen, piece_square, new_square, code in cases:
+            with self.subTest(fen=fen):
+                results = [board_cls.from_fen(fen).check_if_move_valid(piece_square, new_square)
+                           for board_cls in (pieces.Board, bitboard.BitBoard)]
+                codes = [err.get_code() if err else None for _, err in results]
+                self.assertEqual(codes, [code, code])
+                self.assertEqual(str(results[1][1]), str(results[0][1]))
+
+    def test_checkmate(self):
+        # Fool's mate
+        for piece_square, new_square in [((5, 1), (5, 2)), ((4, 6), (4, 4)), ((6, 1), (6, 3)), ((3, 7), (7, 3))]:
+            self.assertTrue(self.board.check_if_move_valid(piece_square, new_square)[0])
+            self.board.move_piece(piece_square, new_square)
+            self.board.change_player()
+
+        self.assertTrue(self.board.is_cur_player_in_check()[0])
+        self.assertEqual(self.board.is_stalemate_or_checkmate(), "CHECKMATE")
+        self.assertEqual(self.board.list_valid_moves_for_player(), [])
+
+    def test_castling(self):
+        for coord in [(5, 0), (6, 0)]:
+            self.board.set_square(coord, pieces.EMPTY_SQUARE)
+
+        self.assertIn((6, 0), self.board.list_valid_moves_for_piece((4, 0)))
+        self.board.move_piece((4, 0), (6, 0))
+
+        self.assertEqual(str(self.board.get_square((6, 0))), "K(W)")
+        self.assertEqual(str(self.board.get_square((5, 0))), "R(W)")
+        self.assertFalse(self.board.get_square((7, 0)).is_piece())
+        self.assertTrue(self.board.get_square((6, 0)).get_has_moved())
+
+    def test_promotion(self):
+        self.board.set_square((0, 7), pieces.EMPTY_SQUARE)
+        self.board.set_square((0, 6), pieces.Pawn(True))
+        self.board.move_piece((0, 6), (0, 7))
+
+        self.assertIsInstance(self.board.get_square((0, 7)), pieces.Queen)
+        self.assertTrue(self.board.get_square((0, 7)).is_white())
+
+    def test_make_and_unmake_move(self):
+        self.board.move_piece((4, 1), (4, 3))
+        self.board.move_piece((3, 6), (3, 4))
+        before = _board_chars(self.board)
+
+        undo = self.board.make_move((4, 3), (3, 4))
+        self.assertEqual(len(self.board.get_taken_pieces()), 1)
+
+        self.board.unmake_move(undo)
+        self.assertEqual(_board_chars(self.board), before)
+        self.assertEqual(self.board.get_taken_pieces(), [])
+
+    def test_is_square_attacked(self):
+        board = pieces.Board()
+        for piece_square, new_square in [((4, 1), (4, 3)), ((3, 6), (3, 4)), ((3, 0), (7, 4))]:
+            board.move_piece(piece_square, new_square)
+            self.board.move_piece(piece_square, new_square)
+
+        for x in range(board.get_board_size()):
+            for y in range(board.get_board_size()):
+                for by_white in (True, False):
+                    self.assertEqual(self.board.is_square_attacked((x, y), by_white),
+                                     board.is_square_attacked((x, y), by_white))
+
+    def test_has_any_legal_move(self):
+        self.assertTrue(self.board.has_any_legal_move())
+        self.assertFalse(bitboard.BitBoard.from_fen("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1").has_any_legal_move())
+
+    def test_draws_by_rule(self):
+        for move in [((6, 0), (5, 2)), ((6, 7), (5, 5)), ((5, 2), (6, 0)), ((5, 5), (6, 7))]:
+            self.board.move_piece(*move)
+            self.board.change_player()
+        self.assertEqual(self.board.get_repetition_count(), 1)
+        self.assertIsNone(self.board.is_stalemate_or_checkmate())
+
+        # Legality tests and make/unmake pairs leave the history and the clock as they were.
+        self.board.list_legal_moves()
+        self.board.unmake_move(self.board.make_move((6, 0), (5, 2)))
+        self.assertEqual((self.board.get_repetition_count(), self.board.get_halfmove_clock()), (1, 4))
+
+        self.board.move_piece((4, 1), (4, 3))
+        self.assertEqual(self.board.get_halfmove_clock(), 0)
+
+        board = bitboard.BitBoard.from_fen("4k3/8/8/8/8/8/8/R3K3 w - - 99 80")
+        self.assertIsNone(board.is_draw_by_rule())
+        board.move_piece((0, 0), (0, 1))
+        board.change_player()
+        self.assertEqual(board.is_stalemate_or_checkmate(), pieces.FIFTY_MOVE_RULE)
+
+    def test_from_board(self):
+        board = pieces.Board()
+        board.move_piece((4, 1), (4, 3))
+        board.move_piece((4, 0), (4, 1))
+        board.change_player()
+
+        bit_board = bitboard.BitBoard.from_board(board)
+        self.assertEqual(_board_chars(bit_board), _board_chars(board))
+        self.assertFalse(bit_board.is_cur_player_white())
+        self.assertEqual(bit_board._castling, bitboard.BLACK_KINGSIDE | bitboard.BLACK_QUEENSIDE)
+
+    def test_matches_mailbox_board(self):
+        # Play random games on both backends and compare the legal moves at every ply.
+        rng = random.Random(7)
+        for _ in range(3):
+            board = pieces.Board()
+            bit_board = bitboard.BitBoard()
+            for _ in range(40):
+                moves = _moves_by_piece(board)
+                self.assertEqual(_moves_by_piece(bit_board), moves)
+                self.assertEqual(bit_board.is_cur_player_in_check()[0], board.is_cur_player_in_check()[0])
+                if not moves:
+                    break
+
+                piece_square, new_square = rng.choice(moves)
+                board.move_piece(piece_square, new_square)
+                bit_board.move_piece(piece_square, new_square)
+                board.change_player()
+                bit_board.change_player()
+                self.assertEqual(_board_chars(bit_board), _board_chars(board))
+
+
+if __name__ == '__main__':
+    unittest.main()
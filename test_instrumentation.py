@@ -0,0 +1,132 @@
+import copy
+import logging
+import sys
+import threading
+import types
+import unittest
+
+import bitboard
+import instrumentation
+import pieces
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        instrumentation.reset()
+        self.handler = ListHandler()
+
+    def tearDown(self):
+        instrumentation.set_tracer(None)
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_disabled_records_nothing(self):
+        board = pieces.Board()
+        board.list_legal_moves()
+        board.check_if_move_valid((4, 1), (4, 3))
+
+        self.assertEqual(instrumentation.get_counters(), {})
+        self.assertEqual(instrumentation.get_timers(), {})
+
+    def test_counters_and_timers(self):
+        instrumentation.enable(self.handler)
+        board = pieces.Board()
+
+        self.assertEqual(len(board.list_legal_moves()), 20)
+        self.assertEqual(instrumentation.get_counters()["moves_generated"], 20)
+
+        # A legal move is answered from the position's cached moves, only a rejected one is validated again.
+        validations = instrumentation.get_counters().get("validations", 0)
+        self.assertTrue(board.check_if_move_valid((4, 1), (4, 3))[0])
+        self.assertEqual(instrumentation.get_counters().get("validations", 0), validations)
+        self.assertFalse(board.check_if_move_valid((4, 1), (4, 4))[0])
+        copy.deepcopy(board)
+
+        counters = instrumentation.get_counters()
+        self.assertEqual(counters["validations"], validations + 1)
+        self.assertEqual(counters["board_clones"], 1)
+
+        timers = instrumentation.get_timers()
+        self.assertEqual(timers["Board.list_legal_moves"][0], 1)
+        self.assertEqual(timers["Board.check_if_move_valid"][0], 2)
+
+    def test_bitboard_times_the_same_calls(self):
+        def timed_names(cls):
+            return {name for name, value in vars(cls).items()
+                    if isinstance(value, types.FunctionType) and hasattr(value, "__wrapped__")}
+        self.assertEqual(timed_names(bitboard.BitBoard), timed_names(pieces.Board))
+
+        instrumentation.enable(self.handler)
+        bitboard.BitBoard().move_piece((4, 1), (4, 3))
+        self.assertEqual(instrumentation.get_timers()["BitBoard.move_piece"][0], 1)
+
+    def test_threads_lose_no_updates(self):
+        def record():
+            for _ in range(20000):
+                instrumentation.count("moves_generated")
+                instrumentation.add_time("Board.move_piece", 0.001)
+
+        interval = sys.getswitchinterval()
+        # Switching threads as often as possible is what makes an unguarded += lose updates.
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(instrumentation.get_counters()["moves_generated"], 80000)
+        self.assertEqual(instrumentation.get_timers()["Board.move_piece"][0], 80000)
+
+    def test_tracer_sees_each_call(self):
+        spans = []
+
+        class Tracer:
+            def add_span(self, name, start, seconds):
+                spans.append((name, seconds))
+
+        instrumentation.set_tracer(Tracer())
+        board = pieces.Board()
+        board.list_legal_moves()
+        self.assertEqual(spans, [])
+
+        instrumentation.enable(self.handler)
+        board.move_piece((4, 1), (4, 3))
+        self.assertEqual([name for name, _ in spans], ["Board.move_piece"])
+        self.assertGreaterEqual(spans[0][1], 0.0)
+
+    def test_flush_goes_through_queue(self):
+        instrumentation.enable(self.handler)
+        instrumentation.count("validations", 3)
+        instrumentation.add_time("Board.move_piece", 0.5)
+        instrumentation.flush()
+
+        # Stopping the listener drains the queue into the handler.
+        instrumentation.disable()
+        self.assertEqual(self.handler.messages,
+                         ["counter validations 3", "timer Board.move_piece 1 calls 0.500000s"])
+
+    def test_format_summary(self):
+        self.assertIn("nothing recorded", instrumentation.format_summary())
+
+        instrumentation.count("check_tests", 2)
+        instrumentation.add_time("Board.list_legal_moves", 0.002)
+        summary = instrumentation.format_summary()
+        self.assertIn("check_tests", summary)
+        self.assertIn("Board.list_legal_moves", summary)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+import bitboard
+import move_worker
+import pieces
+import search
+
+
+class TestAnalyseTurn(unittest.TestCase):
+
+    def test_targets_match_the_board(self):
+        for board_cls in (pieces.Board, bitboard.BitBoard):
+            board = board_cls()
+            analysis = move_worker.analyse_turn(1, board)
+            with self.subTest(board=board_cls.__name__):
+                self.assertEqual(sum(len(targets) for targets in analysis.get_legal_targets().values()), 20)
+                self.assertEqual(sorted(analysis.get_targets((6, 0))), sorted(board.list_valid_moves_for_piece((6, 0))))
+                self.assertEqual(analysis.get_targets((4, 4)), [])
+                self.assertFalse(analysis.is_in_check())
+                self.assertIsNone(analysis.get_game_over())
+
+    def test_promotion_counts_once(self):
+        board = pieces.Board.from_fen("4k3/P7/8/8/8/8/8/4K3 w - - 0 1")
+        self.assertEqual(move_worker.analyse_turn(1, board).get_targets((0, 6)), [(0, 7)])
+
+    def test_checkmate(self):
+        board = pieces.Board.from_fen("rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3")
+        analysis = move_worker.analyse_turn(1, board, search.Searcher(node_limit=50))
+        self.assertTrue(analysis.is_in_check())
+        self.assertEqual(analysis.get_game_over(), "CHECKMATE")
+        self.assertIsNone(analysis.get_engine_move())
+
+
+class TestMoveWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.worker = move_worker.MoveWorker(search.Searcher(node_limit=300)).start()
+        self.addCleanup(self.worker.stop)
+
+    def test_engine_move_on_a_copy(self):
+        board = pieces.Board.from_fen("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+        turn = self.worker.submit(board, search=True)
+        analysis = self.worker.wait(timeout=30)
+        self.assertEqual(analysis.get_turn(), turn)
+        self.assertEqual(analysis.get_engine_move(), ((0, 0), (0, 7), None))
+        self.assertEqual(board.to_fen(), "6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+
+    def test_only_the_latest_turn_is_returned(self):
+        board = pieces.Board()
+        self.worker.submit(board)
+        board.move_piece((4, 1), (4, 3))
+        board.change_player()
+        turn = self.worker.submit(board)
+        analysis = self.worker.wait(timeout=30)
+        self.assertEqual(analysis.get_turn(), turn)
+        self.assertIn((4, 4), analysis.get_targets((4, 6)))
+        self.assertIsNone(self.worker.poll())
+
+    def test_draw_by_repetition_uses_the_history(self):
+        shuffle = [((6, 0), (5, 2)), ((6, 7), (5, 5)), ((5, 2), (6, 0)), ((5, 5), (6, 7))]
+        # After the double push no pawn can take en passant, so the position after e4 counts from its first time.
+        black_first = [((6, 7), (5, 5)), ((6, 0), (5, 2)), ((5, 5), (6, 7)), ((5, 2), (6, 0))]
+        games = [shuffle * 2, [((4, 1), (4, 3))] + black_first * 2]
+        for board_cls in (pieces.Board, bitboard.BitBoard):
+            for moves in games:
+                board = board_cls()
+                for move in moves:
+                    board.move_piece(*move)
+                    board.change_player()
+                with self.subTest(board=board_cls.__name__, plies=len(moves)):
+                    self.worker.submit(board)
+                    self.assertEqual(self.worker.wait(timeout=30).get_game_over(), pieces.THREEFOLD_REPETITION)
+
+    def test_fifty_move_rule_on_both_boards(self):
+        for board_cls in (pieces.Board, bitboard.BitBoard):
+            board = board_cls.from_fen("4k3/8/8/8/8/8/8/R3K3 w - - 99 80")
+            board.move_piece((0, 0), (0, 1))
+            board.change_player()
+            with self.subTest(board=board_cls.__name__):
+                self.worker.submit(board)
+                self.assertEqual(self.worker.wait(timeout=30).get_game_over(), pieces.FIFTY_MOVE_RULE)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+import instrumentation
+import perf_trace
+import pieces
+
+
+class TestPerfTrace(unittest.TestCase):
+
+    def test_rolling_timer(self):
+        timer = perf_trace.RollingTimer(size=3)
+        self.assertEqual(timer.get_mean(), 0.0)
+        for seconds in (1.0, 2.0, 3.0, 4.0):
+            timer.add(seconds)
+        self.assertEqual(timer.get_calls(), 4)
+        self.assertEqual(timer.get_last(), 4.0)
+        self.assertEqual(timer.get_mean(), 3.0)
+        self.assertEqual(timer.get_max(), 4.0)
+
+    def test_latency_histogram(self):
+        histogram = perf_trace.LatencyHistogram(edges_ms=(10, 20), size=4)
+        for seconds in (0.001, 0.005, 0.015, 0.5, 0.010):
+            histogram.add(seconds)
+        # The oldest sample has rolled out, a sample on an edge lands in the bucket above it.
+        self.assertEqual(histogram.get_counts(), [1, 2, 1])
+        self.assertEqual(histogram.get_labels(), ["<10", "<20", ">20"])
+
+    def test_recorder_bounds_events(self):
+        recorder = perf_trace.TraceRecorder(max_events=2)
+        for name in ("a", "b", "c"):
+            with recorder.span(name):
+                pass
+        self.assertEqual([event["name"] for event in recorder.get_trace_events() if event["ph"] == "X"], ["b", "c"])
+
+    def test_trace_file_from_board_calls(self):
+        recorder = perf_trace.TraceRecorder()
+        monitor = perf_trace.PerformanceMonitor(recorder)
+        instrumentation.enable(instrumentation.logging.NullHandler())
+        instrumentation.set_tracer(monitor)
+        try:
+            board = pieces.Board()
+            board.check_if_selection_valid((4, 1))
+            worker = threading.Thread(target=board.is_stalemate_or_checkmate, name="move-worker")
+            worker.start()
+            worker.join()
+        finally:
+            instrumentation.set_tracer(None)
+            instrumentation.disable()
+            instrumentation.reset()
+        monitor.add_frame(0.0, 0.002)
+        monitor.add_frame(0.016, 0.003)
+
+        self.assertEqual(monitor.get_call_timers()["Board.check_if_selection_valid"].get_calls(), 1)
+        self.assertIn("Board.is_stalemate_or_checkmate", monitor.get_call_timers())
+        self.assertAlmostEqual(monitor.get_frame_timer().get_last(), 0.016)
+        self.assertTrue(any(line.startswith("is_stalemate_or_checkmate") for line in monitor.format_lines()))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            written = recorder.write(path)
+            with open(path) as f:
+                trace_events = json.load(f)["traceEvents"]
+        self.assertEqual(len(trace_events), written)
+        self.assertEqual({event["args"]["name"] for event in trace_events if event["ph"] == "M"},
+                         {"MainThread", "move-worker"})
+        spans = [event for event in trace_events if event["ph"] == "X"]
+        self.assertEqual([event["name"] for event in spans if event["cat"] == "ui"], ["on_draw", "on_draw"])
+        self.assertTrue(all(event["dur"] >= 0 for event in spans))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+import perft
+
+
+# Keep the suite quick: only check depths whose node count stays small.
+MAX_TEST_NODES = 10000
+
+
+class TestPerft(unittest.TestCase):
+
+    def _check_reference_positions(self, backend):
+        for name, fen, expected_counts in perft.REFERENCE_POSITIONS:
+            for depth, expected in enumerate(expected_counts, start=1):
+                if expected > MAX_TEST_NODES:
+                    break
+                board = perft.board_from_fen(fen, perft.BACKENDS[backend])
+                with self.subTest(position=name, depth=depth):
+                    self.assertEqual(perft.perft(board, depth), expected)
+
+    def test_reference_positions_mailbox(self):
+        self._check_reference_positions("mailbox")
+
+    def test_reference_positions_bitboard(self):
+        self._check_reference_positions("bitboard")
+
+    def test_perft_divide(self):
+        counts = perft.perft_divide(perft.board_from_fen(perft.START_FEN), 2)
+        self.assertEqual(len(counts), 20)
+        self.assertEqual(counts["e2e4"], 20)
+        self.assertEqual(sum(counts.values()), 400)
+
+    def test_parallel_perft_divide(self):
+        counts = perft.parallel_perft_divide(perft.START_FEN, 3, "bitboard", processes=2)
+        self.assertEqual(counts, perft.perft_divide(perft.board_from_fen(perft.START_FEN), 3))
+
+    def test_perft_leaves_board_unchanged(self):
+        board = perft.board_from_fen(perft.REFERENCE_POSITIONS[1][1])
+        before = [[str(sq) for sq in row] for row in board.get_board()]
+        perft.perft(board, 2)
+        self.assertEqual([[str(sq) for sq in row] for row in board.get_board()], before)
+
+    def test_move_name(self):
+        self.assertEqual(perft.move_name(((4, 1), (4, 3), None)), "e2e4")
+        self.assertEqual(perft.move_name(((0, 6), (0, 7), 'N')), "a7a8n")
+        self.assertEqual(perft.parse_square("h8"), (7, 7))
+        for name in ("e9", "a0", "i1", "e", "e10"):
+            with self.assertRaises(ValueError):
+                perft.parse_square(name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import io
+import random
+import unittest
+
+import pgn
+import pieces
+
+
+SCHOLARS_MATE = """[Event "Scholar's mate"]
+[Result "1-0"]
+
+1. e4 e5 2. Bc4 {eyeing f7} Nc6 (2... Nf6 3. d3 (3. Qf3)) 3. Qh5 Nf6?? $4
+4. Qxf7# 1-0
+"""
+
+FOOLS_MATE_WRONG_RESULT = """[Event "Fool's mate"]
+[Result "1/2-1/2"]
+
+1. f3 e5 2. g4 Qh4# 1/2-1/2
+"""
+
+ILLEGAL_KING_MOVE = """[Event "Illegal"]
+
+1. e4 e5 2. Ke3 *
+"""
+
+BAD_FEN_HEADER = """[Event "Bad FEN"]
+[FEN "4k3/8/8/8/8/8/8/4K3 w - e 0 1"]
+
+1. Kd2 *
+"""
+
+
+def random_game(seed, max_plies=80):
+    # A PGN game written from a random playout, so SAN writing and reading can be checked against each other.
+    rng = random.Random(seed)
+    board = pieces.Board()
+    moves = []
+    for ply in range(max_plies):
+        legal_moves = board.list_legal_moves()
+        if not legal_moves:
+            break
+        move = rng.choice(legal_moves)
+        if ply % 2 == 0:
+            moves.append("{}.".format(ply // 2 + 1))
+        moves.append(pgn.move_to_san(board, move))
+        board.move_piece(*move)
+        board.change_player()
+
+    result = "*"
+    game_over = board.is_stalemate_or_checkmate()
+    if game_over == "CHECKMATE":
+        result = "0-1" if board.is_cur_player_white() else "1-0"
+    elif game_over == "STALEMATE":
+        result = "1/2-1/2"
+    return '[Event "Random {}"]\n\n{} {}\n'.format(seed, " ".join(moves), result)
+
+
+class TestReading(unittest.TestCase):
+
+    def test_iter_games_splits_stream(self):
+        games = list(pgn.iter_games(io.StringIO(SCHOLARS_MATE + "\n" + ILLEGAL_KING_MOVE)))
+        self.assertEqual([game.get_index() for game in games], [0, 1])
+        self.assertEqual(games[0].get_headers(), {"Event": "Scholar's mate", "Result": "1-0"})
+        self.assertEqual(games[1].get_headers(), {"Event": "Illegal"})
+
+    def test_tokenize_skips_comments_variations_and_nags(self):
+        game = next(pgn.iter_games(io.StringIO(SCHOLARS_MATE)))
+        tokens, result = pgn.tokenize_movetext(game.get_movetext())
+        self.assertEqual(tokens, ["e4", "e5", "Bc4", "Nc6", "Qh5", "Nf6??", "Qxf7#"])
+        self.assertEqual(result, "1-0")
+
+    def test_san_to_move(self):
+        board = pieces.Board.from_fen("r3k2r/8/8/8/8/2N3N1/8/R3K2R w KQkq - 0 1")
+        self.assertEqual(pgn.san_to_move(board, "Nce4"), ((2, 2), (4, 3), None))
+        self.assertIsNone(pgn.san_to_move(board, "Ne4"))
+        self.assertEqual(pgn.san_to_move(board, "O-O-O"), ((4, 0), (2, 0), None))
+        self.assertEqual(pgn.san_to_move(board, "Rxa8+"), ((0, 0), (0, 7), None))
+
+        board = pieces.Board.from_fen("8/4P3/8/8/8/k7/8/K7 w - - 0 1")
+        self.assertEqual(pgn.san_to_move(board, "e8=N"), ((4, 6), (4, 7), 'N'))
+
+    def test_san_to_move_checks_captures(self):
+        board = pieces.Board.from_fen("r3k2r/8/8/8/8/2N3N1/8/R3K2R w KQkq - 0 1")
+        self.assertIsNone(pgn.san_to_move(board, "Ra8"))
+        self.assertIsNone(pgn.san_to_move(board, "Nxce4"))
+        self.assertIsNone(pgn.san_to_move(board, "Ncxe4"))
+
+        board = pieces.Board.from_fen("4k3/8/8/3pP3/8/2p5/1P1P4/4K3 w - d6 0 1")
+        self.assertEqual(pgn.san_to_move(board, "exd6"), ((4, 4), (3, 5), None))
+        self.assertIsNone(pgn.san_to_move(board, "d6"))
+        self.assertIsNone(pgn.san_to_move(board, "ed6"))
+        self.assertEqual(pgn.san_to_move(board, "bxc3"), ((1, 1), (2, 2), None))
+        self.assertIsNone(pgn.san_to_move(board, "bc3"))
+        self.assertIsNone(pgn.san_to_move(board, "xc3"))
+        self.assertEqual(pgn.san_to_move(board, "b4"), ((1, 1), (1, 3), None))
+        self.assertIsNone(pgn.san_to_move(board, "bb4"))
+        self.assertIsNone(pgn.san_to_move(board, "bxb4"))
+
+    def test_move_to_san(self):
+        board = pieces.Board.from_fen("r3k2r/8/8/8/8/2N3N1/8/R3K2R w KQkq - 0 1")
+        self.assertEqual(pgn.move_to_san(board, ((2, 2), (4, 3), None)), "Nce4")
+        self.assertEqual(pgn.move_to_san(board, ((4, 0), (6, 0), None)), "O-O")
+        self.assertEqual(pgn.move_to_san(board, ((0, 0), (0, 7), None)), "Rxa8+")
+
+
+class TestValidation(unittest.TestCase):
+
+    def _verdicts(self, text, **kwargs):
+        return list(pgn.validate_games(pgn.iter_games(io.StringIO(text)), **kwargs))
+
+    def test_verdicts(self):
+        verdicts = self._verdicts(SCHOLARS_MATE + FOOLS_MATE_WRONG_RESULT + ILLEGAL_KING_MOVE)
+        self.assertEqual([verdict.get_status() for verdict in verdicts],
+                         [pgn.LEGAL, pgn.RESULT_MISMATCH, pgn.ILLEGAL])
+        self.assertEqual(verdicts[0].get_plies(), 7)
+        self.assertEqual(verdicts[2].get_plies(), 2)
+        self.assertEqual(str(verdicts[2]), "game 2: illegal at ply 3: Ke3")
+
+    def test_bad_fen_header_fails_only_its_game(self):
+        text = BAD_FEN_HEADER + SCHOLARS_MATE
+        for backend in ("mailbox", "bitboard"):
+            for processes in (1, 2):
+                with self.subTest(backend=backend, processes=processes):
+                    verdicts = self._verdicts(text, backend=backend, processes=processes)
+                    self.assertEqual([verdict.get_status() for verdict in verdicts], [pgn.ILLEGAL, pgn.LEGAL])
+                    self.assertIn("bad FEN header", verdicts[0].get_message())
+
+    def test_random_games_round_trip(self):
+        text = "\n".join(random_game(seed) for seed in range(115, 120))
+        for backend in ("mailbox", "bitboard"):
+            with self.subTest(backend=backend):
+                verdicts = self._verdicts(text, backend=backend)
+                self.assertEqual([verdict.get_status() for verdict in verdicts], [pgn.LEGAL] * 5)
+
+    def test_pool_matches_serial(self):
+        text = "\n".join(random_game(seed, max_plies=30) for seed in range(6)) + ILLEGAL_KING_MOVE
+        serial = [str(verdict) for verdict in self._verdicts(text)]
+        ordered = [str(verdict) for verdict in self._verdicts(text, processes=2, window=4)]
+        unordered = [str(verdict) for verdict in self._verdicts(text, processes=2, ordered=False, window=4)]
+        self.assertEqual(ordered, serial)
+        self.assertEqual(sorted(unordered), sorted(serial))
+
+    def test_slow_game_does_not_hold_back_later_games(self):
+        # Validating the long game takes about as long as a hundred one-move games. Were the games sent in
+        # windows of 4, its verdict would come back among the first four.
+        quick = '[Event "Quick"]\n\n1. e4 *\n'
+        text = random_game(0, max_plies=400) + "\n" + quick * 20
+        verdicts = self._verdicts(text, processes=2, ordered=False, window=4)
+        self.assertEqual(sorted(verdict.get_index() for verdict in verdicts), list(range(21)))
+        self.assertGreater([verdict.get_index() for verdict in verdicts].index(0), 4)
+
+    def test_stopping_early_shuts_the_pool_down(self):
+        text = "\n".join(random_game(seed, max_plies=10) for seed in range(20))
+        verdicts = pgn.validate_games(pgn.iter_games(io.StringIO(text)), processes=2, window=2)
+        self.assertEqual(next(verdicts).get_index(), 0)
+        verdicts.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
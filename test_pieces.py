@@ -1,6 +1,9 @@
+import copy
+import pickle
 import unittest
 
 import pieces
+import transposition
 
 
 class TestBoard(unittest.TestCase):
@@ -14,21 +17,18 @@ class TestBoard(unittest.TestCase):
         for x in range(2, self.board1._board_size-2):
             for y in range(2, self.board1._board_size-2):
                 square = self.board1._board[x][y]
-                self.assertIsInstance(square, pieces.Square)
-                self.assertEqual(square._cur_square, (x, y))
+                self.assertIs(square, pieces.EMPTY_SQUARE)
 
         # Confirm that second rank is all white pawns.
         for x in range(self.board1._board_size):
             pawn = self.board1._board[1][x]
             self.assertIsInstance(pawn, pieces.Pawn)
-            self.assertEqual(pawn._cur_square, (x, 1))
             self.assertTrue(pawn.is_white())
 
         # Confirm that 7th rank is all black pawns
         for x in range(self.board1._board_size):
             pawn = self.board1._board[6][x]
             self.assertIsInstance(pawn, pieces.Pawn)
-            self.assertEqual(pawn._cur_square, (x, 6))
             self.assertFalse(pawn.is_white())
 
         # Confirm corner squares are rooks of appropriate colours
@@ -39,24 +39,20 @@ class TestBoard(unittest.TestCase):
         black_rook2 = self.board1._board[7][7]
 
         self.assertIsInstance(white_rook1, pieces.Rook)
-        self.assertEqual(white_rook1._cur_square, (0,0))
         self.assertTrue(white_rook1.is_white())
 
         self.assertIsInstance(white_rook2, pieces.Rook)
-        self.assertEqual(white_rook2._cur_square, (7,0))
         self.assertTrue(white_rook2.is_white())
 
         self.assertIsInstance(black_rook1, pieces.Rook)
-        self.assertEqual(black_rook1._cur_square, (0,7))
         self.assertFalse(black_rook1.is_white())
 
         self.assertIsInstance(black_rook2, pieces.Rook)
-        self.assertEqual(black_rook2._cur_square, (7,7))
         self.assertFalse(black_rook2.is_white())
 
     def test_get_square(self):
-        square1 = pieces.Square((4, 4))
-        square2 = pieces.Pawn((7, 7), True)
+        square1 = pieces.EMPTY_SQUARE
+        square2 = pieces.Pawn(True)
 
         self.board1._board[1][0] = square1
         self.board2._board[7][7] = square2
@@ -69,8 +65,8 @@ class TestBoard(unittest.TestCase):
         coord1 = (2, 3)
         coord2 = (7, 7)
 
-        square1 = pieces.Square(coord1)
-        square2 = pieces.Pawn(coord2, True)
+        square1 = pieces.EMPTY_SQUARE
+        square2 = pieces.Pawn(True)
 
         self.board1.set_square(coord1, square1)
         self.board2.set_square(coord2, square2)
@@ -110,14 +106,14 @@ class TestBoard(unittest.TestCase):
 
         coord1 = (1, 2)
         coord2 = (3, 4)
-        square1 = pieces.Square(coord1)
-        square2 = pieces.Square(coord2)
+        square1 = pieces.EMPTY_SQUARE
+        square2 = pieces.EMPTY_SQUARE
 
-        white_pawn1 = pieces.Pawn(coord1, True)
-        white_pawn2 = pieces.Pawn(coord2, True)
+        white_pawn1 = pieces.Pawn(True)
+        white_pawn2 = pieces.Pawn(True)
 
-        black_pawn1 = pieces.Pawn(coord1, False)
-        black_pawn2 = pieces.Pawn(coord2, False)
+        black_pawn1 = pieces.Pawn(False)
+        black_pawn2 = pieces.Pawn(False)
 
         # Should return False and error message if square selected is not a piece.
         self.board1._board[coord1[1]][coord1[0]] = square1
@@ -161,15 +157,451 @@ class TestBoard(unittest.TestCase):
     def test_move_piece(self):
         pass
 
+    def test_list_valid_moves_for_piece(self):
+        self.assertCountEqual(self.board1.list_valid_moves_for_piece((1, 0)), [(0, 2), (2, 2)])
+        self.assertCountEqual(self.board1.list_valid_moves_for_piece((4, 1)), [(4, 2), (4, 3)])
+        self.assertEqual(self.board1.list_valid_moves_for_piece((0, 0)), [])
+        self.assertEqual(self.board1.list_valid_moves_for_piece((4, 4)), [])
+
+    def test_list_valid_moves_for_player(self):
+        self.assertEqual(len(self.board1.list_valid_moves_for_player()), 20)
+
+        self.board2.change_player()
+        self.assertEqual(len(self.board2.list_valid_moves_for_player()), 20)
+
+    def test_generate_moves_matches_is_valid_move(self):
+        self.board1.move_piece((4, 1), (4, 3))
+        self.board1.move_piece((3, 6), (3, 4))
+        self.board1.move_piece((6, 0), (5, 2))
+
+        for x in range(self.board1.get_board_size()):
+            for y in range(self.board1.get_board_size()):
+                piece = self.board1.get_square((x, y))
+                if not piece.is_piece():
+                    continue
+
+                generated = set(piece.generate_moves((x, y), self.board1))
+                for new_x in range(self.board1.get_board_size()):
+                    for new_y in range(self.board1.get_board_size()):
+                        if (new_x, new_y) == (x, y):
+                            continue
+                        res, _ = piece.is_valid_move((x, y), (new_x, new_y), self.board1)
+                        self.assertEqual(res, (new_x, new_y) in generated)
+
+    def _snapshot(self, board):
+        squares = []
+        for row in board.get_board():
+            for sq in row:
+                has_moved = sq.get_has_moved() if isinstance(sq, pieces.HasMovedMixin) else None
+                squares.append((id(sq), str(sq), has_moved))
+        return (squares, board._white_king_coords, board._black_king_coords, list(board.get_taken_pieces()))
+
+    def test_make_and_unmake_capture(self):
+        self.board1.move_piece((4, 1), (4, 3))
+        self.board1.move_piece((3, 6), (3, 4))
+
+        before = self._snapshot(self.board1)
+        undo = self.board1.make_move((4, 3), (3, 4))
+
+        self.assertEqual(str(self.board1.get_square((3, 4))), "P(W)")
+        self.assertEqual(len(self.board1.get_taken_pieces()), 1)
+
+        self.board1.unmake_move(undo)
+        self.assertEqual(self._snapshot(self.board1), before)
+
+    def test_make_and_unmake_castling(self):
+        for coord in [(5, 0), (6, 0)]:
+            self.board1.set_square(coord, pieces.EMPTY_SQUARE)
+
+        before = self._snapshot(self.board1)
+        undo = self.board1.make_move((4, 0), (6, 0))
+
+        self.assertEqual(str(self.board1.get_square((6, 0))), "K(W)")
+        self.assertEqual(str(self.board1.get_square((5, 0))), "R(W)")
+        self.assertFalse(self.board1.get_square((7, 0)).is_piece())
+        self.assertEqual(self.board1.get_cur_king_coords(), (6, 0))
+
+        self.board1.unmake_move(undo)
+        self.assertEqual(self._snapshot(self.board1), before)
+
+    def test_make_and_unmake_promotion(self):
+        self.board1.set_square((0, 7), pieces.EMPTY_SQUARE)
+        self.board1.set_square((0, 6), pieces.Pawn(True))
+
+        before = self._snapshot(self.board1)
+        undo = self.board1.make_move((0, 6), (0, 7))
+
+        self.assertIsInstance(self.board1.get_square((0, 7)), pieces.Queen)
+
+        self.board1.unmake_move(undo)
+        self.assertEqual(self._snapshot(self.board1), before)
+        self.assertIsInstance(self.board1.get_square((0, 6)), pieces.Pawn)
+
+    def test_make_and_unmake_en_passant(self):
+        self.board1.move_piece((4, 1), (4, 4))
+        self.board1.move_piece((3, 6), (3, 4))
+        self.assertEqual(self.board1.get_en_passant_square(), (3, 5))
+        self.assertIn((3, 5), self.board1.list_valid_moves_for_piece((4, 4)))
+
+        before = self._snapshot(self.board1)
+        undo = self.board1.make_move((4, 4), (3, 5))
+
+        self.assertIs(self.board1.get_square((3, 4)), pieces.EMPTY_SQUARE)
+        self.assertEqual(str(self.board1.get_taken_pieces()[0]), "P(B)")
+        self.assertIsNone(self.board1.get_en_passant_square())
+
+        self.board1.unmake_move(undo)
+        self.assertEqual(self._snapshot(self.board1), before)
+        self.assertEqual(self.board1.get_en_passant_square(), (3, 5))
+
+    def test_underpromotion(self):
+        self.board1.set_square((0, 7), pieces.EMPTY_SQUARE)
+        self.board1.set_square((0, 6), pieces.Pawn(True))
+        self.board1.move_piece((0, 6), (0, 7), pieces.Knight.char_rep())
+
+        self.assertIsInstance(self.board1.get_square((0, 7)), pieces.Knight)
+        self.assertTrue(self.board1.get_square((0, 7)).is_white())
+
+    def test_cannot_castle_when_in_check(self):
+        for coord in [(5, 0), (6, 0), (4, 1)]:
+            self.board1.set_square(coord, pieces.EMPTY_SQUARE)
+        self.board1.set_square((4, 5), pieces.Rook(False))
+
+        self.assertTrue(self.board1.is_cur_player_in_check()[0])
+        self.assertEqual(self.board1.check_if_move_valid((4, 0), (6, 0)), (False, "Cannot castle when in check"))
+
+    def test_check_if_move_valid_leaves_board_unchanged(self):
+        before = self._snapshot(self.board1)
+        for x in range(self.board1.get_board_size()):
+            self.board1.list_valid_moves_for_piece((x, 1))
+        self.board1.list_valid_moves_for_piece((6, 0))
+        self.assertEqual(self._snapshot(self.board1), before)
+
+    def _clear_board(self, board):
+        for x in range(board.get_board_size()):
+            for y in range(board.get_board_size()):
+                board.set_square((x, y), pieces.EMPTY_SQUARE)
+
+    def _place_kings(self, board, white_king, black_king):
+        board.set_square(white_king, pieces.King(True))
+        board.set_square(black_king, pieces.King(False))
+        board._white_king_coords = white_king
+        board._black_king_coords = black_king
+
+    def test_pinned_piece_moves_along_pin(self):
+        self._clear_board(self.board1)
+        self._place_kings(self.board1, (4, 0), (0, 7))
+        self.board1.set_square((4, 2), pieces.Rook(True))
+        self.board1.set_square((4, 6), pieces.Rook(False))
+        self.board1.set_square((3, 1), pieces.Bishop(True))
+        self.board1.set_square((0, 4), pieces.Bishop(False))
+
+        self.assertEqual(sorted(self.board1.list_valid_moves_for_piece((4, 2))),
+                         [(4, 1), (4, 3), (4, 4), (4, 5), (4, 6)])
+        self.assertEqual(sorted(self.board1.list_valid_moves_for_piece((3, 1))), [(0, 4), (1, 3), (2, 2)])
+        self.assertEqual(self.board1.check_if_move_valid((4, 2), (0, 2)), (False, "In check: Enemy Rook on (4, 6)"))
+
+    def test_check_evasions(self):
+        self._clear_board(self.board1)
+        self._place_kings(self.board1, (4, 0), (0, 7))
+        self.board1.set_square((4, 6), pieces.Rook(False))
+        self.board1.set_square((0, 3), pieces.Rook(True))
+        self.board1.set_square((3, 5), pieces.Knight(True))
+
+        # Block on the file, capture the checker, or step off the file but not back along it.
+        self.assertEqual(sorted(self.board1.list_valid_moves_for_piece((0, 3))), [(4, 3)])
+        self.assertEqual(self.board1.list_valid_moves_for_piece((3, 5)), [(4, 3)])
+        self.assertEqual(sorted(self.board1.list_valid_moves_for_piece((4, 0))),
+                         [(3, 0), (3, 1), (5, 0), (5, 1)])
+        self.assertEqual(self.board1.check_if_move_valid((0, 3), (0, 4)), (False, "In check: Enemy Rook on (4, 6)"))
+
+        # Double check, only the king moves.
+        self.board1.set_square((5, 2), pieces.Knight(False))
+        self.assertEqual(self.board1.list_valid_moves_for_piece((0, 3)), [])
+        self.assertEqual(sorted(self.board1.list_valid_moves_for_player()), [(3, 0), (5, 0), (5, 1)])
+
+    def test_en_passant_discovered_check(self):
+        self._clear_board(self.board1)
+        self._place_kings(self.board1, (0, 4), (7, 7))
+        self.board1.set_square((1, 4), pieces.Pawn(True))
+        self.board1.get_square((1, 4)).set_has_moved(True)
+        self.board1.set_square((2, 6), pieces.Pawn(False))
+        self.board1.set_square((7, 4), pieces.Rook(False))
+        self.board1.change_player()
+        self.board1.move_piece((2, 6), (2, 4))
+        self.board1.change_player()
+
+        # Taking en passant would clear the rank between the king and the rook.
+        self.assertEqual(self.board1.list_valid_moves_for_piece((1, 4)), [(1, 5)])
+        self.assertEqual(self.board1.check_if_move_valid((1, 4), (2, 5)), (False, "In check: Enemy Rook on (7, 4)"))
+
+    def test_is_square_attacked(self):
+        self.assertTrue(self.board1.is_square_attacked((5, 2), True))
+        self.assertTrue(self.board1.is_square_attacked((3, 1), True))
+        self.assertFalse(self.board1.is_square_attacked((4, 3), True))
+        self.assertFalse(self.board1.is_square_attacked((4, 3), False))
+
+        # Moving the e-pawn opens the d1-h5 and f1-a6 diagonals.
+        self.board1.move_piece((4, 1), (4, 3))
+        self.assertTrue(self.board1.is_square_attacked((7, 4), True))
+        self.assertTrue(self.board1.is_square_attacked((0, 5), True))
+        self.assertFalse(self.board1.is_square_attacked((7, 5), True))
+
+    def test_attack_counts_updated_incrementally(self):
+        moves = [((4, 1), (4, 3)), ((3, 6), (3, 4)), ((4, 3), (3, 4)), ((3, 7), (3, 4)), ((1, 0), (2, 2)),
+                 ((3, 4), (0, 4)), ((5, 0), (1, 4)), ((2, 6), (2, 5)), ((6, 0), (5, 2)), ((2, 5), (1, 4))]
+        for piece_square, new_square in moves:
+            undo = self.board1.make_move(piece_square, new_square)
+            counts = copy.deepcopy(self.board1._attack_counts)
+            self.board1._refresh_attack_counts()
+            self.assertEqual(self.board1._attack_counts, counts)
+
+            self.board1.unmake_move(undo)
+            self.board1.move_piece(piece_square, new_square)
+            self.board1.change_player()
+
+        counts = copy.deepcopy(self.board1._attack_counts)
+        self.board1._refresh_attack_counts()
+        self.assertEqual(self.board1._attack_counts, counts)
+
+    def test_cannot_castle_through_attacked_square(self):
+        for coord in [(5, 0), (6, 0), (5, 1)]:
+            self.board1.set_square(coord, pieces.EMPTY_SQUARE)
+        self.board1.set_square((5, 4), pieces.Rook(False))
+
+        self.assertEqual(self.board1.check_if_move_valid((4, 0), (6, 0)),
+                         (False, "Cannot castle, Would result in check on (5, 0)"))
+        self.assertNotIn((6, 0), self.board1.list_valid_moves_for_piece((4, 0)))
+
+    def test_fen_round_trip(self):
+        self.assertEqual(self.board1.to_fen(), pieces.START_FEN)
+
+        fen = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R b Kq - 3 17"
+        board = pieces.Board.from_fen(fen)
+        self.assertEqual(board.to_fen(), fen)
+        self.assertFalse(board.is_cur_player_white())
+        self.assertEqual((board.get_halfmove_clock(), board.get_fullmove_number()), (3, 17))
+        self.assertEqual(board.get_zobrist_key(), board.compute_zobrist_key())
+
+        # Castling rights come back as has_moved flags.
+        self.assertFalse(board.get_square((4, 0)).get_has_moved())
+        self.assertFalse(board.get_square((7, 0)).get_has_moved())
+        self.assertTrue(board.get_square((0, 0)).get_has_moved())
+        self.assertTrue(board.get_square((7, 7)).get_has_moved())
+        self.assertFalse(board.get_square((2, 1)).get_has_moved())
+        self.assertTrue(board.get_square((4, 3)).get_has_moved())
+
+    def test_fen_matches_played_moves(self):
+        for piece_square, new_square in [((4, 1), (4, 3)), ((4, 6), (4, 4)), ((6, 0), (5, 2))]:
+            self.board1.move_piece(piece_square, new_square)
+            self.board1.change_player()
+        fen = "rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2"
+        self.assertEqual(self.board1.to_fen(), fen)
+
+        board = pieces.Board.from_fen(fen)
+        self.assertEqual(board.get_zobrist_key(), self.board1.get_zobrist_key())
+        self.assertEqual(sorted(board.list_legal_moves()), sorted(self.board1.list_legal_moves()))
+
+        undo = self.board1.make_move((3, 6), (3, 4))
+        self.assertEqual(self.board1.get_en_passant_square(), (3, 5))
+        self.assertEqual((self.board1.get_halfmove_clock(), self.board1.get_fullmove_number()), (0, 3))
+        self.board1.unmake_move(undo)
+        self.assertEqual(self.board1.to_fen(), fen)
+
+    def test_invalid_fen(self):
+        for fen in ["8/8/8 w - - 0 1", "rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+                    "4k3/8/8/8/8/8/8/8 w - - 0 1", "4k3/8/8/8/8/8/8/4K3 x - - 0 1",
+                    "4k3/8/8/8/8/8/8/4X3 w - - 0 1", "4k3/8/8/8/8/8/8/4K3 w - e 0 1",
+                    "4k3/8/8/8/8/8/8/4K3 w - e9 0 1", "4k3/8/8/8/8/8/8/4K3 w - e4 0 1"]:
+            with self.assertRaises(ValueError):
+                pieces.Board.from_fen(fen)
+
+    def test_zobrist_key_transposition(self):
+        start_key = self.board1.get_zobrist_key()
+        self.assertEqual(start_key, self.board1.compute_zobrist_key())
+
+        # Knights out and back again reach the start position with the same player to move.
+        keys = []
+        for piece_square, new_square in [((6, 0), (5, 2)), ((6, 7), (5, 5)), ((5, 2), (6, 0)), ((5, 5), (6, 7))]:
+            self.board1.move_piece(piece_square, new_square)
+            self.board1.change_player()
+            self.assertEqual(self.board1.get_zobrist_key(), self.board1.compute_zobrist_key())
+            keys.append(self.board1.get_zobrist_key())
+        self.assertNotIn(start_key, keys[:-1])
+        self.assertEqual(self.board1.get_zobrist_key(), start_key)
+
+    def test_zobrist_key_side_castling_and_en_passant(self):
+        start_key = self.board1.get_zobrist_key()
+        self.board1.change_player()
+        self.assertNotEqual(self.board1.get_zobrist_key(), start_key)
+        self.board1.change_player()
+
+        # A double push beside an enemy pawn sets an en passant square, which is part of the key.
+        for board in (self.board1, self.board2):
+            board.set_square((3, 3), pieces.Pawn(False))
+        self.board1.move_piece((4, 1), (4, 3))
+        self.board2.set_square((4, 1), pieces.EMPTY_SQUARE)
+        self.board2.set_square((4, 3), pieces.Pawn(True))
+        self.board2.get_square((4, 3)).set_has_moved(True)
+        self.assertNotEqual(self.board1.get_zobrist_key(), self.board2.get_zobrist_key())
+
+        # Losing a castling right changes the key even with the king back on its square.
+        self.board1.move_piece((4, 0), (4, 1))
+        self.board1.move_piece((4, 1), (4, 0))
+        self.board2._refresh_zobrist_key()
+        self.assertEqual(self.board1.get_zobrist_key(), self.board1.compute_zobrist_key())
+        self.assertNotEqual(self.board1.get_zobrist_key(), self.board2.get_zobrist_key())
+
+    def test_zobrist_key_ignores_uncapturable_en_passant(self):
+        # 1.d4 Nf6 2.c4 and 1.c4 Nf6 2.d4 reach the same position, no black pawn can take either pawn.
+        boards = [pieces.Board(), pieces.Board()]
+        for board, moves in zip(boards, [[((3, 1), (3, 3)), ((6, 7), (5, 5)), ((2, 1), (2, 3))],
+                                         [((2, 1), (2, 3)), ((6, 7), (5, 5)), ((3, 1), (3, 3))]]):
+            for move in moves:
+                board.move_piece(*move)
+                board.change_player()
+            self.assertEqual(board.get_zobrist_key(), board.compute_zobrist_key())
+        self.assertNotEqual(boards[0].get_en_passant_square(), boards[1].get_en_passant_square())
+        self.assertEqual(boards[0].get_zobrist_key(), boards[1].get_zobrist_key())
+
+        fen = "rnbqkb1r/pppppppp/5n2/8/2PP4/8/PP2PPPP/RNBQKBNR b KQkq - 0 2"
+        self.assertEqual(pieces.Board.from_fen(fen).get_zobrist_key(), boards[0].get_zobrist_key())
+        self.assertEqual(pieces.Board.from_fen(boards[0].to_fen()).get_zobrist_key(), boards[0].get_zobrist_key())
+
+        # With a black pawn on b4 the c-pawn can be taken en passant, so that key differs.
+        board = pieces.Board.from_fen("rnbqkbnr/p1pppppp/8/8/1pP5/8/PP1PPPPP/RNBQKBNR b KQkq c3 0 3")
+        self.assertNotEqual(board.get_zobrist_key(),
+                            pieces.Board.from_fen("rnbqkbnr/p1pppppp/8/8/1pP5/8/PP1PPPPP/RNBQKBNR b KQkq - 0 3")
+                            .get_zobrist_key())
+        self.assertEqual(board.get_zobrist_key(), board.compute_zobrist_key())
+
+    def test_zobrist_key_restored_by_unmake(self):
+        for coord in [(5, 0), (6, 0), (0, 7)]:
+            self.board1.set_square(coord, pieces.EMPTY_SQUARE)
+        self.board1.set_square((0, 6), pieces.Pawn(True))
+        self.board1._refresh_zobrist_key()
+
+        key = self.board1.get_zobrist_key()
+        for move in [((4, 0), (6, 0), None), ((0, 6), (0, 7), 'N'), ((0, 6), (1, 7), None)]:
+            undo = self.board1.make_move(*move)
+            self.assertEqual(self.board1.get_zobrist_key(), self.board1.compute_zobrist_key())
+            self.board1.unmake_move(undo)
+            self.assertEqual(self.board1.get_zobrist_key(), key)
+
+    def test_move_errors_carry_codes(self):
+        board = pieces.Board.from_fen("4k3/8/8/8/8/8/4r3/R3K2R w KQ - 0 1")
+        is_valid, err = board.check_if_move_valid((0, 0), (0, 7))
+        self.assertFalse(is_valid)
+        self.assertEqual(err.get_code(), pieces.IN_CHECK)
+        self.assertEqual((err.get_piece().long_name(), err.get_square()), ("Rook", (4, 1)))
+        self.assertEqual(str(err), "In check: Enemy Rook on (4, 1)")
+
+        self.assertEqual(board.check_if_move_valid((4, 0), (6, 0))[1].get_code(), pieces.CASTLE_IN_CHECK)
+        self.assertEqual(board.check_if_move_valid((0, 0), (1, 1))[1].get_code(), pieces.ROOK_NOT_STRAIGHT)
+        self.assertEqual(board.check_if_move_valid((0, 0), (4, 0))[1].get_code(), pieces.OWN_PIECE_ON_SQUARE)
+        self.assertEqual(board.check_if_selection_valid((4, 1))[1].get_code(), pieces.NOT_YOUR_PIECE)
+        for code in pieces.MOVE_ERROR_MESSAGES:
+            self.assertTrue(str(pieces.MoveError(code, pieces.Rook(True), (0, 0))))
+
+    def test_legal_targets_cached_per_position(self):
+        board = pieces.Board()
+        self.assertTrue(board.check_if_move_valid((4, 1), (4, 3))[0])
+        # Rejected moves keep the piece's own reason.
+        self.assertEqual(board.check_if_move_valid((4, 1), (4, 4)),
+                         (False, "Pawns cannot move forward more that 1 square (or 2 square on first move)"))
+        self.assertEqual(sorted(board.list_valid_moves_for_piece((6, 0))), [(5, 2), (7, 2)])
+
+        board.move_piece((4, 1), (4, 3))
+        board.change_player()
+        # Pieces of the player not to move are still answered, outside the cache.
+        self.assertEqual(sorted(board.list_valid_moves_for_piece((6, 0))), [(4, 1), (5, 2), (7, 2)])
+        self.assertEqual(sorted(board.list_valid_moves_for_piece((6, 7))), [(5, 5), (7, 5)])
+        self.assertTrue(board.check_if_move_valid((4, 6), (4, 4))[0])
+        self.assertFalse(board.check_if_move_valid((3, 7), (7, 3))[0])
+
+        # Changing a square by hand changes the key, so the cache doesn't outlive it either.
+        self.assertEqual(board.list_valid_moves_for_piece((4, 7)), [])
+        board.set_square((5, 6), pieces.EMPTY_SQUARE)
+        self.assertEqual(board.list_valid_moves_for_piece((4, 7)), [(5, 6)])
+
+    def test_has_any_legal_move(self):
+        board = pieces.Board()
+        self.assertTrue(board.has_any_legal_move())
+        for fen, has_moves in [("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", False),
+                               ("7k/6Q1/6K1/8/8/8/8/8 b - - 0 1", False),
+                               ("7k/8/6K1/8/8/8/8/Q7 b - - 0 1", True)]:
+            board = pieces.Board.from_fen(fen)
+            with self.subTest(fen=fen):
+                self.assertEqual(board.has_any_legal_move(), has_moves)
+                self.assertEqual(board.has_any_legal_move(), bool(board.list_legal_moves()))
+
+    def test_threefold_repetition(self):
+        table = transposition.TranspositionTable(64 * 1024)
+        for board in (pieces.Board(), pieces.Board(table)):
+            shuffle = [((6, 0), (5, 2)), ((6, 7), (5, 5)), ((5, 2), (6, 0)), ((5, 5), (6, 7))]
+            for repetition in range(2):
+                for move in shuffle:
+                    self.assertIsNone(board.is_stalemate_or_checkmate())
+                    board.move_piece(*move)
+                    board.change_player()
+                self.assertEqual(board.get_repetition_count(), repetition + 1)
+            self.assertEqual(board.is_stalemate_or_checkmate(), pieces.THREEFOLD_REPETITION)
+
+            # A pawn move can't be undone, so nothing before it counts.
+            board.move_piece((4, 1), (4, 3))
+            board.change_player()
+            self.assertEqual(board.get_repetition_count(), 0)
+
+    def test_threefold_repetition_after_double_push(self):
+        # 1.e4 Nf6 2.Nf3 Ng8 3.Ng1 Nf6 4.Nf3 Ng8 5.Ng1, the position after 1.e4 is on the board a third time.
+        board = pieces.Board()
+        moves = [((4, 1), (4, 3))] + [((6, 7), (5, 5)), ((6, 0), (5, 2)), ((5, 5), (6, 7)), ((5, 2), (6, 0))] * 2
+        for move in moves:
+            self.assertIsNone(board.is_stalemate_or_checkmate())
+            board.move_piece(*move)
+            board.change_player()
+        self.assertEqual(board.get_repetition_count(), 2)
+        self.assertEqual(board.is_stalemate_or_checkmate(), pieces.THREEFOLD_REPETITION)
+
+    def test_repetition_history_unmade(self):
+        board = pieces.Board()
+        undos = []
+        for move in [((6, 0), (5, 2)), ((6, 7), (5, 5)), ((5, 2), (6, 0)), ((5, 5), (6, 7))]:
+            undos.append(board.make_move(*move))
+            board.change_player()
+        self.assertEqual(board.get_repetition_count(), 1)
+        for undo in reversed(undos):
+            board.change_player()
+            board.unmake_move(undo)
+        self.assertEqual(board.get_repetition_count(), 0)
+        self.assertEqual(len(board._key_history), 0)
+
+    def test_fifty_move_rule(self):
+        board = pieces.Board.from_fen("4k3/8/8/8/8/8/8/R3K3 w - - 99 80")
+        self.assertIsNone(board.is_stalemate_or_checkmate())
+        board.move_piece((0, 0), (0, 1))
+        board.change_player()
+        self.assertEqual(board.is_stalemate_or_checkmate(), pieces.FIFTY_MOVE_RULE)
+
+        # Mate on the hundredth ply still wins.
+        board = pieces.Board.from_fen("6k1/5ppp/8/8/8/8/8/R5K1 w - - 99 80")
+        board.move_piece((0, 0), (0, 7))
+        board.change_player()
+        self.assertEqual(board.is_stalemate_or_checkmate(), "CHECKMATE")
+
+    def test_board_copy_shares_transposition_table(self):
+        table = transposition.TranspositionTable(64 * 1024)
+        board = pieces.Board(table)
+        board_copy = copy.deepcopy(board)
+        self.assertIs(board_copy.get_transposition_table(), table)
+        self.assertIsNot(board_copy.get_square((4, 1)), board.get_square((4, 1)))
+
 
 class TestSquare(unittest.TestCase):
 
     def setUp(self):
-        self.coords1 = (1, 2)
-        self.coords2 = (2, 1)
-
-        self.square1 = pieces.Square(self.coords1)
-        self.square2 = pieces.Square(self.coords2)
+        self.square1 = pieces.EMPTY_SQUARE
+        self.square2 = pieces.Square()
 
     def test_is_piece(self):
         self.assertFalse(self.square1.is_piece())
@@ -183,9 +615,19 @@ class TestSquare(unittest.TestCase):
         self.assertEqual(self.square1.long_name(), "Square")
         self.assertEqual(self.square2.long_name(), "Square")
 
-    def test_get_cur_square(self):
-        self.assertEqual(self.square1.get_cur_square(), self.coords1)
-        self.assertEqual(self.square2.get_cur_square(), self.coords2)
+    def test_empty_square_is_shared(self):
+        with self.assertRaises(AttributeError):
+            self.square1.some_attribute = 1
+
+        self.assertIs(copy.deepcopy(self.square1), pieces.EMPTY_SQUARE)
+        self.assertIs(pickle.loads(pickle.dumps(self.square1)), pieces.EMPTY_SQUARE)
+
+    def test_board_copy(self):
+        board = pieces.Board()
+        board_copy = copy.deepcopy(board)
+        self.assertIs(board_copy.get_square((4, 4)), pieces.EMPTY_SQUARE)
+        self.assertIsNot(board_copy.get_square((4, 1)), board.get_square((4, 1)))
+        self.assertEqual(str(board_copy.get_square((4, 1))), "P(W)")
 
 
 class TestPiece(unittest.TestCase):
@@ -194,12 +636,12 @@ class TestPiece(unittest.TestCase):
         self.coords1 = (1, 2)
         self.coords2 = (2, 1)
 
-        self.piece1 = pieces.Piece(True, cur_square=self.coords1)
-        self.piece2 = pieces.Piece(False, cur_square=self.coords2)
+        self.piece1 = pieces.Piece(True)
+        self.piece2 = pieces.Piece(False)
 
     def test_is_valid_move(self):
-        res1, err1 = self.piece1.is_valid_move((1,2), None)
-        res2, err2 = self.piece2.is_valid_move((2,2), None)
+        res1, err1 = self.piece1.is_valid_move(self.coords1, (1,2), None)
+        res2, err2 = self.piece2.is_valid_move(self.coords2, (2,2), None)
 
         self.assertFalse(res1)
         self.assertEqual(err1, "No move rules are defined for this - coords: {}".format(self.coords1))
@@ -215,11 +657,11 @@ class TestPawn(unittest.TestCase):
         self.coords1 = (1, 2)
         self.coords2 = (3, 4)
 
-        self.white_pawn1 = pieces.Pawn(self.coords1, True)
-        self.white_pawn2 = pieces.Pawn(self.coords2, True)
+        self.white_pawn1 = pieces.Pawn(True)
+        self.white_pawn2 = pieces.Pawn(True)
 
-        self.black_pawn1 = pieces.Pawn(self.coords1, False)
-        self.black_pawn2 = pieces.Pawn(self.coords2, False)
+        self.black_pawn1 = pieces.Pawn(False)
+        self.black_pawn2 = pieces.Pawn(False)
 
     def test_is_piece(self):
 
@@ -244,6 +686,11 @@ class TestPawn(unittest.TestCase):
         self.assertEqual(long_name, self.black_pawn1.long_name())
         self.assertEqual(long_name, self.black_pawn2.long_name())
 
+    def test_slots(self):
+
+        self.assertFalse(hasattr(self.white_pawn1, "__dict__"))
+        self.assertFalse(self.white_pawn1.get_has_moved())
+
     def test_is_white(self):
 
         self.assertTrue(self.white_pawn1.is_white())
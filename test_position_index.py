@@ -0,0 +1,91 @@
+import os
+import random
+import tempfile
+import unittest
+from collections import defaultdict
+
+import archive
+import pieces
+import position_index
+
+
+def random_moves(seed, plies):
+    rng = random.Random(seed)
+    board = pieces.Board()
+    moves = []
+    for _ in range(plies):
+        legal_moves = board.list_legal_moves()
+        if not legal_moves:
+            break
+        move = rng.choice(legal_moves)
+        board.move_piece(*move)
+        board.change_player()
+        moves.append(move)
+    return moves
+
+
+class TestPositionIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.archive_path = os.path.join(self._dir.name, "games.dca")
+        self.index_path = os.path.join(self._dir.name, "games.dcpi")
+        with archive.ArchiveWriter(self.archive_path) as writer:
+            for seed in range(8):
+                writer.add_game(random_moves(seed, 12))
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_matches_brute_force(self):
+        expected = defaultdict(list)
+        for key, posting in position_index.iter_archive_postings(self.archive_path):
+            expected[key].append((posting >> position_index.PLY_BITS, posting & position_index.PLY_MASK))
+
+        # A tiny run size makes the build merge many runs.
+        total = position_index.build_index(position_index.iter_archive_postings(self.archive_path),
+                                           self.index_path, run_size=7)
+        with position_index.PositionIndex(self.index_path) as index:
+            self.assertEqual(len(index), total)
+            self.assertEqual(total, sum(len(postings) for postings in expected.values()))
+            for key, postings in expected.items():
+                self.assertEqual(index.lookup(key), sorted(postings))
+            self.assertEqual(index.lookup(0), [])
+
+    def test_lookup_board(self):
+        position_index.build_index(position_index.iter_archive_postings(self.archive_path), self.index_path)
+        with position_index.PositionIndex(self.index_path) as index:
+            self.assertEqual(index.lookup_board(pieces.Board()), [(game_id, 0) for game_id in range(8)])
+
+            with archive.ArchiveReader(self.archive_path) as reader:
+                board = reader.replay(5)
+                plies = reader.get_ply_count(5)
+            self.assertIn((5, plies), index.lookup_board(board))
+
+    def test_lookup_transposed_move_order(self):
+        # 1.d4 Nf6 2.c4 is stored, 1.c4 Nf6 2.d4 and the FEN of the position must both find it.
+        with archive.ArchiveWriter(self.archive_path) as writer:
+            writer.add_game([((3, 1), (3, 3), None), ((6, 7), (5, 5), None), ((2, 1), (2, 3), None)])
+        position_index.build_index(position_index.iter_archive_postings(self.archive_path), self.index_path)
+
+        board = pieces.Board()
+        for move in [((2, 1), (2, 3)), ((6, 7), (5, 5)), ((3, 1), (3, 3))]:
+            board.move_piece(*move)
+            board.change_player()
+        fen = "rnbqkb1r/pppppppp/5n2/8/2PP4/8/PP2PPPP/RNBQKBNR b KQkq - 0 2"
+        with position_index.PositionIndex(self.index_path) as index:
+            self.assertEqual(index.lookup_board(board), [(0, 3)])
+            self.assertEqual(index.lookup_board(pieces.Board.from_fen(fen)), [(0, 3)])
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            position_index.PositionIndex(self.archive_path)
+
+    def test_empty_index(self):
+        self.assertEqual(position_index.build_index([], self.index_path), 0)
+        with position_index.PositionIndex(self.index_path) as index:
+            self.assertEqual(index.lookup(pieces.Board().get_zobrist_key()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+import bitboard
+import perft
+import pieces
+import search
+
+
+class TestEvaluate(unittest.TestCase):
+
+    def test_start_position_is_level(self):
+        board = pieces.Board()
+        self.assertEqual(search.evaluate(board), 0)
+        board.change_player()
+        self.assertEqual(search.evaluate(board), 0)
+
+    def test_material_from_side_to_move(self):
+        board = pieces.Board()
+        board.set_square((3, 7), pieces.EMPTY_SQUARE)
+        self.assertGreater(search.evaluate(board), 800)
+        board.change_player()
+        self.assertLess(search.evaluate(board), -800)
+
+    def test_backends_agree(self):
+        fen = perft.REFERENCE_POSITIONS[1][1]
+        self.assertEqual(search.evaluate(perft.board_from_fen(fen, bitboard.BitBoard)),
+                         search.evaluate(perft.board_from_fen(fen)))
+
+
+class TestSearcher(unittest.TestCase):
+
+    def test_finds_mate_in_one(self):
+        board = perft.board_from_fen("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+        result = search.Searcher(max_depth=3).search(board)
+
+        self.assertEqual(result.get_best_move(), ((0, 0), (0, 7), None))
+        self.assertGreater(result.get_score(), search.MATE_SCORE - 10)
+
+    def test_takes_hanging_queen(self):
+        board = perft.board_from_fen("4k3/8/8/3q4/8/8/3R4/4K3 w - - 0 1")
+        result = search.Searcher(max_depth=2).search(board)
+        self.assertEqual(result.get_best_move(), ((3, 1), (3, 4), None))
+
+    def test_node_budget(self):
+        board = pieces.Board()
+        before = [[str(sq) for sq in row] for row in board.get_board()]
+        key = board.get_zobrist_key()
+
+        iterations = []
+        result = search.Searcher(node_limit=300).search(board, on_iteration=iterations.append)
+
+        self.assertLessEqual(result.get_nodes(), 300)
+        self.assertGreaterEqual(result.get_depth(), 1)
+        self.assertEqual([r.get_depth() for r in iterations], list(range(1, result.get_depth() + 1)))
+        self.assertIn(result.get_best_move(), board.list_legal_moves())
+
+        # An aborted search must leave the board exactly as it found it.
+        self.assertEqual([[str(sq) for sq in row] for row in board.get_board()], before)
+        self.assertEqual(board.get_zobrist_key(), key)
+        self.assertTrue(board.is_cur_player_white())
+
+    def test_game_over(self):
+        # Fool's mate, white has no moves.
+        board = pieces.Board()
+        for piece_square, new_square in [((5, 1), (5, 2)), ((4, 6), (4, 4)), ((6, 1), (6, 3)), ((3, 7), (7, 3))]:
+            board.move_piece(piece_square, new_square)
+            board.change_player()
+
+        result = search.Searcher(max_depth=2).search(board)
+        self.assertIsNone(result.get_best_move())
+        self.assertEqual(result.get_score(), -search.MATE_SCORE)
+
+
+if __name__ == '__main__':
+    unittest.main()
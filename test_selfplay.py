@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+
+import archive
+import pieces
+import selfplay
+
+
+class TestPolicies(unittest.TestCase):
+
+    def test_capture_policy_takes_the_queen(self):
+        board = pieces.Board.from_fen("4k3/8/8/4q3/8/5N2/3r4/4K3 w - - 0 1")
+        move = selfplay.capture_policy(board, board.list_legal_moves(), selfplay.random.Random(0))
+        self.assertEqual(move, ((5, 2), (4, 4), None))
+
+    def test_search_policy_mates(self):
+        board = pieces.Board.from_fen("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+        move = selfplay.search_policy(board, board.list_legal_moves(), None)
+        self.assertEqual(move, ((0, 0), (0, 7), None))
+
+
+class TestSelfPlay(unittest.TestCase):
+
+    def test_game_is_reproducible(self):
+        first = selfplay.play_game(0, 7, "random", "capture", max_plies=60)
+        self.assertEqual(selfplay.play_game(0, 7, "random", "capture", max_plies=60), first)
+
+    def test_terminal_states(self):
+        for game_id, moves, result, terminal in selfplay.run_selfplay(12, "capture", "capture", processes=1):
+            board = pieces.Board()
+            for move in moves:
+                board.move_piece(*move)
+                board.change_player()
+            with self.subTest(game=game_id):
+                if terminal == selfplay.MAX_PLIES_REACHED:
+                    self.assertEqual(len(moves), selfplay.MAX_PLIES)
+                    self.assertEqual(result, "*")
+                else:
+                    self.assertEqual(board.is_stalemate_or_checkmate(), terminal)
+
+    def test_pool_matches_serial_and_streams_to_archive(self):
+        serial = list(selfplay.run_selfplay(6, seed=3, max_plies=40, processes=1))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "selfplay.dca")
+            with archive.ArchiveWriter(path) as writer:
+                pooled = list(selfplay.run_selfplay(6, seed=3, max_plies=40, processes=2, writer=writer))
+            with archive.ArchiveReader(path) as reader:
+                # Archive game k is the game played from seed + k, however long the games before it took.
+                self.assertEqual([reader.get_moves(game_id) for game_id in range(len(reader))],
+                                 [moves for _, moves, _, _ in serial])
+
+        self.assertEqual(pooled, serial)
+
+
+if __name__ == '__main__':
+    unittest.main()
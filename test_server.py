@@ -0,0 +1,204 @@
+import asyncio
+import concurrent.futures
+import json
+import unittest
+from unittest import mock
+
+import pieces
+import server
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(server.percentile(samples, 0.5), 51)
+        self.assertEqual(server.percentile(samples, 0.99), 100)
+        self.assertEqual(server.percentile([], 0.5), 0.0)
+
+    def test_deep_size_counts_the_board(self):
+        board = pieces.Board()
+        self.assertGreater(server.deep_size(board), server.deep_size(pieces.Board.from_fen("4k3/8/8/8/8/8/8/4K3 w - - 0 1")))
+
+
+class TestGameServer(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.game_server = server.GameServer(self.executor)
+        self.tcp_server = await server.start_server(self.game_server, port=0)
+        self.port = self.tcp_server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.tcp_server.close()
+        await self.tcp_server.wait_closed()
+        self.executor.shutdown()
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        self.addCleanup(writer.close)
+
+        async def request(message):
+            writer.write(message.encode("utf-8") + b"\n")
+            return (await reader.readline()).decode("ascii").split()
+        return request, reader
+
+    async def test_select_and_moves(self):
+        request, _ = await self._connect()
+        self.assertEqual(await request("NEW"), ["GAME", "0"] + pieces.START_FEN.split())
+        reply = await request("SELECT 0 g1")
+        self.assertEqual(reply[:2], ["TARGETS", "0"])
+        self.assertEqual(sorted(reply[2:]), ["f3", "h3"])
+        self.assertEqual((await request("SELECT 0 e7"))[:2], ["ERR", "0"])
+        self.assertEqual(len(await request("MOVES 0")), 22)
+        self.assertEqual(await request("MOVES 7"), ["ERR", "7", "no", "such", "game"])
+
+    async def test_bad_squares_reply_err(self):
+        request, _ = await self._connect()
+        await request("NEW")
+        for message in ("SELECT 0 e9", "SELECT 0 a0", "SELECT 0 e", "MOVE 0 e2e9", "MOVE 0 e0e4", "MOVE 0 e2e4xx"):
+            with self.subTest(message=message):
+                self.assertEqual((await request(message))[:2], ["ERR", "0"])
+        self.assertEqual((await request("MOVE 0 \u00e9")), ["ERR", "0", "malformed", "MOVE"])
+        self.assertEqual((await request("MOVE 0 e2e4"))[:3], ["STATE", "0", server.PLAYING])
+
+    async def test_unexpected_error_keeps_the_connection(self):
+        request, _ = await self._connect()
+        await request("NEW")
+
+        def fail(game, square_name, writer):
+            raise RuntimeError(square_name)
+        self.game_server._select = fail
+        self.assertEqual(await request("SELECT 0 e2"), ["ERR", "0", "failed", "SELECT"])
+        self.assertEqual(len(await request("MOVES 0")), 22)
+
+    async def test_fools_mate_is_pushed_to_watchers(self):
+        request, _ = await self._connect()
+        watch, watcher_reader = await self._connect()
+        await request("NEW")
+        self.assertEqual((await watch("WATCH 0"))[:3], ["STATE", "0", server.PLAYING])
+
+        self.assertEqual((await request("MOVE 0 e2e5"))[:2], ["ERR", "0"])
+        for move in ("f2f3", "e7e5", "g2g4"):
+            self.assertEqual((await request("MOVE 0 " + move))[:3], ["STATE", "0", server.PLAYING])
+            await watcher_reader.readline()
+        self.assertEqual((await request("MOVE 0 d8h4"))[:3], ["STATE", "0", "CHECKMATE"])
+        self.assertEqual((await watcher_reader.readline()).split()[:3], [b"STATE", b"0", b"CHECKMATE"])
+        self.assertEqual(await request("MOVE 0 a2a3"), ["ERR", "0", "game", "is", "over"])
+
+        stats = self.game_server.get_stats()
+        self.assertEqual(stats["moves"], 4)
+        self.assertEqual(stats["games_playing"], 0)
+        self.assertGreater(stats["game_bytes_mean"], 0)
+
+    async def test_resign(self):
+        request, _ = await self._connect()
+        await request("NEW")
+        self.assertEqual((await request("RESIGN 0"))[:3], ["STATE", "0", server.RESIGNED])
+        self.assertEqual(await request("MOVES 0"), ["MOVES", "0"])
+
+    async def test_load_client(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        client = server.LoadClient(reader, writer)
+        self.addCleanup(client.close)
+        latencies = await client.run(3, 6, server.random.Random(0))
+        self.assertEqual(len(latencies), 18)
+        self.assertEqual(self.game_server.get_stats()["games"], 3)
+
+    async def test_load_client_fails_on_a_reply_for_no_game(self):
+        class Writer:
+            def __init__(self):
+                self.lines = []
+
+            def write(self, data):
+                self.lines.append(data)
+
+            def close(self):
+                pass
+
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"ERR - failed NEW\n")
+        client = server.LoadClient(reader, Writer())
+        with self.assertRaisesRegex(ValueError, "reply for no game"):
+            await asyncio.wait_for(client.run(2, 6, server.random.Random(0)), timeout=10)
+
+    async def test_load_client_fails_when_the_server_goes(self):
+        reader = asyncio.StreamReader()
+        reader.feed_eof()
+        _, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        client = server.LoadClient(reader, writer)
+        self.addCleanup(client.close)
+        with self.assertRaises(ConnectionError):
+            await asyncio.wait_for(client.run(1, 6, server.random.Random(0)), timeout=10)
+
+    async def test_games_go_with_their_last_watcher(self):
+        request, _ = await self._connect()
+        watch, _ = await self._connect()
+        await request("NEW")
+        await watch("WATCH 0")
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(b"NEW\n")
+        await reader.readline()
+        self.assertEqual(self.game_server.get_stats()["games"], 2)
+
+        writer.close()
+        await writer.wait_closed()
+        for _ in range(500):
+            if self.game_server.get_game(1) is None:
+                break
+            await asyncio.sleep(0.01)
+        self.assertIsNone(self.game_server.get_game(1))
+        self.assertIsNotNone(self.game_server.get_game(0))
+
+    async def test_disconnect_only_visits_its_own_games(self):
+        request, _ = await self._connect()
+        for _ in range(50):
+            await request("NEW")
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(b"NEW\nWATCH 3\n")
+        await reader.readline()
+        await reader.readline()
+
+        visited = []
+        get_watchers = server.ServerGame.get_watchers
+
+        def counting_get_watchers(game):
+            visited.append(game.get_game_id())
+            return get_watchers(game)
+
+        with mock.patch.object(server.ServerGame, "get_watchers", counting_get_watchers):
+            writer.close()
+            await writer.wait_closed()
+            for _ in range(500):
+                if self.game_server.get_game(50) is None:
+                    break
+                await asyncio.sleep(0.01)
+        self.assertIsNone(self.game_server.get_game(50))
+        self.assertEqual(sorted(set(visited)), [3, 50])
+        self.assertEqual(self.game_server.get_stats()["games"], 50)
+
+    async def test_oldest_finished_games_are_evicted(self):
+        request, _ = await self._connect()
+        for game_id in range(3):
+            await request("NEW")
+            await request("RESIGN {}".format(game_id))
+        await request("NEW")
+        with mock.patch.object(server, "KEEP_FINISHED_GAMES", 2):
+            await request("RESIGN 3")
+        self.assertEqual(await request("MOVES 0"), ["ERR", "0", "no", "such", "game"])
+        self.assertEqual(await request("MOVES 1"), ["MOVES", "1"])
+        self.assertEqual(self.game_server.get_stats()["games"], 3)
+
+    async def test_stats_size_a_sample(self):
+        request, _ = await self._connect()
+        for _ in range(5):
+            await request("NEW")
+        with mock.patch.object(server, "STATS_SIZE_SAMPLE", 2):
+            stats = json.loads(" ".join((await request("STATS"))[1:]))
+        self.assertEqual(stats["games"], 5)
+        self.assertEqual(stats["games_sized"], 2)
+        self.assertGreater(stats["game_bytes_mean"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+import pieces
+import transposition
+
+
+class TestTranspositionTable(unittest.TestCase):
+
+    def setUp(self):
+        self.table = transposition.TranspositionTable(64 * 1024)
+
+    def test_memory_budget(self):
+        # Slot count is the largest power of two that fits the budget.
+        self.assertEqual(self.table.get_slot_count(), 128)
+        self.assertEqual(transposition.TranspositionTable(transposition.ENTRY_BYTES).get_slot_count(), 1)
+        with self.assertRaises(ValueError):
+            transposition.TranspositionTable(transposition.ENTRY_BYTES - 1)
+
+    def test_get_or_create(self):
+        self.assertIsNone(self.table.probe(5))
+        entry = self.table.get_or_create(5)
+        self.assertIs(entry.get_check(), transposition.UNKNOWN)
+        self.assertIs(self.table.get_or_create(5), entry)
+        self.assertIs(self.table.probe(5), entry)
+
+        stats = self.table.get_stats()
+        self.assertEqual((stats["used"], stats["hits"], stats["misses"]), (1, 2, 2))
+
+    def test_always_replace(self):
+        slots = self.table.get_slot_count()
+        old_entry = self.table.get_or_create(3)
+        new_entry = self.table.get_or_create(3 + slots)
+
+        self.assertIsNot(new_entry, old_entry)
+        self.assertIsNone(self.table.probe(3))
+        self.assertIs(self.table.probe(3 + slots), new_entry)
+        self.assertEqual(self.table.get_stats()["replacements"], 1)
+
+        self.table.clear()
+        self.assertIsNone(self.table.probe(3 + slots))
+        self.assertEqual(self.table.get_stats()["used"], 0)
+
+    def test_encode_move(self):
+        for move in [((0, 0), (7, 7), None), ((4, 6), (4, 7), 'N'), ((7, 1), (6, 0), 'Q')]:
+            self.assertEqual(transposition.decode_move(transposition.encode_move(move)), move)
+            self.assertLess(transposition.encode_move(move), 1 << 16)
+
+    def test_board_results_match_uncached(self):
+        board = pieces.Board()
+        cached_board = pieces.Board(self.table)
+
+        # Fool's mate, comparing every cached result with a board that has no table.
+        for piece_square, new_square in [((5, 1), (5, 2)), ((4, 6), (4, 4)), ((6, 1), (6, 3)), ((3, 7), (7, 3))]:
+            for _ in range(2):
+                self.assertEqual(cached_board.list_legal_moves(), board.list_legal_moves())
+                self.assertEqual(cached_board.list_valid_moves_for_player(), board.list_valid_moves_for_player())
+                self.assertEqual(cached_board.is_cur_player_in_check(), board.is_cur_player_in_check())
+                self.assertEqual(cached_board.is_stalemate_or_checkmate(), board.is_stalemate_or_checkmate())
+
+            for b in (board, cached_board):
+                b.move_piece(piece_square, new_square)
+                b.change_player()
+
+        self.assertEqual(cached_board.is_stalemate_or_checkmate(), "CHECKMATE")
+        self.assertEqual(cached_board.list_legal_moves(), [])
+        entry = self.table.probe(cached_board.get_zobrist_key())
+        self.assertEqual(entry.get_game_over(), "CHECKMATE")
+        self.assertTrue(entry.get_check()[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
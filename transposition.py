@@ -0,0 +1,119 @@
+from array import array
+
+
+# Rough bytes one filled slot costs: the key, the slot pointer, a PositionEntry and a packed
+# legal move list. Used to turn a memory budget into a slot count.
+ENTRY_BYTES = 320
+DEFAULT_MEMORY_BUDGET = 16 * 1024 * 1024
+
+# Marks a result that hasn't been computed yet, None is a real game over result.
+UNKNOWN = object()
+
+# Promotion char reps by their 3 bit code in a packed move, 0 means no promotion.
+PROMOTION_CODES = (None, 'Q', 'R', 'B', 'N')
+
+
+def encode_move(move):
+    # Packs (piece_square, new_square, promotion) into 15 bits: from, to and promotion code.
+    piece_square, new_square, promotion = move
+    from_index = piece_square[1] * 8 + piece_square[0]
+    to_index = new_square[1] * 8 + new_square[0]
+    return from_index | to_index << 6 | PROMOTION_CODES.index(promotion) << 12
+
+
+def decode_move(code):
+    from_y, from_x = divmod(code & 63, 8)
+    to_y, to_x = divmod(code >> 6 & 63, 8)
+    return (from_x, from_y), (to_x, to_y), PROMOTION_CODES[code >> 12]
+
+
+class PositionEntry:
+    # Results cached for one position, each stays UNKNOWN until a board computes it.
+    __slots__ = ('_legal_moves', '_check', '_game_over')
+
+    def __init__(self):
+        self._legal_moves = UNKNOWN
+        self._check = UNKNOWN
+        self._game_over = UNKNOWN
+
+    def get_legal_moves(self):
+        if self._legal_moves is UNKNOWN:
+            return UNKNOWN
+        return [decode_move(code) for code in self._legal_moves]
+
+    def set_legal_moves(self, legal_moves):
+        self._legal_moves = array('H', [encode_move(move) for move in legal_moves])
+
+    def get_check(self):
+        return self._check
+
+    def set_check(self, check):
+        self._check = check
+
+    def get_game_over(self):
+        return self._game_over
+
+    def set_game_over(self, game_over):
+        self._game_over = game_over
+
+
+class TranspositionTable:
+    # Fixed number of slots, picked from the memory budget and never grown. A position lives in
+    # slot key & mask, its key is kept in a parallel array to tell positions sharing a slot apart.
+    # Replacement policy is always replace: a new position takes over its slot and the entry
+    # already there is dropped, so the most recently seen positions are the ones kept.
+
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET):
+        if memory_budget < ENTRY_BYTES:
+            raise ValueError("Memory budget of {} bytes can't hold a single entry".format(memory_budget))
+
+        # Power of two slot count, so the slot is a mask of the key rather than a modulo.
+        slot_count = 1 << (memory_budget // ENTRY_BYTES).bit_length() - 1
+        self._mask = slot_count - 1
+        self._keys = array('Q', bytes(8 * slot_count))
+        self._entries = [None] * slot_count
+
+        self._hits = 0
+        self._misses = 0
+        self._replacements = 0
+
+    def get_slot_count(self):
+        return len(self._entries)
+
+    def probe(self, key):
+        slot = key & self._mask
+        entry = self._entries[slot]
+        if entry is not None and self._keys[slot] == key:
+            self._hits += 1
+            return entry
+        self._misses += 1
+        return None
+
+    def get_or_create(self, key):
+        slot = key & self._mask
+        entry = self._entries[slot]
+        if entry is not None:
+            if self._keys[slot] == key:
+                self._hits += 1
+                return entry
+            self._replacements += 1
+        self._misses += 1
+
+        entry = PositionEntry()
+        self._keys[slot] = key
+        self._entries[slot] = entry
+        return entry
+
+    def clear(self):
+        slot_count = len(self._entries)
+        self._keys = array('Q', bytes(8 * slot_count))
+        self._entries = [None] * slot_count
+
+    def get_stats(self):
+        return {
+            "slots": len(self._entries),
+            "used": len(self._entries) - self._entries.count(None),
+            "hits": self._hits,
+            "misses": self._misses,
+            "replacements": self._replacements,
+        }
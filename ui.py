@@ -1,10 +1,18 @@
+import argparse
+import atexit
 import logging
+import time
 import arcade
 import arcade.gui
 
 from string import ascii_uppercase
 
+import bitboard
+import instrumentation
+import move_worker
+import perf_trace
 import pieces
+import search
 
 # Screen constants
 SCREEN_HEIGHT = 768
@@ -34,10 +42,33 @@ WHITE_SQUARE_COLOUR = arcade.color.LIGHT_GRAY
 SELECTED_SQUARE_COLOUR = arcade.color.ARYLIDE_YELLOW
 POTENTIAL_SQUARE_COLOUR = arcade.color.ANDROID_GREEN
 CHECK_COLOUR = arcade.color.DARK_PASTEL_RED
+PENDING_TEXT_COLOUR = arcade.color.BLACK
+# Segments in the outline of a move hint, a small circle doesn't need the default's smoothness.
+HINT_OUTLINE_SEGMENTS = 32
+
+# Performance overlay, toggled with F3. Its text is refreshed a few times a second rather than every
+# frame, each distinct string drawn is another texture in arcade's text cache.
+OVERLAY_LEFT = 760
+OVERLAY_TOP = 620
+OVERLAY_BOTTOM = 10
+OVERLAY_LINE_HEIGHT = 14
+OVERLAY_FONT_SIZE = 10
+OVERLAY_HISTOGRAM_BOTTOM = 30
+OVERLAY_HISTOGRAM_HEIGHT = 60
+OVERLAY_REFRESH_SECONDS = 0.25
+OVERLAY_BACKGROUND = (255, 255, 255, 200)
+OVERLAY_TEXT_COLOUR = arcade.color.BLACK
+OVERLAY_BAR_COLOUR = arcade.color.CADET_BLUE
 
 MAIN_MENU_BACKGROUND = arcade.color.DARK_BYZANTIUM
 MAIN_MENU_TEXT = arcade.color.WHITE_SMOKE
 
+# Victory screen titles for the ways a game can be drawn.
+DRAW_TITLES = {
+    "STALEMATE": "STALEMATE",
+    pieces.THREEFOLD_REPETITION: "REPETITION",
+    pieces.FIFTY_MOVE_RULE: "FIFTY MOVES",
+}
 
 SPRITE_LOOKUP_DICT = {
     "B(B)": "bishop-black-16x16.png",
@@ -55,8 +86,32 @@ SPRITE_LOOKUP_DICT = {
     "0": None
 }
 
+# Piece textures by the piece's str(), loaded once and shared by every sprite and view.
+_piece_textures = {}
+
+
+def get_piece_texture(piece_name):
+    texture = _piece_textures.get(piece_name)
+    if texture is None:
+        texture = arcade.load_texture("resources/images/{}".format(SPRITE_LOOKUP_DICT[piece_name]))
+        _piece_textures[piece_name] = texture
+    return texture
+
+
+def load_piece_textures():
+    for piece_name, image in SPRITE_LOOKUP_DICT.items():
+        if image is not None:
+            get_piece_texture(piece_name)
+
 
 class MainMenuView(arcade.View):
+    def __init__(self, board_cls=pieces.Board, searcher=None, engine_is_white=False, monitor=None):
+        super().__init__()
+        self.board_cls = board_cls
+        self.searcher = searcher
+        self.engine_is_white = engine_is_white
+        self.monitor = monitor
+
     def on_show(self):
         arcade.set_background_color(MAIN_MENU_BACKGROUND)
         arcade.set_viewport(0, SCREEN_WIDTH - 1, 0, SCREEN_HEIGHT - 1)
@@ -69,16 +124,21 @@ class MainMenuView(arcade.View):
                          MAIN_MENU_TEXT, font_size=20, anchor_x="center")
 
     def on_mouse_press(self, _x, _y, _button, _modifiers):
-        chess_view = ChessView()
+        chess_view = ChessView(self.board_cls, self.searcher, self.engine_is_white, self.monitor)
         chess_view.setup()
         self.window.show_view(chess_view)
 
 
 class VictoryView(arcade.View):
-    def __init__(self, was_stalemate, winner_was_white):
+    def __init__(self, game_over, winner_was_white, board_cls=pieces.Board, searcher=None, engine_is_white=False,
+                 monitor=None):
         super().__init__()
-        if was_stalemate:
-            self.title_text = "STALEMATE"
+        self.board_cls = board_cls
+        self.searcher = searcher
+        self.engine_is_white = engine_is_white
+        self.monitor = monitor
+        if game_over != "CHECKMATE":
+            self.title_text = DRAW_TITLES[game_over]
             self.display_text = "ITS A DRAW: 1/2 - 1/2"
             self.font_color = arcade.color.DARK_GRAY
             self.background_color = arcade.color.LIGHT_GRAY
@@ -109,23 +169,43 @@ class VictoryView(arcade.View):
                          self.font_color, font_size=20, anchor_x="center")
 
     def on_mouse_press(self, _x, _y, _button, _modifiers):
-        main_menu_view = MainMenuView()
+        main_menu_view = MainMenuView(self.board_cls, self.searcher, self.engine_is_white, self.monitor)
         self.window.show_view(main_menu_view)
 
 
 class ChessView(arcade.View):
-    def __init__(self):
+    def __init__(self, board_cls=pieces.Board, searcher=None, engine_is_white=False, monitor=None):
         super().__init__()
 
         # GAME VARS
-        self.board = pieces.Board()
+        self.board_cls = board_cls
+        self.board = board_cls()
         self.piece_selected = None
         self.piece_selected_moves = None
 
-        self.is_white_perspective_active = True
+        # ENGINE - when a searcher is given it plays the engine_is_white colour.
+        self.searcher = searcher
+        self.engine_is_white = engine_is_white
+
+        # Legal moves, check and game over for the position on the board are worked out by a background
+        # thread. analysis is None while the worker is still on the current turn, and clicks wait for it.
+        self.worker = move_worker.MoveWorker(searcher)
+        self.analysis = None
+
+        self.is_white_perspective_active = searcher is None or not engine_is_white
         self.highlight_checked_king = False
         self.show_possible_moves_active = False
 
+        # PERFORMANCE - the monitor lives for the session so a trace covers every game played.
+        self.monitor = monitor or perf_trace.PerformanceMonitor()
+        self.show_overlay_active = False
+        # Whether F3 switched instrumentation on, rather than --instrument or --trace.
+        self.overlay_enabled_instrumentation = False
+        self.overlay_lines = []
+        self.overlay_refresh_in = 0.0
+        # When the oldest input not yet on screen arrived, for the input to render latency.
+        self.input_time = None
+
         # RENDERING LOGIC
         arcade.set_background_color(arcade.color.ALMOND)
 
@@ -143,162 +223,215 @@ class ChessView(arcade.View):
 
         self.chess_piece_sprite_list = None
 
+        # Static geometry is batched once: the squares and outline look the same from either side,
+        # the labels are kept per perspective. Highlights are a small batch rebuilt when they change.
+        self.board_shape_list = None
+        self.label_sprite_lists = {}
+        self.highlight_shape_list = None
+        # Board square -> (str of the piece on it, its sprite), so a move only touches the squares it changed.
+        self.piece_sprites = {}
+
     def setup(self):
+        load_piece_textures()
+        self._build_board_shapes()
+        self._rebuild_highlights()
         self._gen_piece_placement()
+        self.worker.start()
+        self._start_turn()
 
     def on_draw(self):
+        start = time.perf_counter()
         arcade.start_render()
 
-        self._draw_board()
+        self.board_shape_list.draw()
+        self.highlight_shape_list.draw()
+        self._get_label_sprite_list().draw()
         self.chess_piece_sprite_list.draw()
 
-    def _gen_piece_placement(self):
-        oriented_board = self.board.get_board()
+        if self.analysis is None:
+            arcade.draw_text("Engine thinking..." if self._is_engine_turn() else "Thinking...",
+                             self.tile_draw_start_x + SQUARE_WIDTH * self.tile_count_x,
+                             self.tile_draw_start_y + SQUARE_HEIGHT * (self.tile_count_y - 1),
+                             PENDING_TEXT_COLOUR, 18)
+
+        if self.show_overlay_active:
+            self._draw_overlay()
+
+        end = time.perf_counter()
+        self.monitor.add_frame(start, end - start)
+        if self.input_time is not None:
+            self.monitor.add_latency(end - self.input_time)
+            self.input_time = None
+
+    def on_update(self, delta_time: float):
+        analysis = self.worker.poll()
+        if analysis is not None:
+            self._apply_analysis(analysis)
+
+        if self.show_overlay_active:
+            self.overlay_refresh_in -= delta_time
+            if self.overlay_refresh_in <= 0:
+                self.overlay_lines = self.monitor.format_lines() + ["", "input to render (ms)"]
+                self.overlay_refresh_in = OVERLAY_REFRESH_SECONDS
+
+    def _draw_overlay(self):
+        arcade.draw_lrtb_rectangle_filled(OVERLAY_LEFT, SCREEN_WIDTH, OVERLAY_TOP, OVERLAY_BOTTOM, OVERLAY_BACKGROUND)
+        y = OVERLAY_TOP - OVERLAY_LINE_HEIGHT
+        for line in self.overlay_lines:
+            arcade.draw_text(line, OVERLAY_LEFT + 8, y, OVERLAY_TEXT_COLOUR, OVERLAY_FONT_SIZE)
+            y -= OVERLAY_LINE_HEIGHT
+
+        # Latency histogram along the bottom of the panel, bars scaled to the fullest bucket.
+        histogram = self.monitor.get_latency_histogram()
+        counts = histogram.get_counts()
+        tallest = max(counts) or 1
+        bar_width = (SCREEN_WIDTH - OVERLAY_LEFT - 16) / len(counts)
+        for i, (count, label) in enumerate(zip(counts, histogram.get_labels())):
+            left = OVERLAY_LEFT + 8 + bar_width * i
+            arcade.draw_lrtb_rectangle_filled(left + 2, left + bar_width - 2,
+                                              OVERLAY_HISTOGRAM_BOTTOM + OVERLAY_HISTOGRAM_HEIGHT * count / tallest,
+                                              OVERLAY_HISTOGRAM_BOTTOM, OVERLAY_BAR_COLOUR)
+            arcade.draw_text(label, left, OVERLAY_BOTTOM + 4, OVERLAY_TEXT_COLOUR, OVERLAY_FONT_SIZE - 2)
 
+    def _gen_piece_placement(self):
         self.chess_piece_sprite_list = arcade.SpriteList()
+        self.piece_sprites = {}
+        self._update_piece_placement()
+
+    def _update_piece_placement(self):
+        # Brings the sprites in line with the board by looking only at squares whose piece changed.
+        # A sprite leaving a square is reused for the same kind of piece arriving elsewhere, which
+        # covers moves, castling rooks and en passant; anything left over was captured, and a piece
+        # with no sprite to reuse (a promotion) gets a new one from the cached textures.
+        squares = self.board.get_board()
+        left = {}
+        for square, (piece_name, sprite) in list(self.piece_sprites.items()):
+            if str(squares[square[1]][square[0]]) != piece_name:
+                del self.piece_sprites[square]
+                left.setdefault(piece_name, []).append(sprite)
+
+        for y, row in enumerate(squares):
+            for x, sq in enumerate(row):
+                if not sq.is_piece() or (x, y) in self.piece_sprites:
+                    continue
+                piece_name = str(sq)
+                if left.get(piece_name):
+                    sprite = left[piece_name].pop()
+                else:
+                    sprite = arcade.Sprite(texture=get_piece_texture(piece_name), scale=IMAGE_SCALE)
+                    self.chess_piece_sprite_list.append(sprite)
+                self._position_sprite(sprite, (x, y))
+                self.piece_sprites[(x, y)] = piece_name, sprite
 
-        for x in range(self.tile_count_x):
-            for y in range(self.tile_count_y):
-
-                piece_img_path = SPRITE_LOOKUP_DICT[str(oriented_board[y][x])]  # Reverse x and y for proper orientation
+        for sprites in left.values():
+            for sprite in sprites:
+                sprite.remove_from_sprite_lists()
 
-                if piece_img_path is not None:
-                    piece_sprite = arcade.Sprite(
-                        "resources/images/{}".format(piece_img_path),
-                        IMAGE_SCALE
-                    )
+    def _reposition_piece_sprites(self):
+        for square, (_, sprite) in self.piece_sprites.items():
+            self._position_sprite(sprite, square)
 
-                    if self.is_white_perspective_active:
-                        piece_sprite.center_x = self.tile_draw_start_x + SQUARE_WIDTH * x
-                        piece_sprite.center_y = self.tile_draw_start_y + SQUARE_HEIGHT * y
-                    else:
-                        piece_sprite.center_x = self.tile_draw_start_x + SQUARE_WIDTH * (self.tile_count_x - 1 - x)
-                        piece_sprite.center_y = self.tile_draw_start_y + SQUARE_HEIGHT * (self.tile_count_y - 1 - y)
+    def _position_sprite(self, sprite, square):
+        sprite.center_x, sprite.center_y = self._square_centre(square)
 
-                    self.chess_piece_sprite_list.append(piece_sprite)
+    def _square_centre(self, square):
+        x, y = square
+        if not self.is_white_perspective_active:
+            x = self.tile_count_x - 1 - x
+            y = self.tile_count_y - 1 - y
+        return self.tile_draw_start_x + SQUARE_WIDTH * x, self.tile_draw_start_y + SQUARE_HEIGHT * y
 
-    def _draw_board(self):
-        # Draw Squares of Board
+    def _build_board_shapes(self):
+        self.board_shape_list = arcade.ShapeElementList()
         for x in range(self.tile_count_x):
             for y in range(self.tile_count_y):
-                if (x + y) % 2:
-                    arcade.draw_rectangle_filled(
-                        self.tile_draw_start_x + SQUARE_WIDTH * x,
-                        self.tile_draw_start_y + SQUARE_HEIGHT * y,
-                        SQUARE_WIDTH,
-                        SQUARE_HEIGHT,
-                        WHITE_SQUARE_COLOUR
-                    )
-                else:
-                    arcade.draw_rectangle_filled(
-                        self.tile_draw_start_x + SQUARE_WIDTH * x,
-                        self.tile_draw_start_y + SQUARE_HEIGHT * y,
-                        SQUARE_WIDTH,
-                        SQUARE_HEIGHT,
-                        BLACK_SQUARE_COLOUR
-                    )
-
-        # Draw Outline around board.
-        arcade.draw_rectangle_outline(
+                self.board_shape_list.append(arcade.create_rectangle_filled(
+                    self.tile_draw_start_x + SQUARE_WIDTH * x,
+                    self.tile_draw_start_y + SQUARE_HEIGHT * y,
+                    SQUARE_WIDTH,
+                    SQUARE_HEIGHT,
+                    WHITE_SQUARE_COLOUR if (x + y) % 2 else BLACK_SQUARE_COLOUR
+                ))
+
+        # Outline around board.
+        self.board_shape_list.append(arcade.create_rectangle_outline(
             (SCREEN_WIDTH / 2) + BOARD_X_OFFSET,
             (SCREEN_HEIGHT / 2) + BOARD_Y_OFFSET,
             (self.tile_count_x * SQUARE_WIDTH) + OUTLINE_MARGIN_WIDTH,
             (self.tile_count_y * SQUARE_HEIGHT) + OUTLINE_MARGIN_WIDTH,
             arcade.color.BLACK,
             OUTLINE_MARGIN_WIDTH
-        )
-
-        file_chars = ascii_uppercase[:self.tile_count_x]
-        if self.is_white_perspective_active is False:
-            file_chars = file_chars[::-1]
+        ))
 
-        # Draw letters along bottom of board
-        for x in range(self.tile_count_x):
-            arcade.draw_text(
-                file_chars[x],
-                self.tile_draw_start_x + SQUARE_WIDTH * x - LETTER_OFFSET,
-                self.tile_draw_start_y - SQUARE_HEIGHT,
-                arcade.color.BLACK,
-                18,
-            )
+    def _get_label_sprite_list(self):
+        # The file and rank labels for the current perspective, built the first time it is shown.
+        label_sprite_list = self.label_sprite_lists.get(self.is_white_perspective_active)
+        if label_sprite_list is not None:
+            return label_sprite_list
 
+        file_chars = ascii_uppercase[:self.tile_count_x]
         rank_chars = "12345678"
         if self.is_white_perspective_active is False:
+            file_chars = file_chars[::-1]
             rank_chars = rank_chars[::-1]
 
-        # Draw numbers along side of board
+        label_positions = []
+        # Letters along bottom of board
+        for x in range(self.tile_count_x):
+            label_positions.append((file_chars[x], self.tile_draw_start_x + SQUARE_WIDTH * x - LETTER_OFFSET,
+                                    self.tile_draw_start_y - SQUARE_HEIGHT))
+        # Numbers along side of board
         for y in range(self.tile_count_y):
-            arcade.draw_text(
-                rank_chars[y],
-                self.tile_draw_start_x - SQUARE_WIDTH,
-                self.tile_draw_start_y + SQUARE_WIDTH * y - NUMBER_OFFSET,
-                arcade.color.BLACK,
-                18,
-            )
-
-        # Draw highlight around checked king
+            label_positions.append((rank_chars[y], self.tile_draw_start_x - SQUARE_WIDTH,
+                                    self.tile_draw_start_y + SQUARE_WIDTH * y - NUMBER_OFFSET))
+
+        label_sprite_list = arcade.SpriteList()
+        for text, x, y in label_positions:
+            # draw_text renders the text to a texture once and hands back its sprite, which is shared
+            # through arcade's text cache, so the texture goes into a sprite of our own.
+            text_sprite = arcade.draw_text(text, x, y, arcade.color.BLACK, 18)
+            label = arcade.Sprite(texture=text_sprite.texture, center_x=text_sprite.center_x,
+                                  center_y=text_sprite.center_y)
+            label.width = text_sprite.width
+            label.height = text_sprite.height
+            label_sprite_list.append(label)
+
+        self.label_sprite_lists[self.is_white_perspective_active] = label_sprite_list
+        return label_sprite_list
+
+    def _rebuild_highlights(self):
+        # Called whenever the selection, check or perspective changes, not every frame.
+        self.highlight_shape_list = arcade.ShapeElementList()
+
+        # Highlight around checked king
         if self.highlight_checked_king:
-            king_coords = self.board.get_cur_king_coords()
-            if self.is_white_perspective_active:
-                select_x = king_coords[0]
-                select_y = king_coords[1]
-            else:
-                select_x = self.tile_count_x - 1 - king_coords[0]
-                select_y = self.tile_count_y - 1 - king_coords[1]
-
-            arcade.draw_rectangle_filled(
-                self.tile_draw_start_x + (SQUARE_WIDTH * select_x),
-                self.tile_draw_start_y + (SQUARE_HEIGHT * select_y),
-                SQUARE_WIDTH,
-                SQUARE_HEIGHT,
-                CHECK_COLOUR
-            )
-
-        # Draw highlight around selected piece and possible squares
-        if self.piece_selected is not None:
-            if self.is_white_perspective_active:
-                select_x = self.piece_selected[0]
-                select_y = self.piece_selected[1]
-            else:
-                select_x = self.tile_count_x - 1 - self.piece_selected[0]
-                select_y = self.tile_count_y - 1 - self.piece_selected[1]
+            centre_x, centre_y = self._square_centre(self.board.get_cur_king_coords())
+            self.highlight_shape_list.append(arcade.create_rectangle_filled(
+                centre_x, centre_y, SQUARE_WIDTH, SQUARE_HEIGHT, CHECK_COLOUR))
 
-            arcade.draw_rectangle_filled(
-                self.tile_draw_start_x + (SQUARE_WIDTH * select_x),
-                self.tile_draw_start_y + (SQUARE_HEIGHT * select_y),
-                SQUARE_WIDTH,
-                SQUARE_HEIGHT,
-                SELECTED_SQUARE_COLOUR
-            )
+        # Highlight around selected piece and possible squares
+        if self.piece_selected is not None:
+            centre_x, centre_y = self._square_centre(self.piece_selected)
+            self.highlight_shape_list.append(arcade.create_rectangle_filled(
+                centre_x, centre_y, SQUARE_WIDTH, SQUARE_HEIGHT, SELECTED_SQUARE_COLOUR))
 
             if self.show_possible_moves_active:
-                # Highlight squares that piece can move to:
                 for square in self.piece_selected_moves:
-                    if self.is_white_perspective_active:
-                        possible_x = square[0]
-                        possible_y = square[1]
-                    else:
-                        possible_x = self.tile_count_x - 1 - square[0]
-                        possible_y = self.tile_count_y - 1 - square[1]
-
-                    arcade.draw_ellipse_filled(
-                        self.tile_draw_start_x + (SQUARE_WIDTH * possible_x),
-                        self.tile_draw_start_y + (SQUARE_HEIGHT * possible_y),
-                        SQUARE_WIDTH/2,
-                        SQUARE_HEIGHT/2,
-                        POTENTIAL_SQUARE_COLOUR
-                    )
-                    arcade.draw_ellipse_outline(
-                        self.tile_draw_start_x + (SQUARE_WIDTH * possible_x),
-                        self.tile_draw_start_y + (SQUARE_HEIGHT * possible_y),
-                        SQUARE_WIDTH/2,
-                        SQUARE_HEIGHT/2,
-                        arcade.color.BLACK,
-                        3,
-                        num_segments=150
-                    )
+                    centre_x, centre_y = self._square_centre(square)
+                    self.highlight_shape_list.append(arcade.create_ellipse_filled(
+                        centre_x, centre_y, SQUARE_WIDTH/2, SQUARE_HEIGHT/2, POTENTIAL_SQUARE_COLOUR))
+                    self.highlight_shape_list.append(arcade.create_ellipse_outline(
+                        centre_x, centre_y, SQUARE_WIDTH/2, SQUARE_HEIGHT/2, arcade.color.BLACK, 3,
+                        num_segments=HINT_OUTLINE_SEGMENTS))
 
     def on_mouse_press(self, x: float, y: float, button: int, modifiers: int):
+        if self.input_time is None:
+            self.input_time = time.perf_counter()
+
+        # Nothing can be selected until the worker has finished with this position.
+        if self.analysis is None or self._is_engine_turn():
+            return
+
         clicked_tile = self._calc_board_coord(x, y)
 
         # Check if a piece has been selected
@@ -317,28 +450,49 @@ class ChessView(arcade.View):
 
             if selection_is_valid:
                 self.piece_selected = clicked_tile
-                self.piece_selected_moves = self.board.list_valid_moves_for_piece(self.piece_selected)
+                self.piece_selected_moves = self.analysis.get_targets(self.piece_selected)
         else:
-
-            move_is_valid, err = self.board.check_if_move_valid(self.piece_selected, clicked_tile)
-
-            if move_is_valid:
+            if clicked_tile in self.piece_selected_moves:
                 self.board.move_piece(self.piece_selected, clicked_tile)
-                self.board.change_player()
-                self._gen_piece_placement()
-                self.highlight_checked_king, _ = self.board.is_cur_player_in_check()
-
-                x = self.board.is_stalemate_or_checkmate()
-                if x is not None:
-                    if x == "CHECKMATE":
-                        victory_view = VictoryView(False, not self.board.is_cur_player_white())
-                    else:
-                        victory_view = VictoryView(True, not self.board.is_cur_player_white())
-                    self.window.show_view(victory_view)
+                self._finish_move()
 
             self.piece_selected = None
             self.piece_selected_moves = None
 
+        self._rebuild_highlights()
+
+    def _finish_move(self):
+        # Hands the turn over, the worker takes it from there.
+        self.board.change_player()
+        self._update_piece_placement()
+        self._start_turn()
+
+    def _start_turn(self):
+        self.analysis = None
+        # The last check belongs to the previous position, only the new analysis can set it again.
+        self.highlight_checked_king = False
+        self._rebuild_highlights()
+        self.worker.submit(self.board, search=self._is_engine_turn())
+
+    def _apply_analysis(self, analysis):
+        self.analysis = analysis
+        self.highlight_checked_king = analysis.is_in_check()
+        self._rebuild_highlights()
+
+        x = analysis.get_game_over()
+        if x is not None:
+            self.worker.stop()
+            victory_view = VictoryView(x, not self.board.is_cur_player_white(), self.board_cls,
+                                       self.searcher, self.engine_is_white, self.monitor)
+            self.window.show_view(victory_view)
+        elif analysis.get_engine_move() is not None:
+            logging.info("Engine: %s", analysis.get_search_result())
+            self.board.move_piece(*analysis.get_engine_move())
+            self._finish_move()
+
+    def _is_engine_turn(self):
+        return self.searcher is not None and self.board.is_cur_player_white() == self.engine_is_white
+
     def _calc_board_coord(self, x, y):
         file = x - self.tile_draw_start_x + (SQUARE_WIDTH/2)
         file = int(file // SQUARE_WIDTH)
@@ -349,14 +503,42 @@ class ChessView(arcade.View):
         return file, rank
 
     def on_key_press(self, symbol: int, modifiers: int):
+        if self.input_time is None:
+            self.input_time = time.perf_counter()
+
         if symbol == arcade.key.SPACE:
             self.is_white_perspective_active = not self.is_white_perspective_active
-            self._gen_piece_placement()
+            self._reposition_piece_sprites()
+            self._rebuild_highlights()
         elif symbol == arcade.key.ENTER:
             self.show_possible_moves_active = not self.show_possible_moves_active
+            self._rebuild_highlights()
+        elif symbol == arcade.key.F3:
+            self._set_overlay(not self.show_overlay_active)
         elif symbol == arcade.key.ESCAPE:
             exit(0)
 
+    def on_hide_view(self):
+        self._set_overlay(False)
+
+    def _set_overlay(self, active):
+        if active == self.show_overlay_active:
+            return
+        self.show_overlay_active = active
+        self.overlay_refresh_in = 0.0
+        if active:
+            # Board calls are timed from here on, including the move worker's.
+            self.overlay_enabled_instrumentation = not instrumentation.enabled
+            instrumentation.enable()
+            instrumentation.set_tracer(self.monitor)
+        else:
+            # Back to what the command line asked for, a --trace recording keeps its tracer.
+            if self.monitor.get_recorder() is None:
+                instrumentation.set_tracer(None)
+            if self.overlay_enabled_instrumentation:
+                instrumentation.disable()
+                self.overlay_enabled_instrumentation = False
+
     def on_mouse_release(self, x: float, y: float, button: int, modifiers: int):
         pass
 
@@ -365,12 +547,34 @@ class ChessView(arcade.View):
 
 
 def main():
+    parser = argparse.ArgumentParser(description=SCREEN_TITLE)
+    parser.add_argument("--bitboard", action="store_true", help="use the bitboard position backend")
+    parser.add_argument("--instrument", action="store_true",
+                        help="count and time board operations, printing a summary at exit")
+    parser.add_argument("--engine", choices=("white", "black"), help="colour played by the computer")
+    parser.add_argument("--engine-time", type=float, default=1.0, help="engine thinking time per move in seconds")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="write a Chrome trace of frames and board calls to PATH at exit (chrome://tracing, Perfetto)")
+    args = parser.parse_args()
 
     logging.basicConfig(filename="app.log", format='%(asctime)s - %(message)s', level=logging.INFO)
 
+    if args.instrument:
+        instrumentation.enable()
+        atexit.register(instrumentation.dump_summary)
+
+    monitor = perf_trace.PerformanceMonitor(perf_trace.TraceRecorder() if args.trace else None)
+    if args.trace:
+        instrumentation.enable()
+        instrumentation.set_tracer(monitor)
+        atexit.register(monitor.get_recorder().write, args.trace)
+
+    board_cls = bitboard.BitBoard if args.bitboard else pieces.Board
+
     # MAIN SCRIPT
     window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
-    main_menu_view = MainMenuView()
+    searcher = search.Searcher(time_limit=args.engine_time) if args.engine else None
+    main_menu_view = MainMenuView(board_cls, searcher, args.engine == "white", monitor)
     window.show_view(main_menu_view)
     arcade.run()
 